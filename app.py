@@ -1,333 +1,250 @@
+import contextlib
+
 import flask
 from flask import request, jsonify
 from flask_cors import CORS
-from flask_socketio import SocketIO, join_room, leave_room
+from flask_socketio import SocketIO, emit, join_room, leave_room
 from sqlalchemy.exc import SQLAlchemyError
 
-import auth
-from constants import API_HOST, API_PORT, CLIENT_HOST, CLIENT_PORT
+import broadcast
+from constants import API_HOST, API_PORT, BROADCAST_WINDOW, CLIENT_HOST, CLIENT_PORT, COMPRESSION_MIN_SIZE, ROOM_SYNC_INTERVAL, SOCKETIO_MESSAGE_QUEUE, SOCKETIO_SERIALIZER
 import database
 import game
-from game import GameNotFoundException, InvalidPasswordException as InvalidGamePasswordException, InvalidTransactionException
+from game import GameNotFoundException
+import message_queue
+import metrics
+import rooms
+import routes
+import serialization
 import user
-from user import EmailAlreadyExistsException, EmailNotFoundException, InvalidPasswordException as InvalidUserPasswordException
-
-app = flask.Flask(__name__)
-socketio = SocketIO(app, cors_allowed_origins=f"http://{CLIENT_HOST}:{CLIENT_PORT}")
-cors = CORS(app)
-
-def with_session(func):
-    def wrapper(*args, **kwargs):
-        session = database.get_session()
-        try:
-            return func(session, *args, **kwargs)
-        except SQLAlchemyError as e:
-            session.rollback()
-            raise e
-        finally:
-            session.close()
-    # Assign a unique name to the wrapper function based on the original function name
-    wrapper.__name__ = func.__name__ + '_with_session'
-    return wrapper
 
-@app.route('/', methods=['GET', 'POST'])
-def health_check():
+class Flask(flask.Flask):
     """
-    Endpoint for health check of the application.
-
-    Responds with a 200 status code to indicate that the application is running properly. 
-
-    Methods:
-    GET, POST
-    """
-    return '', 200
-
-@app.route('/game/active/user/<string:id>', methods=['GET'])
-@with_session
-def get_active_games_by_user_id(session, id):
+    A Flask application that runs the shared route handlers of 'routes' without an event loop, since they never suspend here.
     """
-    Retrieves active games where the specified user is a member. Supports pagination.
+    def async_to_sync(self, func):
+        return lambda *args, **kwargs: routes.run(func(*args, **kwargs))
+
+app = Flask(__name__)
+app.json = serialization.FastJSONProvider(app)
+socketio = SocketIO(
+    app,
+    cors_allowed_origins=f"http://{CLIENT_HOST}:{CLIENT_PORT}",
+    client_manager=message_queue.create_client_manager(SOCKETIO_MESSAGE_QUEUE),
+    json=serialization.SocketIOJSON,
+    serializer=SOCKETIO_SERIALIZER
+)
+cors = CORS(app)
 
-    Methods:
-    GET
+# Payloads are serialized once and embedded as is in JSON packets, unless they are sent through a message queue
+embed_payloads = SOCKETIO_SERIALIZER == 'default' and not isinstance(socketio.server.manager, message_queue.ClusterMixin)
 
-    URL Parameters:
-    id (str): The user ID for which active games are being queried.
-    itemOffset (int): Query parameter for pagination offset.
-    itemsPerPage (int): Query parameter for number of items per page.
+# Subscribers of each room, on this worker and, with a message queue, on the others
+room_tracker = rooms.RoomTracker(ROOM_SYNC_INTERVAL if isinstance(socketio.server.manager, message_queue.ClusterMixin) else None)
 
-    Returns:
-    JSON response containing a list of active games associated with the user.
+def publish_room_counts():
     """
-    try:
-        games = game.get_by_user_id(
-            session, 
-            id, 
-            itemOffset=request.args.get('itemOffset', type=int), 
-            per_page=request.args.get('itemsPerPage', type=int),
-            expired=False
-        )
-        return jsonify(games)
-    except GameNotFoundException:
-        return "GameNotFound: No games found relating to the specified user ID", 404
-    
-@app.route('/game/expired/user/<string:id>', methods=['GET'])
-@with_session
-def get_expired_games_by_user_id(session, id):
-    """
-    Retrieves expired games where the specified user is a member. Supports pagination.
-
-    Methods:
-    GET
-
-    URL Parameters:
-    id (str): The user ID for which active games are being queried.
-    itemOffset (int): Query parameter for pagination offset.
-    itemsPerPage (int): Query parameter for number of items per page.
-
-    Returns:
-    JSON response containing a list of active games associated with the user.
+    Publishes this worker's room subscriber counts to the other workers every 'room_sync_interval' seconds.
     """
-    try:
-        games = game.get_by_user_id(
-            session, 
-            id, 
-            itemOffset=request.args.get('itemOffset', type=int), 
-            per_page=request.args.get('itemsPerPage', type=int),
-            expired=True
-        )
-        return jsonify(games)
-    except GameNotFoundException:
-        return "GameNotFound: No games found relating to the specified user ID", 404
-
-@app.route('/game/<string:id>', methods=['GET'])
-@with_session
-def get_game_by_id(session, id):
+    while True:
+        socketio.sleep(ROOM_SYNC_INTERVAL)
+        publish_cluster_message('room_subscribers', room_tracker.snapshot())
+
+# With a message queue, every worker applies the changes committed by the others to its own game cache,
+# and keeps count of the subscribers of the others
+if isinstance(socketio.server.manager, message_queue.ClusterMixin):
+    socketio.server.manager.add_cluster_listener('game_delta', game.update_cache)
+    game.set_cache_coherent(True)
+    socketio.server.manager.add_cluster_listener('profile_updated', user.invalidate_profile)
+    socketio.server.manager.add_cluster_listener('profile_updated', game.forget_profile)
+    socketio.server.manager.add_cluster_listener('room_subscribers', room_tracker.apply)
+    message_queue.start_listening(socketio.server)
+    socketio.start_background_task(publish_room_counts)
+
+@app.before_request
+def begin_request_metrics():
+    metrics.begin(request.url_rule.rule if request.url_rule else 'unmatched')
+
+@app.after_request
+def add_server_timing(response):
+    measurements = metrics.end()
+    if measurements:
+        response.headers['Server-Timing'] = metrics.server_timing(measurements)
+    return response
+
+@app.after_request
+def compress_response(response):
     """
-    Retrieves comprehensive information about a game, identified by its unique ID.
-
-    Methods:
-    GET
-
-    URL Parameters:
-    id (str): The unique identifier of the game to retrieve.
-
-    Returns:
-    JSON response with game data if found.
+    Compresses JSON responses of at least 'compression_min_size' bytes with the best encoding the client accepts,
+    brotli or gzip, in the order of preference set with 'response_compression'.
+    Streamed exports and responses that are already encoded are sent as is.
+    Whenever an encoding is negotiated, the entity tag of a JSON resource is made weak, whether or not its body was compressed,
+    and 304 responses to JSON resources carry the same Vary header and entity tag as the 200 response they stand for.
     """
-    try:
-      game_data = game.get_by_id(session, id)
-      return jsonify(game_data)
-    except GameNotFoundException:
-      return "GameNotFound: No game found with the specified ID", 404
+    if response.is_streamed or response.status_code not in (200, 304) or not routes.is_json_resource(response) or response.content_encoding:
+        return response
+    response.vary.add('Accept-Encoding')
+    encoding = serialization.choose_encoding(request.accept_encodings)
+    if encoding is None:
+        return response
+    # A compressed body is no longer byte-for-byte the entity a strong tag describes
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(etag, weak=True)
+    if response.status_code != 200 or response.content_length < COMPRESSION_MIN_SIZE:
+        return response
+
+    response.set_data(serialization.compress(response.get_data(), encoding))
+    response.content_encoding = encoding
+    return response
+
+@app.teardown_request
+def end_request_metrics(exception):
+    # Records requests that failed before a response was made
+    metrics.end()
 
+def with_session(func):
+    def wrapper(*args, **kwargs):
+        # Socket.IO events are recorded here, since they do not go through the Flask request hooks
+        with metrics.track(func.__name__):
+            session = database.get_session()
+            try:
+                return func(session, *args, **kwargs)
+            except SQLAlchemyError as e:
+                session.rollback()
+                raise e
+            finally:
+                database.remove_session()
+    # Assign a unique name to the wrapper function based on the original function name
+    wrapper.__name__ = func.__name__ + '_with_session'
+    return wrapper
 
-@app.route('/game/create', methods=['POST'])
-@with_session
-def create_game(session):
+def publish_cluster_message(kind, payload):
     """
-    Creates a new game based on specifications provided in the request body. 
-    Commits the game and its settings to the database.
-
-    Methods:
-    POST
-
-    Request Body:
-    JSON containing the specifications for the new game.
+    Publishes a message to every worker sharing the Socket.IO message queue. Does nothing when there is no message queue.
 
-    Returns:
-    JSON response containing the newly created game data.
+    Parameters:
+    kind (str): The kind of message.
+    payload: A JSON-serializable payload.
     """
-    data = request.get_json()
-    created_game = game.create(session, data)
-    return created_game, 201
+    if isinstance(socketio.server.manager, message_queue.ClusterMixin):
+        socketio.server.manager.publish_cluster_message(kind, payload)
 
-@app.route('/game/settings/update', methods=['POST'])
-@with_session
-def update_game_settings(session):
+def emit_to_room(event, data, room):
     """
-    Updates attributes of a game's settings. The updates are specified in the request body. 
-    Upon successful update, a 'game_updated' event is emitted to all subscribers of the game room via SocketIO.
-
-    Methods:
-    POST
+    Emits a Socket.IO event to every subscriber of a room, recording its payload size in the metrics and the room's statistics.
+    The payload is serialized once, for both the metrics and the packet sent to every subscriber.
 
-    Request Body:
-    JSON containing the game ID and a list of update requests for the game settings.
-
-    Returns:
-    JSON response with the updated game data.
+    Parameters:
+    event (str): The name of the event.
+    data: The JSON-serializable payload of the event.
+    room (str): The room to emit to.
     """
-    data = request.get_json()
-    updated_game = game.update_settings(session, data)
-    socketio.emit('game_updated', updated_game, room=updated_game['id'])
-    return updated_game, 200
+    encoded, payload = serialization.preserialize(data)
+    metrics.record_emit(event, len(encoded))
+    room_tracker.record_emit(room, len(encoded))
+    socketio.emit(event, payload if embed_payloads else data, room=room)
 
-@app.route('/game/join', methods=['POST'])
-@with_session
-def join_game(session):
+def broadcast_game_updates(session):
     """
-    Adds the specified user as a member of a given game. 
-    Details of the user and the game are provided in the request body.
+    Broadcasts the changes committed on a session to the subscribers of each affected game.
+    Other workers are told of the changes right away, so their game caches stay current,
+    and the changes to games that have subscribers are queued on the broadcast dispatcher,
+    which sends them with 'send_game_updates()' from a background task.
 
-    Methods:
-    POST
-
-    Request Body:
-    JSON containing the user ID and game ID.
-
-    Returns:
-    An empty response with a 201 status code upon success.
+    Parameters:
+    session (Session): The database session the changes were committed with.
     """
-    data = request.get_json()
-    try:
-      game.join(session, data)
-      return "", 201
-    
-    except GameNotFoundException:
-        return "Game Not Found: The given game ID could not be found", 404
-    except InvalidGamePasswordException:
-        return "Invalid Credentials: The supplied game password is incorrect", 401
-        
+    for delta in game.pop_deltas(session):
+        publish_cluster_message('game_delta', delta)
+        if room_tracker.is_watched(delta['gameID']):
+            dispatcher.submit(delta)
 
-@app.route('/game/transaction/create', methods=['POST'])
 @with_session
-def create_transaction(session):
+def send_game_updates(session, game_id, deltas):
     """
-    Handles the creation of transactions within a game. 
-    The transaction details are provided in the request body. 
-    Upon successful creation, a 'game_updated' event is emitted to all subscribers of the game room via SocketIO.
-
-    Methods:
-    POST
+    Sends the changes to a game coalesced by the broadcast dispatcher.
+    A 'game_delta' event carrying only the changes is emitted to the game room,
+    and a 'game_updated' event carrying the current game document is emitted to the subscribers that opted in to it.
+    Rooms left empty since the changes were queued are skipped, and the document is only built if it is sent.
 
-    Request Body:
-    JSON containing transaction details such as game ID, amount, and type.
-
-    Returns:
-    JSON response with the transaction amount and type.
-    """
-    data = request.get_json()
-    try:
-        amount, type = game.create_transaction(session, data)
-        updated_game = game.get_by_id(session, data['gameID'])
-        socketio.emit('game_updated', updated_game, room=updated_game['id'])
-        return { 'amount': amount, 'type': type }, 201
-    except InvalidTransactionException:
-        return "Invalid Transaction Error: The provided transaction was invalid", 400
-
-
-@app.route('/login', methods=['POST'])
-@with_session
-def login(session):
+    Parameters:
+    session (Session): The database session to use for queries.
+    game_id (str): The ID of the game.
+    deltas (list): The coalesced deltas, as returned by 'broadcast.coalesce()'.
     """
-    Authenticates a user based on their email and password. 
-    On successful authentication, a JSON Web Token (JWT) is generated and returned.
-
-    Methods:
-    POST
+    if room_tracker.is_watched(game_id):
+        for delta in deltas:
+            emit_to_room('game_delta', delta, game_id)
+    if room_tracker.is_watched(rooms.full_document_room(game_id)):
+        emit_to_room('game_updated', game.get_by_id(session, game_id), rooms.full_document_room(game_id))
 
-    Request Body:
-    JSON containing the user's email and password.
+dispatcher = broadcast.BroadcastDispatcher(send_game_updates, BROADCAST_WINDOW, socketio.start_background_task, socketio.sleep)
 
-    Returns:
-    JSON response with a generated JWT for the authenticated user.
+class FlaskApi(routes.Api):
     """
-    data = request.get_json()
-    try:
-      profile_data = user.login(session, data)
-      return { "jwt": auth.generate_jwt(profile_data) }
-
-    except EmailNotFoundException:
-        return "EmailNotFound: No profile with the given email could be found", 404
-    except InvalidUserPasswordException:
-        return "Invalid Credentials: The supplied username and password are invalid", 401
-
-@app.route('/signup', methods=['POST'])
-@with_session
-def signup(session):
+    The operations the shared route handlers use, on Flask. See 'routes.Api'.
+    Service functions are called directly, so the handlers never suspend.
     """
-    Registers a new user in the database. The user's details are provided in the request body.
-    If the email already exists in the database, an exception is raised.
+    request = request
+    Response = flask.Response
+    room_tracker = room_tracker
 
-    Methods:
-    POST
-
-    Request Body:
-    JSON containing the new user's profile information.
-
-    Returns:
-    An empty response with a 201 status code upon successful registration.
-    """
-    data = request.get_json()
-    try:
-      user.create(session, data)
-      return "", 201
+    @contextlib.asynccontextmanager
+    async def session(self):
+        session = database.get_session()
+        try:
+            yield session
+        except SQLAlchemyError:
+            session.rollback()
+            raise
+        finally:
+            database.remove_session()
 
-    except EmailAlreadyExistsException:
-      return "EmailAlreadyExists: A profile with the given email already exists within the database", 401
-    
-@app.route('/verifyUniqueEmail', methods=['POST'])
-@with_session
-def verifyUniqueEmail(session):
-    """
-    Verifies whether the provided email in the request body already exists in the database.
+    def variant(self, func):
+        return func
 
-    Methods:
-    POST
+    async def call(self, func, *args, **kwargs):
+        return func(*args, **kwargs)
 
-    Request Body:
-    JSON containing the email to verify.
+    async def get_json(self):
+        return request.get_json()
 
-    Returns:
-    A response with "true" or "false" based on the uniqueness of the email.
-    """
-    data = request.get_json()
-    try:
-      user.verifyUniqueEmail(session, data)
-      return "true", 200
+    def jsonify(self, data):
+        return jsonify(data)
 
-    except EmailAlreadyExistsException:
-      return "false", 200
-    
-@app.route('/updateUser', methods=['POST'])
-@with_session
-def updateUser(session):
-    """
-    Allows a user to update their profile details like first name, last name, and email. 
-    The updated information is provided in the request body. 
-    A new JWT is generated and returned after the update.
+    def get_pool_stats(self):
+        return database.get_pool_stats()
 
-    Methods:
-    POST
+    async def publish_cluster_message(self, kind, payload):
+        publish_cluster_message(kind, payload)
 
-    Request Body:
-    JSON containing the user's updated profile information.
+    async def broadcast_game_updates(self, session):
+        broadcast_game_updates(session)
 
-    Returns:
-    JSON response with a new JWT for the updated profile.
-    """
-    data = request.get_json()
-    try:
-      profile_data = user.updateUser(session, data)
-      return { "jwt": auth.generate_jwt(profile_data) }
+routes.register(app, FlaskApi())
 
-    except EmailAlreadyExistsException:
-      return "EmailAlreadyExists: A profile with the given email already exists within the database", 401
-    
 @socketio.on('subscribe_to_game')
 def on_subscribe_to_game(data):
     """
     SocketIO event for subscribing to game updates.
 
-    When a client connects to this SocketIO event with a game ID, 
+    When a client connects to this SocketIO event with a game ID,
     they are added to a room specific to that game to receive real-time updates.
+    Subscribers receive 'game_delta' events carrying only what changed, and a sequence number
+    that increases by one with every change to the game. Changes made within 'broadcast_window' of each other
+    are combined into one delta, whose 'baseSeq' is the sequence number of the version it applies to.
+    Subscribers that set 'full_document' additionally receive a 'game_updated' event carrying the full game document,
+    at most once per window.
 
     Parameters:
-    data (dict): Data containing the 'game_id' key to specify which game room to join.
+    data (dict): Data containing the 'game_id' key to specify which game room to join, and an optional 'full_document' flag.
     """
     game_id = data['game_id']
-    join_room(game_id)
+    joined = [game_id, rooms.full_document_room(game_id)] if data.get('full_document') else [game_id]
+    for room in joined:
+        join_room(room)
+    publish_cluster_message('room_subscribers', room_tracker.join(request.sid, joined))
 
 @socketio.on('unsubscribe_from_game')
 def on_unsubscribe_from_game(data):
@@ -340,7 +257,37 @@ def on_unsubscribe_from_game(data):
     data (dict): Data containing the 'game_id' key to specify which game room to leave.
     """
     game_id = data['game_id']
-    leave_room(game_id)
+    left = [game_id, rooms.full_document_room(game_id)]
+    for room in left:
+        leave_room(room)
+    publish_cluster_message('room_subscribers', room_tracker.leave(request.sid, left))
+
+@socketio.on('disconnect')
+def on_disconnect(reason=None):
+    """
+    SocketIO event for a client disconnecting, which removes it from the subscriber counts of every game room it was in.
+    """
+    update = room_tracker.disconnect(request.sid)
+    if update is not None:
+        publish_cluster_message('room_subscribers', update)
+
+@socketio.on('resync_game')
+@with_session
+def on_resync_game(session, data):
+    """
+    SocketIO event for requesting the full state of a game,
+    for example after a client detects a gap in the sequence numbers of the 'game_delta' events it received.
+
+    The full game document is sent back to the requesting client only, as a 'game_resync' event.
+    Its 'version' is the sequence number of the last change it includes.
+
+    Parameters:
+    data (dict): Data containing the 'game_id' key to specify which game to resync.
+    """
+    try:
+        emit('game_resync', game.get_by_id(session, data['game_id']))
+    except GameNotFoundException:
+        emit('game_resync', {'id': data['game_id'], 'error': 'GameNotFound'})
     
 if __name__ == '__main__':
     socketio.run(app, host=API_HOST, port=API_PORT)
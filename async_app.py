@@ -0,0 +1,283 @@
+"""
+Asyncio entry point, serving the routes of 'routes' and the same Socket.IO events as 'app.py' on an ASGI server.
+
+Database calls are awaited on the event loop through asyncio sessions from 'async_database', and passwords are
+hashed on the hashing pool without blocking it, so one worker can hold many idle websocket connections
+and slow queries without tying up a thread each.
+
+Usage:
+python async_app.py
+uvicorn async_app:asgi_app --host 0.0.0.0 --port 5000
+"""
+import contextlib
+
+import quart
+from quart import request, jsonify
+from quart.wrappers.response import DataBody
+from quart_cors import cors
+import socketio
+from sqlalchemy.exc import SQLAlchemyError
+
+import async_database
+import broadcast
+from constants import API_HOST, API_PORT, BROADCAST_WINDOW, CLIENT_HOST, CLIENT_PORT, COMPRESSION_MIN_SIZE, ROOM_SYNC_INTERVAL, SOCKETIO_MESSAGE_QUEUE, SOCKETIO_SERIALIZER
+import game
+from game import GameNotFoundException
+import message_queue
+import metrics
+import rooms
+import routes
+import serialization
+import user
+
+class Response(quart.Response):
+    """
+    Quart response that sends no Content-Type with a 304 response, as Werkzeug's WSGI layer does for Flask.
+    """
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        if self.status_code == 304:
+            self.headers.pop('Content-Type', None)
+
+app = cors(quart.Quart(__name__))
+app.response_class = Response
+app.json = serialization.FastJSONProvider(app)
+sio = socketio.AsyncServer(
+    async_mode='asgi',
+    cors_allowed_origins=f"http://{CLIENT_HOST}:{CLIENT_PORT}",
+    client_manager=message_queue.create_async_client_manager(SOCKETIO_MESSAGE_QUEUE),
+    json=serialization.SocketIOJSON,
+    serializer=SOCKETIO_SERIALIZER
+)
+asgi_app = socketio.ASGIApp(sio, other_asgi_app=app)
+
+# Payloads are serialized once and embedded as is in JSON packets, unless they are sent through a message queue
+embed_payloads = SOCKETIO_SERIALIZER == 'default' and not isinstance(sio.manager, message_queue.AsyncClusterMixin)
+
+# Subscribers of each room, on this worker and, with a message queue, on the others
+room_tracker = rooms.RoomTracker(ROOM_SYNC_INTERVAL if isinstance(sio.manager, message_queue.AsyncClusterMixin) else None)
+
+async def publish_room_counts():
+    """
+    Publishes this worker's room subscriber counts to the other workers, like 'app.publish_room_counts()'.
+    """
+    while True:
+        await sio.sleep(ROOM_SYNC_INTERVAL)
+        await publish_cluster_message('room_subscribers', room_tracker.snapshot())
+
+# With a message queue, every worker applies the changes committed by the others to its own game cache,
+# and keeps count of the subscribers of the others
+if isinstance(sio.manager, message_queue.AsyncClusterMixin):
+    sio.manager.add_cluster_listener('game_delta', game.update_cache)
+    game.set_cache_coherent(True)
+    sio.manager.add_cluster_listener('profile_updated', user.invalidate_profile)
+    sio.manager.add_cluster_listener('profile_updated', game.forget_profile)
+    sio.manager.add_cluster_listener('room_subscribers', room_tracker.apply)
+
+@app.before_serving
+async def start():
+    if isinstance(sio.manager, message_queue.AsyncClusterMixin):
+        message_queue.start_listening(sio)
+        sio.start_background_task(publish_room_counts)
+
+@app.after_serving
+async def stop():
+    await async_database.dispose()
+
+def with_session(func):
+    async def wrapper(*args, **kwargs):
+        # Socket.IO events are recorded here, since they do not go through the Quart request hooks
+        with metrics.track(func.__name__):
+            session = async_database.get_session()
+            try:
+                return await func(session, *args, **kwargs)
+            except SQLAlchemyError as e:
+                await session.rollback()
+                raise e
+            finally:
+                await session.close()
+    # Assign a unique name to the wrapper function based on the original function name
+    wrapper.__name__ = func.__name__ + '_with_session'
+    return wrapper
+
+@app.before_request
+async def begin_request_metrics():
+    metrics.begin(request.url_rule.rule if request.url_rule else 'unmatched')
+
+@app.after_request
+async def add_server_timing(response):
+    measurements = metrics.end()
+    if measurements:
+        response.headers['Server-Timing'] = metrics.server_timing(measurements)
+    return response
+
+@app.after_request
+async def compress_response(response):
+    """
+    Compresses large JSON responses with the encoding negotiated from the Accept-Encoding header. See 'app.compress_response()'.
+    """
+    if not isinstance(response.response, DataBody) or response.status_code not in (200, 304) or not routes.is_json_resource(response) or response.content_encoding:
+        return response
+    response.vary.add('Accept-Encoding')
+    encoding = serialization.choose_encoding(request.accept_encodings)
+    if encoding is None:
+        return response
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(etag, weak=True)
+    if response.status_code != 200 or response.content_length < COMPRESSION_MIN_SIZE:
+        return response
+
+    response.set_data(serialization.compress(await response.get_data(), encoding))
+    response.content_encoding = encoding
+    return response
+
+@app.teardown_request
+async def end_request_metrics(exception):
+    # Records requests that failed before a response was made
+    metrics.end()
+
+async def publish_cluster_message(kind, payload):
+    """
+    Publishes a message to every worker sharing the Socket.IO message queue. Does nothing when there is no message queue.
+
+    Parameters:
+    kind (str): The kind of message.
+    payload: A JSON-serializable payload.
+    """
+    if isinstance(sio.manager, message_queue.AsyncClusterMixin):
+        await sio.manager.publish_cluster_message(kind, payload)
+
+async def emit_to_room(event, data, room):
+    """
+    Emits a Socket.IO event to every subscriber of a room, recording its payload size in the metrics and the room's statistics.
+
+    Parameters:
+    event (str): The name of the event.
+    data: The JSON-serializable payload of the event.
+    room (str): The room to emit to.
+    """
+    encoded, payload = serialization.preserialize(data)
+    metrics.record_emit(event, len(encoded))
+    room_tracker.record_emit(room, len(encoded))
+    await sio.emit(event, payload if embed_payloads else data, room=room)
+
+async def broadcast_game_updates(session):
+    """
+    Broadcasts the changes committed on a session to the subscribers of each affected game, like 'app.broadcast_game_updates()'.
+
+    Parameters:
+    session (AsyncSession): The database session the changes were committed with.
+    """
+    for delta in game.pop_deltas(session):
+        await publish_cluster_message('game_delta', delta)
+        if room_tracker.is_watched(delta['gameID']):
+            dispatcher.submit(delta)
+
+@with_session
+async def send_game_updates(session, game_id, deltas):
+    """
+    Sends the changes to a game coalesced by the broadcast dispatcher, like 'app.send_game_updates()'.
+
+    Parameters:
+    session (AsyncSession): The database session to use for queries.
+    game_id (str): The ID of the game.
+    deltas (list): The coalesced deltas, as returned by 'broadcast.coalesce()'.
+    """
+    if room_tracker.is_watched(game_id):
+        for delta in deltas:
+            await emit_to_room('game_delta', delta, game_id)
+    if room_tracker.is_watched(rooms.full_document_room(game_id)):
+        await emit_to_room('game_updated', await game.get_by_id_async(session, game_id), rooms.full_document_room(game_id))
+
+dispatcher = broadcast.AsyncBroadcastDispatcher(send_game_updates, BROADCAST_WINDOW, sio.start_background_task, sio.sleep)
+
+class QuartApi(routes.Api):
+    """
+    The operations the shared route handlers use, on Quart. See 'routes.Api'.
+    Service functions are called through their '_async' variants, so the handlers await the database on the event loop.
+    """
+    request = request
+    Response = Response
+    room_tracker = room_tracker
+
+    @contextlib.asynccontextmanager
+    async def session(self):
+        session = async_database.get_session()
+        try:
+            yield session
+        except SQLAlchemyError:
+            await session.rollback()
+            raise
+        finally:
+            await session.close()
+
+    def variant(self, func):
+        return routes.find_async_variant(func)
+
+    async def call(self, func, *args, **kwargs):
+        return await routes.find_async_variant(func)(*args, **kwargs)
+
+    async def get_json(self):
+        return await request.get_json()
+
+    def jsonify(self, data):
+        return jsonify(data)
+
+    def get_pool_stats(self):
+        return async_database.get_pool_stats()
+
+    async def publish_cluster_message(self, kind, payload):
+        await publish_cluster_message(kind, payload)
+
+    async def broadcast_game_updates(self, session):
+        await broadcast_game_updates(session)
+
+routes.register(app, QuartApi())
+
+@sio.on('subscribe_to_game')
+async def on_subscribe_to_game(sid, data):
+    """
+    SocketIO event for subscribing to game updates. See 'app.on_subscribe_to_game()'.
+    """
+    game_id = data['game_id']
+    joined = [game_id, rooms.full_document_room(game_id)] if data.get('full_document') else [game_id]
+    for room in joined:
+        await sio.enter_room(sid, room)
+    await publish_cluster_message('room_subscribers', room_tracker.join(sid, joined))
+
+@sio.on('unsubscribe_from_game')
+async def on_unsubscribe_from_game(sid, data):
+    """
+    SocketIO event for unsubscribing from game updates. See 'app.on_unsubscribe_from_game()'.
+    """
+    game_id = data['game_id']
+    left = [game_id, rooms.full_document_room(game_id)]
+    for room in left:
+        await sio.leave_room(sid, room)
+    await publish_cluster_message('room_subscribers', room_tracker.leave(sid, left))
+
+@sio.on('disconnect')
+async def on_disconnect(sid, reason=None):
+    """
+    SocketIO event for a client disconnecting. See 'app.on_disconnect()'.
+    """
+    update = room_tracker.disconnect(sid)
+    if update is not None:
+        await publish_cluster_message('room_subscribers', update)
+
+@sio.on('resync_game')
+@with_session
+async def on_resync_game(session, sid, data):
+    """
+    SocketIO event for requesting the full state of a game. See 'app.on_resync_game()'.
+    """
+    try:
+        await sio.emit('game_resync', await game.get_by_id_async(session, data['game_id']), to=sid)
+    except GameNotFoundException:
+        await sio.emit('game_resync', {'id': data['game_id'], 'error': 'GameNotFound'}, to=sid)
+
+if __name__ == '__main__':
+    import uvicorn
+
+    uvicorn.run(asgi_app, host=API_HOST, port=int(API_PORT))
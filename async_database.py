@@ -0,0 +1,135 @@
+import threading
+import time
+
+from sqlalchemy.engine import make_url
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+import constants
+import database
+import metrics
+import query_log
+
+_lock = threading.Lock()
+_engine = None
+_session_factory = None
+
+# The asyncio drivers used in place of the synchronous ones
+ASYNC_DRIVERS = {
+    'sqlite': 'aiosqlite',
+    'mssql': 'aioodbc',
+    'postgresql': 'asyncpg',
+    'mysql': 'aiomysql',
+}
+
+class TimedAsyncQueuePool(AsyncAdaptedQueuePool):
+    """
+    An AsyncAdaptedQueuePool that records how long callers wait to check out a connection,
+    in the same statistics as 'database.TimedQueuePool'.
+    """
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            database._record_wait(time.perf_counter() - start)
+
+def get_async_database_url():
+    """
+    Builds the connection URL for the asyncio engine, by swapping the driver of the URL returned by 'database.get_database_url()'
+    for its asyncio counterpart, for example aiosqlite for SQLite and aioodbc for SQL Server.
+
+    Returns:
+    str: The SQLAlchemy connection URL.
+    """
+    url = make_url(database.get_database_url())
+    driver = ASYNC_DRIVERS.get(url.get_backend_name())
+    if driver:
+        url = url.set(drivername=f"{url.get_backend_name()}+{driver}")
+    return url.render_as_string(hide_password=False)
+
+def get_async_engine():
+    """
+    Returns the process-wide asyncio connection engine, creating it on first use.
+    The engine uses the same pool settings and instrumentation as 'database.get_engine()'.
+
+    Returns:
+    AsyncEngine: An SQLAlchemy AsyncEngine instance connected to the specified database.
+    """
+    global _engine
+    if _engine is None:
+        # Imported here so that importing the service modules does not load the asyncio extension
+        from sqlalchemy.ext.asyncio import create_async_engine
+
+        with _lock:
+            if _engine is None:
+                _engine = create_async_engine(
+                    get_async_database_url(),
+                    poolclass=TimedAsyncQueuePool,
+                    pool_size=constants.DB_POOL_SIZE,
+                    max_overflow=constants.DB_MAX_OVERFLOW,
+                    pool_timeout=constants.DB_POOL_TIMEOUT,
+                    pool_recycle=constants.DB_POOL_RECYCLE,
+                    pool_pre_ping=constants.DB_POOL_PRE_PING,
+                )
+                metrics.instrument_engine(_engine.sync_engine)
+                if constants.QUERY_DIAGNOSTICS:
+                    query_log.instrument_engine(_engine.sync_engine)
+    return _engine
+
+def get_session():
+    """
+    Creates a new asyncio session bound to the engine returned by 'get_async_engine()'.
+    Unlike 'database.get_session()', sessions are not shared per thread, since many requests run on the same thread;
+    the caller closes the session when it is done with it.
+
+    Returns:
+    AsyncSession: An SQLAlchemy asyncio session object for database operations.
+    """
+    global _session_factory
+    if _session_factory is None:
+        from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+        engine = get_async_engine()
+        with _lock:
+            if _session_factory is None:
+                _session_factory = async_sessionmaker(engine, class_=AsyncSession)
+    return _session_factory()
+
+def get_pool_stats():
+    """
+    Reports the current state of the asyncio connection pool, in the same format as 'database.get_pool_stats()'.
+
+    Returns:
+    dict: A dictionary containing the pool size, checked out connections, overflow, and checkout wait times in seconds.
+    """
+    return database.get_pool_stats(get_async_engine().pool)
+
+async def dispose():
+    """
+    Closes every pooled connection and discards the asyncio engine.
+    """
+    global _engine, _session_factory
+    engine = _engine
+    with _lock:
+        _engine = None
+        _session_factory = None
+    if engine is not None:
+        await engine.dispose()
+
+def async_variant(func):
+    """
+    Builds an asyncio variant of a service function that takes a session as its first argument.
+    The variant takes an AsyncSession instead, and runs the function with the synchronous session it wraps,
+    so every database call inside it is awaited on the event loop rather than blocking it.
+
+    Parameters:
+    func (callable): The service function.
+
+    Returns:
+    callable: A coroutine function with the same arguments.
+    """
+    async def variant(session, *args, **kwargs):
+        return await session.run_sync(func, *args, **kwargs)
+    variant.__name__ = func.__name__ + '_async'
+    variant.__doc__ = f"Asyncio variant of '{func.__name__}()', taking an AsyncSession. See 'async_database.async_variant()'."
+    return variant
@@ -0,0 +1,154 @@
+"""
+Side-by-side benchmark of the synchronous server ('app.py' under socketio.run) and the asyncio server ('async_app.py' under uvicorn).
+
+Both servers are started in turn as separate processes on the same seeded SQLite database. Each is loaded with
+a number of idle Socket.IO connections subscribed to games, and a number of concurrent HTTP clients issuing
+game reads, user game lists and buy-ins over real sockets. Throughput and p50/p95/p99 latency are reported as JSON,
+one object per server.
+
+Requires httpx and aiohttp for the clients.
+
+Usage:
+python benchmarks/async_vs_sync.py --concurrency 32 --idle-sockets 200 --duration 10
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+for name, value in {
+    'env': 'local',
+    'database_url': 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'async_vs_sync.db'),
+    'api_host': '127.0.0.1',
+    'api_port': '5000',
+    'client_host': 'localhost',
+    'client_port': '8100',
+    'password_hash_rounds': '10',
+}.items():
+    os.environ.setdefault(name, value)
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import httpx
+import socketio
+
+import migrations
+from load_test import seed
+
+SERVERS = {
+    'sync': "import app; app.socketio.run(app.app, host='127.0.0.1', port={port}, allow_unsafe_werkzeug=True, log_output=False)",
+    'async': "import uvicorn, async_app; uvicorn.run(async_app.asgi_app, host='127.0.0.1', port={port}, log_level='warning')",
+}
+
+def start_server(mode, port):
+    process = subprocess.Popen(
+        [sys.executable, '-c', SERVERS[mode].format(port=port)],
+        cwd=ROOT,
+        env=dict(os.environ, api_port=str(port)),
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        try:
+            httpx.get(f'http://127.0.0.1:{port}/', timeout=1)
+            return process
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    process.kill()
+    raise SystemExit(f'The {mode} server did not start')
+
+async def open_idle_sockets(url, count, games):
+    clients = []
+    for _ in range(count):
+        client = socketio.AsyncClient()
+        await client.connect(url, transports=['websocket'])
+        await client.emit('subscribe_to_game', {'game_id': random.choice(games)})
+        clients.append(client)
+    return clients
+
+async def run_client(client, games, profiles, members, end, samples):
+    while time.perf_counter() < end:
+        choice = random.random()
+        began = time.perf_counter()
+        if choice < 0.6:
+            name = 'game'
+            response = await client.get(f'/game/{random.choice(games)}')
+        elif choice < 0.85:
+            name = 'list'
+            response = await client.get(f'/game/active/user/{random.choice(profiles)}', params={'itemsPerPage': 10, 'cursor': ''})
+        else:
+            name = 'transaction'
+            game_id = random.choice(games)
+            response = await client.post('/game/transaction/create', json={
+                'gameID': game_id,
+                'profileID': random.choice(members[game_id]),
+                'type': 'BUY_IN',
+                'amount': 5,
+                'denominations': [5],
+            })
+        samples.setdefault(name, []).append((time.perf_counter() - began, response.status_code < 500))
+
+def percentile(values, fraction):
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+async def measure(mode, port, args, members):
+    url = f'http://127.0.0.1:{port}'
+    games = list(members)
+    profiles = list(range(1, args.profiles + 1))
+    sockets = await open_idle_sockets(url, args.idle_sockets, games)
+
+    samples = {}
+    limits = httpx.Limits(max_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=url, limits=limits, timeout=30) as client:
+        end = time.perf_counter() + args.duration
+        await asyncio.gather(*(run_client(client, games, profiles, members, end, samples) for _ in range(args.concurrency)))
+
+    for sock in sockets:
+        await sock.disconnect()
+
+    results = {'mode': mode, 'concurrency': args.concurrency, 'idleSockets': args.idle_sockets, 'endpoints': {}}
+    for name, values in samples.items():
+        latencies = sorted(latency for latency, _ in values)
+        results['endpoints'][name] = {
+            'requests': len(values),
+            'errors': sum(1 for _, ok in values if not ok),
+            'throughput': len(values) / args.duration,
+            'p50': percentile(latencies, 0.50),
+            'p95': percentile(latencies, 0.95),
+            'p99': percentile(latencies, 0.99),
+        }
+    results['throughput'] = sum(endpoint['throughput'] for endpoint in results['endpoints'].values())
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--profiles', type=int, default=200)
+    parser.add_argument('--games', type=int, default=500)
+    parser.add_argument('--concurrency', type=int, default=16, help='Concurrent HTTP clients.')
+    parser.add_argument('--idle-sockets', type=int, default=100, help='Idle Socket.IO connections held open during the run.')
+    parser.add_argument('--duration', type=float, default=10)
+    parser.add_argument('--modes', nargs='+', choices=list(SERVERS), default=list(SERVERS))
+    parser.add_argument('--port', type=int, default=5091)
+    args = parser.parse_args()
+
+    random.seed(0)
+    migrations.upgrade()
+    members = seed(args.profiles, args.games, members=6, transactions=20)
+
+    for mode in args.modes:
+        process = start_server(mode, args.port)
+        try:
+            print(json.dumps(asyncio.run(measure(mode, args.port, args, members))))
+        finally:
+            process.terminate()
+            process.wait()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,102 @@
+"""
+Measures how long a broadcast takes to reach every worker through the Socket.IO message queue,
+as the number of workers grows.
+
+A local broker is started, and each worker is a separate process running a Socket.IO server whose
+client manager is connected to it. The main process publishes timestamped messages the same way a worker
+broadcasts a game update, and every worker reports when it received each of them.
+
+Usage:
+python benchmarks/broadcast_latency.py --workers 1 2 4 8 --messages 500
+python benchmarks/broadcast_latency.py --queue redis://localhost:6379/0
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import socketio
+
+import message_queue
+
+def run_worker(url, ready, results, expected):
+    server = socketio.Server(client_manager=message_queue.create_client_manager(url))
+    received = []
+
+    def on_ping(payload):
+        received.append(time.time() - payload['sent'])
+
+    server.manager.add_cluster_listener('ping', on_ping)
+    message_queue.start_listening(server)
+    ready.set()
+
+    deadline = time.time() + 60
+    while len(received) < expected and time.time() < deadline:
+        time.sleep(0.01)
+    results.put(received)
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+def measure(url, workers, messages, interval):
+    ready = [multiprocessing.Event() for _ in range(workers)]
+    results = multiprocessing.Queue()
+    processes = [
+        multiprocessing.Process(target=run_worker, args=(url, ready[i], results, messages), daemon=True)
+        for i in range(workers)
+    ]
+    for process in processes:
+        process.start()
+    for event in ready:
+        event.wait()
+    # Gives every worker time to connect to the queue before publishing
+    time.sleep(0.5)
+
+    publisher = message_queue.create_client_manager(url)
+    for _ in range(messages):
+        publisher.publish_cluster_message('ping', {'sent': time.time()})
+        time.sleep(interval)
+
+    latencies = []
+    received = 0
+    for _ in processes:
+        worker_latencies = results.get(timeout=120)
+        received += len(worker_latencies)
+        latencies.extend(worker_latencies)
+    for process in processes:
+        process.join()
+
+    return {
+        'workers': workers,
+        'messages': messages,
+        'delivered': received / (workers * messages),
+        'p50Ms': percentile(latencies, 0.50) * 1000,
+        'p95Ms': percentile(latencies, 0.95) * 1000,
+        'p99Ms': percentile(latencies, 0.99) * 1000,
+        'meanMs': statistics.mean(latencies) * 1000,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, 8])
+    parser.add_argument('--messages', type=int, default=200)
+    parser.add_argument('--interval', type=float, default=0.002, help='Seconds between published messages.')
+    parser.add_argument('--queue', help='Message queue URL. Defaults to a local broker started by this script.')
+    args = parser.parse_args()
+
+    url = args.queue
+    if not url:
+        broker = message_queue.run_broker(port=0, background=True)
+        url = 'broker://%s:%d' % broker.server_address
+
+    for workers in args.workers:
+        print(json.dumps(measure(url, workers, args.messages, args.interval)))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,281 @@
+"""
+End-to-end load test for the Flask and Socket.IO API.
+
+The app is booted in-process against a SQLite database, seeded with synthetic profiles, games and
+transactions, and driven by several threads issuing a weighted mix of requests through the Flask and
+Socket.IO test clients, so every request goes through routing, sessions, serialization and broadcasting.
+Throughput, p50/p95/p99 latency and SQL statements per request are reported for each endpoint as JSON.
+Passing the JSON of an earlier run as a baseline prints the change in throughput and latency.
+
+Usage:
+python benchmarks/load_test.py --threads 8 --duration 30 --output results.json
+python benchmarks/load_test.py --profiles 1000 --games 5000 --mix game=60,list=20,transaction=15,login=4,subscribe=1
+python benchmarks/load_test.py --baseline results.json
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+
+for name, value in {
+    'env': 'local',
+    'database_url': 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'load_test.db'),
+    'api_host': '127.0.0.1',
+    'api_port': '5000',
+    'client_host': 'localhost',
+    'client_port': '8100',
+    'password_hash_rounds': '10',
+}.items():
+    os.environ.setdefault(name, value)
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import event, insert
+
+import app
+import database
+import migrations
+import ledger
+from models import Game, GameMember, GameSettings, Profile, Transaction, TransactionTypes
+import passwords
+import stats
+
+PASSWORD = 'load-test'
+DEFAULT_MIX = 'game=50,list=20,transaction=20,login=5,subscribe=5'
+
+_local = threading.local()
+
+def count_statement(*args):
+    _local.statements = getattr(_local, 'statements', 0) + 1
+
+def seed(profiles, games, members, transactions):
+    """
+    Inserts synthetic data in bulk. Every profile shares the same password hash, so seeding does not wait on bcrypt.
+    """
+    session = database.get_session()
+    hash = passwords.hash_password(PASSWORD)
+    session.execute(insert(Profile), [
+        {'email': f'player-{i}@example.com', 'firstName': 'Player', 'lastName': str(i), 'hash': hash}
+        for i in range(profiles)
+    ])
+    profile_ids = list(range(1, profiles + 1))
+
+    session.execute(insert(GameSettings), [
+        {'_min_buy_in': 5, '_max_buy_in': 100, 'denominations': '1,5,25', 'denomination_colors': 'white,red,green'}
+        for _ in range(games)
+    ])
+    game_rows = []
+    member_rows = []
+    transaction_rows = []
+    for i in range(games):
+        game_id = f'load-test-game-{i}'
+        players = random.sample(profile_ids, min(members, profiles))
+        amounts = [random.choice([20, 50, 100]) for _ in range(transactions)]
+        game_rows.append({
+            'id': game_id,
+            'name': f'Game {i}',
+            'settings_id': i + 1,
+            'admin_id': players[0],
+            '_total_pot': sum(amounts),
+            '_available_cashout': sum(amounts),
+        })
+        member_rows.extend({'game_id': game_id, 'profile_id': player} for player in players)
+        transaction_rows.extend(
+            {
+                'game_id': game_id,
+                'profile_id': random.choice(players),
+                'type': TransactionTypes.BUY_IN,
+                '_amount': amount,
+                'denominations': '5,5,5,5',
+            }
+            for amount in amounts
+        )
+    session.execute(insert(Game), game_rows)
+    session.execute(insert(GameMember), member_rows)
+    if transaction_rows:
+        session.execute(insert(Transaction), transaction_rows)
+    stats.rebuild(session.connection())
+    ledger.backfill(session.connection())
+    session.commit()
+    database.remove_session()
+
+    return {row['id']: [m['profile_id'] for m in member_rows if m['game_id'] == row['id']] for row in game_rows}
+
+def request_game(client, socket, games, profiles):
+    game_id = random.choice(list(games))
+    return client.get(f'/game/{game_id}').status_code == 200
+
+def request_list(client, socket, games, profiles):
+    profile_id = random.choice(profiles)
+    response = client.get(f'/game/active/user/{profile_id}', query_string={'itemsPerPage': 10, 'cursor': ''})
+    return response.status_code in (200, 404)
+
+def request_transaction(client, socket, games, profiles):
+    game_id = random.choice(list(games))
+    cash_out = random.random() < 0.2
+    response = client.post('/game/transaction/create', json={
+        'gameID': game_id,
+        'profileID': random.choice(games[game_id]),
+        'type': TransactionTypes.CASH_OUT if cash_out else TransactionTypes.BUY_IN,
+        'amount': random.choice([5, 10, 20]),
+        'denominations': [5],
+    })
+    return response.status_code == 201
+
+def request_stats(client, socket, games, profiles):
+    profile_id = random.choice(profiles)
+    query = {'from': '2000-01-01', 'to': '2100-01-01'} if random.random() < 0.5 else {}
+    return client.get(f'/user/{profile_id}/stats', query_string=query).status_code == 200
+
+def request_login(client, socket, games, profiles):
+    profile_id = random.choice(profiles)
+    response = client.post('/login', json={'email': f'player-{profile_id - 1}@example.com', 'password': PASSWORD})
+    return response.status_code == 200
+
+def request_subscribe(client, socket, games, profiles):
+    game_id = random.choice(list(games))
+    socket.emit('subscribe_to_game', {'game_id': game_id})
+    socket.emit('unsubscribe_from_game', {'game_id': game_id})
+    socket.get_received()
+    return socket.is_connected()
+
+OPERATIONS = {
+    'game': request_game,
+    'list': request_list,
+    'transaction': request_transaction,
+    'stats': request_stats,
+    'login': request_login,
+    'subscribe': request_subscribe,
+}
+
+def parse_mix(text):
+    mix = {}
+    for part in text.split(','):
+        name, weight = part.split('=')
+        if name not in OPERATIONS:
+            raise SystemExit(f'Unknown operation in mix: {name}')
+        mix[name] = float(weight)
+    return mix
+
+def run_client(mix, games, profiles, start, warmup_end, end, samples, lock):
+    client = app.app.test_client()
+    socket = app.socketio.test_client(app.app)
+    names = list(mix)
+    weights = [mix[name] for name in names]
+    local = {name: [] for name in names}
+
+    start.wait()
+    while time.perf_counter() < end:
+        name = random.choices(names, weights)[0]
+        _local.statements = 0
+        began = time.perf_counter()
+        try:
+            ok = OPERATIONS[name](client, socket, games, profiles)
+        except Exception:
+            ok = False
+        finished = time.perf_counter()
+        if began >= warmup_end:
+            local[name].append((finished - began, _local.statements, ok))
+
+    socket.disconnect()
+    with lock:
+        for name, values in local.items():
+            samples[name].extend(values)
+
+def percentile(values, fraction):
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+def summarize(samples, elapsed):
+    results = {}
+    for name, values in samples.items():
+        if not values:
+            continue
+        latencies = sorted(latency for latency, _, _ in values)
+        results[name] = {
+            'requests': len(values),
+            'errors': sum(1 for _, _, ok in values if not ok),
+            'throughput': len(values) / elapsed,
+            'mean': sum(latencies) / len(latencies),
+            'p50': percentile(latencies, 0.50),
+            'p95': percentile(latencies, 0.95),
+            'p99': percentile(latencies, 0.99),
+            'statementsPerRequest': sum(statements for _, statements, _ in values) / len(values),
+        }
+    return results
+
+def compare(baseline, current):
+    for name, result in current['endpoints'].items():
+        previous = baseline.get('endpoints', {}).get(name)
+        if not previous:
+            continue
+        changes = ', '.join(
+            f"{key} {(result[key] - previous[key]) / previous[key] * 100:+.1f}%"
+            for key in ('throughput', 'p50', 'p95', 'p99', 'statementsPerRequest')
+            if previous[key]
+        )
+        print(f'{name}: {changes}', file=sys.stderr)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--profiles', type=int, default=200)
+    parser.add_argument('--games', type=int, default=500)
+    parser.add_argument('--members', type=int, default=6, help='Members per game.')
+    parser.add_argument('--transactions', type=int, default=20, help='Transactions seeded per game.')
+    parser.add_argument('--threads', type=int, default=4)
+    parser.add_argument('--duration', type=float, default=10, help='Seconds measured, after the warmup.')
+    parser.add_argument('--warmup', type=float, default=2, help='Seconds run before measuring.')
+    parser.add_argument('--mix', default=DEFAULT_MIX, help='Comma separated operation=weight pairs.')
+    parser.add_argument('--output', help='File to write the results to, instead of standard output.')
+    parser.add_argument('--baseline', help='Results of an earlier run to compare against.')
+    args = parser.parse_args()
+
+    mix = parse_mix(args.mix)
+    random.seed(0)
+    migrations.upgrade()
+    games = seed(args.profiles, args.games, args.members, args.transactions)
+    profiles = list(range(1, args.profiles + 1))
+    event.listen(database.get_engine(), 'before_cursor_execute', count_statement)
+
+    samples = {name: [] for name in mix}
+    lock = threading.Lock()
+    start = threading.Event()
+    began = time.perf_counter()
+    warmup_end = began + args.warmup
+    end = warmup_end + args.duration
+    threads = [
+        threading.Thread(target=run_client, args=(mix, games, profiles, start, warmup_end, end, samples, lock))
+        for _ in range(args.threads)
+    ]
+    for thread in threads:
+        thread.start()
+    start.set()
+    for thread in threads:
+        thread.join()
+
+    results = {
+        'config': {key: value for key, value in vars(args).items() if key not in ('output', 'baseline')},
+        'database': database.get_engine().url.render_as_string(hide_password=True),
+        'endpoints': summarize(samples, args.duration),
+    }
+    results['total'] = {
+        'requests': sum(result['requests'] for result in results['endpoints'].values()),
+        'errors': sum(result['errors'] for result in results['endpoints'].values()),
+        'throughput': sum(result['throughput'] for result in results['endpoints'].values()),
+    }
+
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump(results, file, indent=2)
+    else:
+        print(json.dumps(results, indent=2))
+
+    if args.baseline:
+        with open(args.baseline) as file:
+            compare(json.load(file), results)
+
+if __name__ == '__main__':
+    main()
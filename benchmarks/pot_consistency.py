@@ -0,0 +1,129 @@
+"""
+Stress test for concurrent buy-ins and cash-outs on a single game.
+
+Several threads, each with its own database session, record random buy-ins, cash-outs and
+small batches against the same game at the same time. Afterwards the game's pot, available cashout and version
+are checked against the transactions that were actually written. The script exits with a non-zero status
+if any update was lost or applied twice.
+
+Usage:
+python benchmarks/pot_consistency.py --threads 8 --operations 200
+database_url=mssql+pyodbc://... python benchmarks/pot_consistency.py
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+
+for name, value in {
+    'env': 'local',
+    'database_url': 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'pot_consistency.db'),
+    'api_host': '127.0.0.1',
+    'api_port': '5000',
+    'client_host': 'localhost',
+    'client_port': '8100',
+}.items():
+    os.environ.setdefault(name, value)
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import func, select
+from sqlalchemy.exc import OperationalError
+
+import database
+import game
+import migrations
+from models import Game, GameMember, GameSettings, Profile, Transaction, TransactionTypes
+
+def seed(players):
+    session = database.get_session()
+    profiles = [Profile(email=f'stress-{i}-{time.time()}@example.com', firstName='Stress', lastName=str(i), hash='-') for i in range(players)]
+    session.add_all(profiles)
+    settings = GameSettings(min_buy_in=1, max_buy_in=100, denominations='1,5', denomination_colors='red,blue')
+    session.add(settings)
+    session.flush()
+    stress_game = Game(name='Stress', settings_id=settings.id, admin_id=profiles[0].id)
+    session.add(stress_game)
+    session.flush()
+    session.add_all(GameMember(game_id=stress_game.id, profile_id=profile.id) for profile in profiles)
+    session.commit()
+    ids = stress_game.id, [profile.id for profile in profiles]
+    database.remove_session()
+    return ids
+
+def run_writer(game_id, profile_ids, operations, counts, lock):
+    session = database.get_session()
+    for _ in range(operations):
+        records = [
+            {
+                'gameID': game_id,
+                'profileID': random.choice(profile_ids),
+                'type': random.choice([TransactionTypes.BUY_IN, TransactionTypes.BUY_IN, TransactionTypes.CASH_OUT]),
+                'amount': round(random.uniform(1, 25), 2),
+                'denominations': [1],
+            }
+            for _ in range(random.choice([1, 1, 1, 3]))
+        ]
+        try:
+            game.create_transactions(session, records)
+            outcome = 'committed'
+        except game.GameUpdateConflictException:
+            outcome = 'conflicts'
+        except OperationalError:
+            # For example SQLite's "database is locked"; nothing was written
+            session.rollback()
+            outcome = 'errors'
+        with lock:
+            counts[outcome] += 1
+    database.remove_session()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--operations', type=int, default=100, help='Operations per thread.')
+    parser.add_argument('--players', type=int, default=10)
+    args = parser.parse_args()
+
+    migrations.upgrade()
+    game_id, profile_ids = seed(args.players)
+
+    counts = {'committed': 0, 'conflicts': 0, 'errors': 0}
+    lock = threading.Lock()
+    threads = [
+        threading.Thread(target=run_writer, args=(game_id, profile_ids, args.operations, counts, lock))
+        for _ in range(args.threads)
+    ]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    session = database.get_session()
+    stress_game = session.get(Game, game_id)
+    bought_in = session.scalar(select(func.coalesce(func.sum(Transaction._amount), 0)).filter_by(game_id=game_id, type=TransactionTypes.BUY_IN))
+    cashed_out = session.scalar(select(func.coalesce(func.sum(Transaction._amount), 0)).filter_by(game_id=game_id, type=TransactionTypes.CASH_OUT))
+
+    failures = []
+    if abs(stress_game.total_pot - bought_in) > 0.005:
+        failures.append(f'total pot {stress_game.total_pot} != bought in {bought_in:.2f}')
+    if abs(stress_game.available_cashout - (bought_in - cashed_out)) > 0.005:
+        failures.append(f'available cashout {stress_game.available_cashout} != bought in - cashed out {bought_in - cashed_out:.2f}')
+    if stress_game.available_cashout < 0:
+        failures.append(f'available cashout {stress_game.available_cashout} is negative')
+    if stress_game.version != 1 + counts['committed']:
+        failures.append(f'version {stress_game.version} != 1 + committed operations {counts["committed"]}')
+
+    print(f"{counts['committed']} committed, {counts['conflicts']} gave up after retries, {counts['errors']} failed "
+          f"in {elapsed:.2f}s ({counts['committed'] / elapsed:.0f} operations/s)")
+    print(f'total pot {stress_game.total_pot}, available cashout {stress_game.available_cashout}, version {stress_game.version}')
+    for failure in failures:
+        print('INCONSISTENT:', failure)
+    sys.exit(1 if failures else 0)
+
+if __name__ == '__main__':
+    main()
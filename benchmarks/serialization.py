@@ -0,0 +1,138 @@
+"""
+Measures the CPU time and bytes of serializing game documents, before and after the fast serializer.
+
+For game documents of several sizes, reports as JSON:
+- The time to serialize a document for an HTTP response, with Flask's default standard library provider and with 'serialization.dumps()'.
+- The time to broadcast a document to a room, which measures the payload and encodes one Socket.IO packet:
+  serialized twice with the standard library before, and once with 'serialization.preserialize()' after.
+- The size of the document as JSON, gzip, brotli (if installed) and as a MessagePack Socket.IO packet (if installed),
+  and the time taken to compress it.
+
+Usage:
+python benchmarks/serialization.py --transactions 10 100 1000 5000 --repeat 200
+"""
+import argparse
+import gzip
+import json
+import os
+import random
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from socketio import packet
+
+import constants
+import serialization
+
+def build_game_document(transactions, players=8):
+    profiles = [{'id': i, 'firstName': 'Player', 'lastName': str(i)} for i in range(1, players + 1)]
+    return {
+        'name': 'Benchmark game',
+        'dateCreated': '2024-01-01T20:00:00Z',
+        'id': '5b0f8c5e-3c1a-4f6e-9d52-7f1b2a3c4d5e',
+        'availableCashout': 1234.5,
+        'memberIDs': [profile['id'] for profile in profiles],
+        'contributors': [{'profile': profile, 'contribution': 250.0} for profile in profiles],
+        'transactions': [
+            {
+                'profile': random.choice(profiles),
+                'date': f'2024-01-01T20:{i % 60:02d}:{i % 60:02d}Z',
+                'type': random.choice(['BUY_IN', 'CASH_OUT']),
+                'amount': random.choice([5.0, 10.0, 20.0, 50.0]),
+                'denominations': [1, 5, 5, 25],
+            }
+            for i in range(transactions)
+        ],
+        'admin': profiles[0],
+        'settings': {
+            'minBuyIn': 5.0,
+            'maxBuyIn': 100.0,
+            'denominations': [1, 5, 25],
+            'denominationColors': ['white', 'red', 'green'],
+            'buyInEnabled': True,
+            'expired': False,
+        },
+        'version': transactions + 1,
+    }
+
+def per_call(function, repeat):
+    return min(timeit.repeat(function, number=repeat, repeat=3)) / repeat
+
+class StandardJSON:
+    @staticmethod
+    def dumps(obj, **kwargs):
+        return json.dumps(obj, **kwargs)
+
+    @staticmethod
+    def loads(s, **kwargs):
+        return json.loads(s, **kwargs)
+
+def encode_packet(json_module, data):
+    packet.Packet.json = json_module
+    return packet.Packet(packet.EVENT, data=['game_updated', data]).encode()
+
+def broadcast_before(document):
+    # The payload was serialized for the emit metrics, then again in the packet
+    len(json.dumps(document, default=str))
+    return encode_packet(StandardJSON, document)
+
+def broadcast_after(document):
+    encoded, payload = serialization.preserialize(document)
+    len(encoded)
+    return encode_packet(serialization.SocketIOJSON, payload)
+
+def measure(transactions, repeat):
+    document = build_game_document(transactions)
+    body = serialization.dumps(document)
+    result = {
+        'transactions': transactions,
+        'serializer': 'orjson' if serialization.use_orjson() else 'json',
+        'http': {
+            'stdlib': per_call(lambda: json.dumps(document, sort_keys=True).encode('utf-8'), repeat),
+            'fast': per_call(lambda: serialization.dumps(document), repeat),
+        },
+        'broadcast': {
+            'stdlib': per_call(lambda: broadcast_before(document), repeat),
+            'fast': per_call(lambda: broadcast_after(document), repeat),
+        },
+        'bytes': {
+            'json': len(body),
+            'gzip': len(gzip.compress(body, compresslevel=constants.GZIP_LEVEL)),
+        },
+        'compression': {
+            'gzip': per_call(lambda: serialization.compress(body, 'gzip'), max(1, repeat // 10)),
+        },
+    }
+    for section in ('http', 'broadcast'):
+        result[section]['speedup'] = result[section]['stdlib'] / result[section]['fast']
+
+    if serialization.brotli is not None:
+        result['bytes']['br'] = len(serialization.compress(body, 'br'))
+        result['compression']['br'] = per_call(lambda: serialization.compress(body, 'br'), max(1, repeat // 10))
+
+    try:
+        from socketio import msgpack_packet
+    except ImportError:
+        msgpack_packet = None
+    if msgpack_packet is not None:
+        try:
+            encoded = msgpack_packet.MsgPackPacket(packet.EVENT, data=['game_updated', document]).encode()
+            result['bytes']['msgpackPacket'] = len(encoded)
+        except ImportError:
+            pass
+    return result
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--transactions', type=int, nargs='+', default=[10, 100, 1000, 5000])
+    parser.add_argument('--repeat', type=int, default=100)
+    args = parser.parse_args()
+
+    random.seed(0)
+    for transactions in args.transactions:
+        print(json.dumps(measure(transactions, args.repeat)))
+
+if __name__ == '__main__':
+    main()
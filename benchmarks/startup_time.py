@@ -0,0 +1,81 @@
+"""
+Measures how long a cold worker takes to import the app.
+
+Every run is a fresh interpreter, so nothing is shared between runs apart from the operating system's file cache.
+For each module, the time spent importing it and the wall time of the whole process are reported as JSON,
+with the slowest imports underneath it when --imports is given.
+
+Usage:
+python benchmarks/startup_time.py --runs 10
+python benchmarks/startup_time.py --modules app game async_app --imports 15
+env=prod secret_provider=file secret_file=secret.json python benchmarks/startup_time.py
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+DEFAULTS = {
+    'env': 'local',
+    'database_url': 'sqlite:///' + os.path.join(tempfile.gettempdir(), 'startup_time.db'),
+    'api_host': '127.0.0.1',
+    'api_port': '5000',
+    'client_host': 'localhost',
+    'client_port': '8100',
+}
+
+PROGRAM = "import time; start = time.perf_counter(); import {module}; print(time.perf_counter() - start)"
+
+def run(module, environment, importtime=False):
+    command = [sys.executable]
+    if importtime:
+        command += ['-X', 'importtime']
+    command += ['-c', PROGRAM.format(module=module)]
+    start = time.perf_counter()
+    result = subprocess.run(command, cwd=ROOT, env=environment, capture_output=True, text=True, check=True)
+    wall = time.perf_counter() - start
+    return float(result.stdout.strip().splitlines()[-1]), wall, result.stderr
+
+def slowest_imports(stderr, count):
+    # Lines look like 'import time:  <self us> | <cumulative us> | <module>'
+    imports = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        own, cumulative, name = line[len('import time:'):].split('|')
+        imports.append({'module': name.strip(), 'own': int(own) / 1e6, 'cumulative': int(cumulative) / 1e6})
+    return sorted(imports, key=lambda entry: entry['own'], reverse=True)[:count]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--modules', nargs='+', default=['app', 'game'])
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--imports', type=int, default=0, help='Number of slowest imports to list for each module.')
+    args = parser.parse_args()
+
+    environment = dict(DEFAULTS, **os.environ)
+    for module in args.modules:
+        imports, walls = [], []
+        for _ in range(args.runs):
+            seconds, wall, _ = run(module, environment)
+            imports.append(seconds)
+            walls.append(wall)
+        result = {
+            'module': module,
+            'runs': args.runs,
+            'import': {'median': statistics.median(imports), 'min': min(imports), 'max': max(imports)},
+            'process': {'median': statistics.median(walls), 'min': min(walls), 'max': max(walls)},
+        }
+        if args.imports:
+            _, _, stderr = run(module, environment, importtime=True)
+            result['slowestImports'] = slowest_imports(stderr, args.imports)
+        print(json.dumps(result))
+
+if __name__ == '__main__':
+    main()
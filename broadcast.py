@@ -0,0 +1,100 @@
+import threading
+import time
+
+import game
+import metrics
+
+def coalesce(deltas):
+    """
+    Combines the deltas queued for a game into as few deltas as possible.
+    Deltas are sorted by sequence number and each run of consecutive ones is merged with 'game.merge_deltas()'.
+    Every delta returned carries a 'baseSeq', the sequence number of the version it applies to.
+
+    Parameters:
+    deltas (list): The deltas of one game, in any order.
+
+    Returns:
+    list: The combined deltas, in sequence order. There is more than one only if a sequence number is missing.
+    """
+    combined = []
+    for delta in sorted(deltas, key=lambda delta: delta['seq']):
+        if combined and combined[-1]['seq'] + 1 == delta['seq']:
+            combined[-1] = game.merge_deltas(combined[-1], delta)
+        else:
+            combined.append(dict(delta, baseSeq=delta['seq'] - 1))
+    return combined
+
+class BroadcastDispatcher:
+    """
+    Broadcasts the changes committed to games from background tasks, so requests do not wait for them.
+    The first change queued for a game starts a task that waits for the window, then sends every change
+    queued for that game in the meantime in one call of 'send', so a burst of changes results in one broadcast.
+
+    Parameters:
+    send (callable): The function called with a game ID and its coalesced deltas, which emits them.
+    window (float): The seconds to collect changes for before sending them.
+    start_background_task (callable): The function starting a background task, from the Socket.IO server.
+    sleep (callable): The function sleeping in a background task, from the Socket.IO server.
+    """
+    def __init__(self, send, window, start_background_task, sleep):
+        self.send = send
+        self.window = window
+        self.start_background_task = start_background_task
+        self.sleep = sleep
+        self.pending = {}
+        self.depth = 0
+        self.lock = threading.Lock()
+
+    def submit(self, delta):
+        """
+        Queues a committed change for broadcasting.
+
+        Parameters:
+        delta (dict): The delta describing the change.
+        """
+        game_id = delta['gameID']
+        with self.lock:
+            first = game_id not in self.pending
+            if first:
+                self.pending[game_id] = {'deltas': [], 'since': time.perf_counter()}
+            self.pending[game_id]['deltas'].append(delta)
+            self.depth += 1
+            metrics.broadcast_queue_depth.set(self.depth)
+        if first:
+            self.start_background_task(self.run, game_id)
+
+    def take(self, game_id):
+        """
+        Removes the changes queued for a game.
+
+        Parameters:
+        game_id (str): The ID of the game.
+
+        Returns:
+        tuple: The coalesced deltas, the number of changes they combine, and the 'time.perf_counter()' value when the first was queued.
+        """
+        with self.lock:
+            queued = self.pending.pop(game_id)
+            self.depth -= len(queued['deltas'])
+            metrics.broadcast_queue_depth.set(self.depth)
+        return coalesce(queued['deltas']), len(queued['deltas']), queued['since']
+
+    def run(self, game_id):
+        self.sleep(self.window)
+        deltas, changes, since = self.take(game_id)
+        try:
+            self.send(game_id, deltas)
+        finally:
+            metrics.record_broadcast(changes, time.perf_counter() - since)
+
+class AsyncBroadcastDispatcher(BroadcastDispatcher):
+    """
+    The counterpart of 'BroadcastDispatcher' for the asyncio server, where 'send' and 'sleep' are coroutine functions.
+    """
+    async def run(self, game_id):
+        await self.sleep(self.window)
+        deltas, changes, since = self.take(game_id)
+        try:
+            await self.send(game_id, deltas)
+        finally:
+            metrics.record_broadcast(changes, time.perf_counter() - since)
@@ -0,0 +1,346 @@
+from collections import OrderedDict
+import json
+import threading
+import time
+
+class VersionedLRUCache:
+    """
+    A bounded, thread-safe, least-recently-used cache whose entries are tagged with a version.
+
+    Invalidating a key leaves behind a marker holding the newest known version,
+    so a reader that loaded an older copy before the invalidation cannot put it back into the cache.
+
+    Parameters:
+    maxsize (int): The maximum number of entries to keep before the least recently used is evicted.
+    """
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, key, version=None):
+        """
+        Looks up the value cached for a key.
+
+        Parameters:
+        key: The key to look up.
+        version (int): If provided, only a value cached at exactly this version is returned.
+
+        Returns:
+        The cached value, or None if there is no usable entry.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[1] is None or (version is not None and entry[0] != version):
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def get_version(self, key):
+        """
+        Returns the version of the value cached for a key, without counting as a hit or miss.
+
+        Parameters:
+        key: The key to look up.
+
+        Returns:
+        int: The cached version, or None if there is no usable entry.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[1] is None:
+                return None
+            return entry[0]
+
+    def put(self, key, version, value):
+        """
+        Caches a value for a key, unless a newer version of the key is already known.
+
+        Parameters:
+        key: The key to cache the value under.
+        version (int): The version of the value.
+        value: The value to cache.
+
+        Returns:
+        bool: True if the value was cached.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > version:
+                return False
+            self._entries[key] = (version, value)
+            self._entries.move_to_end(key)
+            self._evict()
+            return True
+
+    def invalidate(self, key, version=None):
+        """
+        Discards the value cached for a key.
+
+        Parameters:
+        key: The key to invalidate.
+        version (int): If provided, the newest version of the key. Values older than this are discarded and refused by 'put()'.
+        """
+        with self._lock:
+            self.invalidations += 1
+            if version is None:
+                self._entries.pop(key, None)
+                return
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] >= version:
+                return
+            self._entries[key] = (version, None)
+            self._entries.move_to_end(key)
+            self._evict()
+
+    def invalidate_matching(self, predicate):
+        """
+        Discards every cached value a predicate selects, leaving a marker holding its version like 'invalidate()'.
+
+        Parameters:
+        predicate (callable): A function called with each key and value, returning True for the values to discard.
+
+        Returns:
+        int: The number of values discarded.
+        """
+        with self._lock:
+            keys = [key for key, (version, value) in self._entries.items() if value is not None and predicate(key, value)]
+            for key in keys:
+                self._entries[key] = (self._entries[key][0], None)
+            self.invalidations += len(keys)
+            return len(keys)
+
+    def clear(self):
+        """
+        Discards every entry in the cache.
+        """
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        """
+        Reports the cache counters.
+
+        Returns:
+        dict: A dictionary containing the size, capacity, hits, misses, evictions and invalidations of the cache.
+        """
+        with self._lock:
+            return {
+                'size': len(self._entries),
+                'maxSize': self.maxsize,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations,
+            }
+
+    def _evict(self):
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+class TTLCache:
+    """
+    A bounded, thread-safe, least-recently-used cache whose entries expire after a time to live.
+    Its methods work on many keys at once, so callers can look up a batch and load only the misses.
+
+    Deleting a key leaves behind a marker with the time of the deletion,
+    so a reader that loaded the key before the deletion cannot put the old value back into the cache.
+
+    Parameters:
+    maxsize (int): The maximum number of entries to keep before the least recently used is evicted.
+    ttl (float): The number of seconds an entry is kept for. 0 keeps entries until they are evicted or deleted.
+    """
+    def __init__(self, maxsize, ttl=0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def now(self):
+        """
+        Returns the current time on the clock used for expiry, to be passed as 'since' to 'set_many()'.
+        """
+        return time.monotonic()
+
+    def get_many(self, keys):
+        """
+        Looks up the values cached for several keys.
+
+        Parameters:
+        keys (iterable): The keys to look up.
+
+        Returns:
+        dict: A dictionary mapping each key with a live entry to its value. Missing and expired keys are left out.
+        """
+        now = time.monotonic()
+        found = {}
+        with self._lock:
+            for key in keys:
+                entry = self._entries.get(key)
+                if entry is None or entry[1] is None or (self.ttl and now - entry[0] > self.ttl):
+                    self.misses += 1
+                    continue
+                self._entries.move_to_end(key)
+                self.hits += 1
+                found[key] = entry[1]
+        return found
+
+    def set_many(self, values, since=None):
+        """
+        Caches several values.
+
+        Parameters:
+        values (dict): A dictionary mapping keys to the values to cache.
+        since (float): If provided, the time from 'now()' at which the values were loaded.
+                       Keys deleted after that time are not cached, since their values may be out of date.
+        """
+        now = time.monotonic()
+        with self._lock:
+            for key, value in values.items():
+                entry = self._entries.get(key)
+                if since is not None and entry is not None and entry[1] is None and entry[0] >= since:
+                    continue
+                self._entries[key] = (now, value)
+                self._entries.move_to_end(key)
+            self._evict()
+
+    def delete(self, key):
+        """
+        Discards the value cached for a key.
+
+        Parameters:
+        key: The key to discard.
+        """
+        with self._lock:
+            self.invalidations += 1
+            self._entries[key] = (time.monotonic(), None)
+            self._entries.move_to_end(key)
+            self._evict()
+
+    def clear(self):
+        """
+        Discards every entry in the cache.
+        """
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        """
+        Reports the cache counters.
+
+        Returns:
+        dict: A dictionary containing the backend, size, capacity, time to live, hits, misses, evictions and invalidations of the cache.
+        """
+        with self._lock:
+            return {
+                'backend': 'memory',
+                'size': len(self._entries),
+                'maxSize': self.maxsize,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations,
+            }
+
+    def _evict(self):
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+class RedisTTLCache:
+    """
+    A cache with the same interface as 'TTLCache', stored in Redis or Valkey so that every worker shares it.
+    Values are stored as JSON, and expire in Redis after the time to live.
+
+    Parameters:
+    url (str): The Redis URL, for example redis://host:6379/0.
+    prefix (str): The prefix of every key, separating this cache from others on the same server.
+    ttl (float): The number of seconds an entry is kept for. 0 keeps entries until they are deleted or evicted by Redis.
+    """
+    def __init__(self, url, prefix, ttl=0):
+        import redis
+
+        self.client = redis.Redis.from_url(url.replace('valkey', 'redis', 1))
+        self.prefix = prefix
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def now(self):
+        """
+        Returns None, since Redis deletions and writes are not ordered against local loads.
+        """
+        return None
+
+    def get_many(self, keys):
+        keys = list(keys)
+        if not keys:
+            return {}
+        values = self.client.mget([f'{self.prefix}{key}' for key in keys])
+        found = {key: json.loads(value) for key, value in zip(keys, values) if value is not None}
+        with self._lock:
+            self.hits += len(found)
+            self.misses += len(keys) - len(found)
+        return found
+
+    def set_many(self, values, since=None):
+        pipeline = self.client.pipeline(transaction=False)
+        for key, value in values.items():
+            pipeline.set(f'{self.prefix}{key}', json.dumps(value), ex=int(self.ttl) or None)
+        pipeline.execute()
+
+    def delete(self, key):
+        with self._lock:
+            self.invalidations += 1
+        self.client.delete(f'{self.prefix}{key}')
+
+    def clear(self):
+        for key in self.client.scan_iter(f'{self.prefix}*'):
+            self.client.delete(key)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'backend': 'redis',
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'invalidations': self.invalidations,
+            }
+
+def create_cache(url, prefix, maxsize, ttl=0):
+    """
+    Creates a cache with a bulk interface, stored in this worker's memory or in Redis depending on the URL.
+
+    Parameters:
+    url (str): Empty or memory:// for a 'TTLCache', or redis://, rediss:// or valkey:// for a 'RedisTTLCache'.
+    prefix (str): The prefix of every key in a shared cache.
+    maxsize (int): The maximum number of entries of an in-memory cache.
+    ttl (float): The number of seconds an entry is kept for. 0 keeps entries until they are evicted or deleted.
+
+    Returns:
+    TTLCache | RedisTTLCache: The cache.
+
+    Raises:
+    ValueError: If the URL scheme is not supported.
+    """
+    scheme = url.split('://', 1)[0] if url else 'memory'
+    if scheme == 'memory':
+        return TTLCache(maxsize, ttl)
+    if scheme in ('redis', 'rediss', 'valkey', 'valkeys'):
+        return RedisTTLCache(url, prefix, ttl)
+    raise ValueError(f'Unsupported cache backend: {scheme}')
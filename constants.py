@@ -1,64 +1,145 @@
-import boto3
-from botocore.exceptions import ClientError
-import json
 import os
+import threading
 
 DATABASE = 'pokerflowDB'
 DRIVER = 'ODBC+Driver+18+for+SQL+Server'
 ENV = os.getenv('env')
 TRUST = 'TrustServerCertificate=yes'
 
-if not ENV:
-  raise Exception('Missing environment variable: env')
-
-if ENV == 'prod':
-  secret_name = "pokerflow-database-1"
-  region_name = "us-east-2"
-
-  # Create a Secrets Manager client
-  session = boto3.session.Session()
-  client = session.client(
-      service_name='secretsmanager',
-      region_name=region_name
-  )
-
-  try:
-      get_secret_value_response = client.get_secret_value(
-          SecretId=secret_name
-      )
-  except ClientError as e:
-      raise e
-
-  # Decrypts secret using the associated KMS key.
-  secret = json.loads(get_secret_value_response['SecretString'])
-
-  USER = secret['username']
-  PASSWORD = secret['password']
-  HOST = secret['host']
-  PORT = secret['port']
-  API_HOST = secret['api_host']
-  API_PORT = secret['api_port']
-  CLIENT_HOST = secret['client_host']
-  CLIENT_PORT = secret['client_port']
-
-elif ENV == 'local':
-  USER = os.getenv('db_username')
-  PASSWORD = os.getenv('db_password')
-  HOST = os.getenv('db_host')
-  PORT = os.getenv('db_port')
-  API_HOST = os.getenv('api_host')
-  API_PORT = os.getenv('api_port')
-  CLIENT_HOST = os.getenv('client_host')
-  CLIENT_PORT = os.getenv('client_port')
-
-else:
-   raise Exception(f'Unrecognized env: {ENV}')
-
-if not USER: raise Exception('Missing required environment variable: db_username')
-if not PASSWORD: raise Exception('Missing required environment variable: db_password')
-if not HOST: raise Exception('Missing required environment variable: db_host')
-if not PORT: raise Exception('Missing required environment variable: db_port')
-if not API_HOST: raise Exception('Missing required environment variable: api_host')
-if not API_PORT: raise Exception('Missing required environment variable: api_port')
-if not CLIENT_HOST: raise Exception('Missing required environment variable: client_host')
-if not CLIENT_PORT: raise Exception('Missing required environment variable: client_port')
+# Secrets for the prod environment, fetched on first use and cached on disk between worker boots
+SECRET_NAME = os.getenv('secret_name', 'pokerflow-database-1')
+SECRET_REGION = os.getenv('secret_region', 'us-east-2')
+# 'aws' for Secrets Manager, or 'file' to read the secret from the JSON file at 'secret_file', for example offline
+SECRET_PROVIDER = os.getenv('secret_provider', 'aws')
+SECRET_FILE = os.getenv('secret_file')
+SECRET_CACHE_FILE = os.getenv('secret_cache_file', os.path.join(os.path.expanduser('~'), '.cache', 'pokerflow', 'secret.json'))
+# Seconds a cached secret is used for before it is fetched again. 0 disables the cache
+SECRET_CACHE_TTL = float(os.getenv('secret_cache_ttl', 3600))
+
+# The settings that depend on the environment are only resolved, and checked, when one of them is first used
+_SETTINGS = ('USER', 'PASSWORD', 'HOST', 'PORT', 'API_HOST', 'API_PORT', 'CLIENT_HOST', 'CLIENT_PORT', 'DATABASE_URL')
+_settings_lock = threading.Lock()
+
+def _load_settings():
+  if not ENV:
+    raise Exception('Missing environment variable: env')
+
+  if ENV == 'prod':
+    import secret_store
+
+    secret = secret_store.get_secret(SECRET_NAME, SECRET_REGION)
+    settings = {
+      'USER': secret['username'],
+      'PASSWORD': secret['password'],
+      'HOST': secret['host'],
+      'PORT': secret['port'],
+      'API_HOST': secret['api_host'],
+      'API_PORT': secret['api_port'],
+      'CLIENT_HOST': secret['client_host'],
+      'CLIENT_PORT': secret['client_port'],
+      'DATABASE_URL': None,
+    }
+
+  elif ENV == 'local':
+    settings = {
+      'USER': os.getenv('db_username'),
+      'PASSWORD': os.getenv('db_password'),
+      'HOST': os.getenv('db_host'),
+      'PORT': os.getenv('db_port'),
+      'API_HOST': os.getenv('api_host'),
+      'API_PORT': os.getenv('api_port'),
+      'CLIENT_HOST': os.getenv('client_host'),
+      'CLIENT_PORT': os.getenv('client_port'),
+      # Overrides the SQL Server connection, for example sqlite:///pokerflow.db for local benchmarking
+      'DATABASE_URL': os.getenv('database_url'),
+    }
+
+  else:
+    raise Exception(f'Unrecognized env: {ENV}')
+
+  if not settings['DATABASE_URL']:
+    if not settings['USER']: raise Exception('Missing required environment variable: db_username')
+    if not settings['PASSWORD']: raise Exception('Missing required environment variable: db_password')
+    if not settings['HOST']: raise Exception('Missing required environment variable: db_host')
+    if not settings['PORT']: raise Exception('Missing required environment variable: db_port')
+  if not settings['API_HOST']: raise Exception('Missing required environment variable: api_host')
+  if not settings['API_PORT']: raise Exception('Missing required environment variable: api_port')
+  if not settings['CLIENT_HOST']: raise Exception('Missing required environment variable: client_host')
+  if not settings['CLIENT_PORT']: raise Exception('Missing required environment variable: client_port')
+  return settings
+
+def __getattr__(name):
+  if name not in _SETTINGS:
+    raise AttributeError(f"module 'constants' has no attribute '{name}'")
+  with _settings_lock:
+    if name not in globals():
+      globals().update(_load_settings())
+  return globals()[name]
+
+# Connection pool tuning, shared by every environment
+DB_POOL_SIZE = int(os.getenv('db_pool_size', 10))
+DB_MAX_OVERFLOW = int(os.getenv('db_max_overflow', 20))
+DB_POOL_TIMEOUT = float(os.getenv('db_pool_timeout', 30))
+DB_POOL_RECYCLE = int(os.getenv('db_pool_recycle', 1800))
+DB_POOL_PRE_PING = os.getenv('db_pool_pre_ping', 'true').lower() == 'true'
+
+# In-memory caching
+GAME_CACHE_SIZE = int(os.getenv('game_cache_size', 1024))
+TIMESERIES_CACHE_SIZE = int(os.getenv('timeseries_cache_size', 256))
+
+# Number of points returned for each game chart series, by default and at most
+TIMESERIES_POINTS = int(os.getenv('timeseries_points', 200))
+TIMESERIES_MAX_POINTS = int(os.getenv('timeseries_max_points', 2000))
+
+# Number of transactions in each page of a game's transactions, by default and at most
+TRANSACTIONS_PAGE_SIZE = int(os.getenv('transactions_page_size', 100))
+TRANSACTIONS_MAX_PAGE_SIZE = int(os.getenv('transactions_max_page_size', 1000))
+
+# Number of game versions between snapshots of a game's state in the ledger
+LEDGER_SNAPSHOT_INTERVAL = int(os.getenv('ledger_snapshot_interval', 50))
+
+# Number of rows fetched from the database at a time when streaming exports
+EXPORT_BATCH_SIZE = int(os.getenv('export_batch_size', 1000))
+
+# Message queue shared by every worker for Socket.IO broadcasts, for example redis://host:6379/0
+SOCKETIO_MESSAGE_QUEUE = os.getenv('socketio_message_queue')
+# Seconds that changes to a game are collected for before they are broadcast together, from a background task
+BROADCAST_WINDOW = float(os.getenv('broadcast_window', 0.05))
+# Seconds between each worker publishing its room subscriber counts to the others
+ROOM_SYNC_INTERVAL = float(os.getenv('room_sync_interval', 10))
+# Socket.IO packet encoding, 'default' for JSON or 'msgpack' for binary MessagePack packets
+SOCKETIO_SERIALIZER = os.getenv('socketio_serializer', 'default')
+
+# JSON serialization, 'orjson' when it is installed or 'json' for the standard library
+JSON_SERIALIZER = os.getenv('json_serializer', 'orjson')
+# Response compression, in order of preference, applied to JSON responses of at least 'compression_min_size' bytes
+RESPONSE_COMPRESSION = [encoding.strip() for encoding in os.getenv('response_compression', 'br,gzip').split(',') if encoding.strip()]
+COMPRESSION_MIN_SIZE = int(os.getenv('compression_min_size', 1024))
+GZIP_LEVEL = int(os.getenv('gzip_level', 6))
+BROTLI_QUALITY = int(os.getenv('brotli_quality', 5))
+
+# Password hashing, done on a bounded pool off the request threads
+PASSWORD_HASH_EXECUTOR = os.getenv('password_hash_executor', 'thread')
+PASSWORD_HASH_WORKERS = int(os.getenv('password_hash_workers', os.cpu_count() or 2))
+PASSWORD_HASH_QUEUE_DEPTH = int(os.getenv('password_hash_queue_depth', 32))
+PASSWORD_HASH_TIMEOUT = float(os.getenv('password_hash_timeout', 5))
+# The bcrypt work factor, at least 12, set to the same value on every worker.
+# 'python passwords.py' suggests one that hashes in about 'password_hash_target' seconds on the machine it runs on
+PASSWORD_HASH_ROUNDS = int(os.getenv('password_hash_rounds', 12))
+PASSWORD_HASH_TARGET = float(os.getenv('password_hash_target', 0.25))
+
+# Attempts at updating a game that is being modified concurrently before giving up
+GAME_UPDATE_RETRIES = int(os.getenv('game_update_retries', 10))
+
+# Query diagnostics: logs slow statements and statements repeated within a request (N+1 queries) when enabled
+QUERY_DIAGNOSTICS = os.getenv('query_diagnostics', 'false').lower() == 'true'
+SLOW_QUERY_THRESHOLD = float(os.getenv('slow_query_threshold', 0.1))
+REPEATED_QUERY_LIMIT = int(os.getenv('repeated_query_limit', 5))
+QUERY_LOG_FILE = os.getenv('query_log_file', 'queries.log')
+QUERY_LOG_MAX_BYTES = int(os.getenv('query_log_max_bytes', 10 * 1024 * 1024))
+QUERY_LOG_BACKUPS = int(os.getenv('query_log_backups', 5))
+
+# Cache of profile names shown in game documents. Empty keeps it in each worker's memory, or redis://host:6379/0 shares it
+PROFILE_CACHE_URL = os.getenv('profile_cache_url', '')
+PROFILE_CACHE_SIZE = int(os.getenv('profile_cache_size', 10000))
+PROFILE_CACHE_TTL = float(os.getenv('profile_cache_ttl', 3600))
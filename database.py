@@ -1,24 +1,165 @@
+import atexit
+import threading
+import time
+
 from sqlalchemy import create_engine
 from sqlalchemy.orm import scoped_session, sessionmaker
+from sqlalchemy.pool import QueuePool
 
 import constants
+import metrics
+import query_log
+
+_lock = threading.Lock()
+_engine = None
+_session_registry = None
+
+_wait_stats = {
+    'checkouts': 0,
+    'total_wait': 0.0,
+    'max_wait': 0.0,
+}
+
+class TimedQueuePool(QueuePool):
+    """
+    A QueuePool that records how long callers wait to check out a connection.
+    The timings are aggregated into the module-level pool statistics.
+    """
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            _record_wait(time.perf_counter() - start)
+
+def _record_wait(elapsed):
+    with _lock:
+        _wait_stats['checkouts'] += 1
+        _wait_stats['total_wait'] += elapsed
+        _wait_stats['max_wait'] = max(_wait_stats['max_wait'], elapsed)
+
+def get_database_url():
+    """
+    Builds the connection URL for the database using parameters defined in the 'constants' module.
+    Uses the MSSQL+pyodbc dialect for connecting to an MSSQL database, unless a database URL is configured explicitly.
+
+    Returns:
+    str: The SQLAlchemy connection URL.
+    """
+    if constants.DATABASE_URL:
+        return constants.DATABASE_URL
+    return f"mssql+pyodbc://{constants.USER}:{constants.PASSWORD}@{constants.HOST}:{constants.PORT}/{constants.DATABASE}?driver={constants.DRIVER}&{constants.TRUST}"
 
 def get_engine():
     """
-    Initializes a connection engine to the database using parameters defined in the 'constants' module. 
-    Uses the MSSQL+pyodbc dialect for connecting to an MSSQL database.
+    Returns the process-wide connection engine, creating it on first use.
+    The engine keeps a pool of connections that is configured through the 'constants' module,
+    so requests reuse open connections rather than connecting to the database each time.
 
     Returns:
     Engine: An SQLAlchemy Engine instance connected to the specified database.
     """
-    return create_engine(url=f"mssql+pyodbc://{constants.USER}:{constants.PASSWORD}@{constants.HOST}:{constants.PORT}/{constants.DATABASE}?driver={constants.DRIVER}&{constants.TRUST}")
+    global _engine
+    if _engine is None:
+        with _lock:
+            if _engine is None:
+                _engine = create_engine(
+                    url=get_database_url(),
+                    poolclass=TimedQueuePool,
+                    pool_size=constants.DB_POOL_SIZE,
+                    max_overflow=constants.DB_MAX_OVERFLOW,
+                    pool_timeout=constants.DB_POOL_TIMEOUT,
+                    pool_recycle=constants.DB_POOL_RECYCLE,
+                    pool_pre_ping=constants.DB_POOL_PRE_PING,
+                )
+                metrics.instrument_engine(_engine)
+                if constants.QUERY_DIAGNOSTICS:
+                    query_log.instrument_engine(_engine)
+    return _engine
+
+def get_session_registry():
+    """
+    Returns the process-wide scoped session registry, bound to the engine returned by 'get_engine()'.
+    The registry hands out one session per thread until 'remove_session()' is called.
+
+    Returns:
+    scoped_session: The SQLAlchemy scoped session registry.
+    """
+    global _session_registry
+    if _session_registry is None:
+        engine = get_engine()
+        with _lock:
+            if _session_registry is None:
+                factory = sessionmaker(bind=engine)
+                _session_registry = scoped_session(factory)
+    return _session_registry
 
 def get_session():
     """
-    Initializes a scoped session using the SQLAlchemy sessionmaker, bound to the engine created by 'get_engine()'.
+    Returns the session for the current thread from the scoped session registry.
 
     Returns:
     Session: An SQLAlchemy session object for database operations.
     """
-    Session = scoped_session(sessionmaker(bind=get_engine()))
-    return Session()
+    return get_session_registry()()
+
+def create_session():
+    """
+    Creates a session that is not shared with the current thread, for work that outlives a request, such as streaming a response.
+    The caller closes the session when it is done with it.
+
+    Returns:
+    Session: An SQLAlchemy session object for database operations.
+    """
+    return get_session_registry().session_factory()
+
+def remove_session():
+    """
+    Closes the session for the current thread and returns its connection to the pool.
+    """
+    if _session_registry is not None:
+        _session_registry.remove()
+
+def get_pool_stats(pool=None):
+    """
+    Reports the current state of the connection pool.
+
+    Parameters:
+    pool (Pool): The pool to report on. Defaults to the pool of the engine returned by 'get_engine()'.
+
+    Returns:
+    dict: A dictionary containing the pool size, checked out connections, overflow, and checkout wait times in seconds.
+    """
+    pool = pool or get_engine().pool
+    with _lock:
+        checkouts = _wait_stats['checkouts']
+        total_wait = _wait_stats['total_wait']
+        max_wait = _wait_stats['max_wait']
+
+    return {
+        'size': pool.size(),
+        'checkedIn': pool.checkedin(),
+        'checkedOut': pool.checkedout(),
+        'overflow': max(pool.overflow(), 0),
+        'maxOverflow': constants.DB_MAX_OVERFLOW,
+        'checkouts': checkouts,
+        'totalWait': total_wait,
+        'averageWait': total_wait / checkouts if checkouts else 0.0,
+        'maxWait': max_wait,
+    }
+
+def dispose():
+    """
+    Closes every pooled connection and discards the engine and session registry.
+    Registered to run when the process exits.
+    """
+    global _engine, _session_registry
+    with _lock:
+        if _session_registry is not None:
+            _session_registry.remove()
+            _session_registry = None
+        if _engine is not None:
+            _engine.dispose()
+            _engine = None
+
+atexit.register(dispose)
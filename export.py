@@ -0,0 +1,179 @@
+import csv
+import io
+import json
+
+from sqlalchemy import select
+
+import async_database
+import constants
+import database
+from models import Game, Profile, Transaction
+
+class InvalidExportFormatException(Exception):
+    pass
+
+COLUMNS = ['id', 'gameID', 'gameName', 'profileID', 'firstName', 'lastName', 'date', 'type', 'amount', 'denominations']
+
+def get_transactions_query(game_id=None, profile_id=None):
+    """
+    Builds the query for the transactions to export, oldest first, with the name of their game and player.
+
+    Parameters:
+    game_id (str): If provided, only the transactions of this game are exported.
+    profile_id (int): If provided, only the transactions made by this profile are exported.
+
+    Returns:
+    Select: The query, fetching 'export_batch_size' rows at a time from a server-side cursor.
+    """
+    query = (
+        select(
+            Transaction.id,
+            Transaction.game_id,
+            Game.name,
+            Transaction.profile_id,
+            Profile.firstName,
+            Profile.lastName,
+            Transaction.date,
+            Transaction.type,
+            Transaction._amount,
+            Transaction.denominations
+        )
+            .join(Game, Transaction.game_id == Game.id)
+            .join(Profile, Transaction.profile_id == Profile.id)
+            .order_by(Transaction.id)
+            .execution_options(yield_per=constants.EXPORT_BATCH_SIZE)
+        )
+    if game_id is not None:
+        query = query.filter(Transaction.game_id == game_id)
+    if profile_id is not None:
+        query = query.filter(Transaction.profile_id == profile_id)
+    return query
+
+def build_record(row):
+    """
+    Creates the exported object of a transaction.
+
+    Parameters:
+    row (Row): A row of the query built by 'get_transactions_query()'.
+
+    Returns:
+    dict: A dictionary with a value for each of the exported columns.
+    """
+    return {
+        'id': row.id,
+        'gameID': row.game_id,
+        'gameName': row.name,
+        'profileID': row.profile_id,
+        'firstName': row.firstName,
+        'lastName': row.lastName,
+        'date': row.date.isoformat() + 'Z',
+        'type': row.type.value,
+        'amount': row._amount,
+        'denominations': [int(x) for x in row.denominations.split(',')],
+    }
+
+def write_ndjson(rows):
+    """
+    Writes a batch of rows as newline-delimited JSON, one object per line.
+
+    Parameters:
+    rows (list): Rows of the query built by 'get_transactions_query()'.
+
+    Returns:
+    str: The lines of the batch.
+    """
+    return ''.join(json.dumps(build_record(row)) + '\n' for row in rows)
+
+def write_csv(rows):
+    """
+    Writes a batch of rows as CSV, with the columns in the order of 'COLUMNS'.
+
+    Parameters:
+    rows (list): Rows of the query built by 'get_transactions_query()'.
+
+    Returns:
+    str: The lines of the batch.
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for row in rows:
+        record = build_record(row)
+        record['denominations'] = ','.join(str(x) for x in record['denominations'])
+        writer.writerow(record[column] for column in COLUMNS)
+    return buffer.getvalue()
+
+def write_csv_header():
+    """
+    Writes the CSV header line naming each of the 'COLUMNS'.
+
+    Returns:
+    str: The header line.
+    """
+    buffer = io.StringIO()
+    csv.writer(buffer).writerow(COLUMNS)
+    return buffer.getvalue()
+
+# The media type, header and batch writer of each export format
+FORMATS = {
+    'ndjson': ('application/x-ndjson', lambda: '', write_ndjson),
+    'csv': ('text/csv', write_csv_header, write_csv),
+}
+
+def get_format(name):
+    """
+    Looks up an export format.
+
+    Parameters:
+    name (str): The name of the format, 'ndjson' or 'csv'.
+
+    Returns:
+    tuple: The media type, a function returning the header, and a function writing a batch of rows.
+
+    Raises:
+    InvalidExportFormatException: If the format is not supported.
+    """
+    if name not in FORMATS:
+        raise InvalidExportFormatException
+    return FORMATS[name]
+
+def stream_transactions(name, query):
+    """
+    Streams an export of transactions, one batch of rows at a time, so memory use does not grow with the size of the history.
+    The export runs in its own session, since it is consumed after the request that started it has returned.
+
+    Parameters:
+    name (str): The name of the format.
+    query (Select): The query built by 'get_transactions_query()'.
+
+    Yields:
+    str: The header, then the exported rows of each batch.
+    """
+    _, header, write = get_format(name)
+    session = database.create_session()
+    try:
+        yield header()
+        for rows in session.execute(query).partitions():
+            yield write(rows)
+    finally:
+        session.close()
+
+async def stream_transactions_async(name, query):
+    """
+    Asyncio variant of 'stream_transactions()', streaming the rows with an AsyncSession.
+
+    Parameters:
+    name (str): The name of the format.
+    query (Select): The query built by 'get_transactions_query()'.
+
+    Yields:
+    str: The header, then the exported rows of each batch.
+    """
+    _, header, write = get_format(name)
+    session = async_database.get_session()
+    try:
+        yield header()
+        result = await session.stream(query)
+        async for rows in result.partitions():
+            yield write(rows)
+    finally:
+        await session.close()
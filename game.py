@@ -1,7 +1,19 @@
-from sqlalchemy import select, desc
-
-from models import Game, GameMember, GameSettings, Transaction, TransactionTypes
-from user import get_user_first_last
+import base64
+from datetime import datetime
+import hashlib
+import json
+import math
+
+from sqlalchemy import and_, desc, func, insert, or_, select, union, update
+from sqlalchemy.exc import IntegrityError
+
+from async_database import async_variant
+from cache import VersionedLRUCache
+import constants
+import ledger
+from models import Game, GameEventTypes, GameMember, GameSettings, Transaction, TransactionTypes
+import stats
+from user import get_users_first_last
 
 class GameNotFoundException(Exception):
     pass
@@ -15,6 +27,29 @@ class InvalidPasswordException(Exception):
 class InvalidTransactionException(Exception):
     pass
 
+class GameUpdateConflictException(Exception):
+    pass
+
+class StaleGameException(Exception):
+    pass
+
+class InvalidCursorException(Exception):
+    pass
+
+class InvalidFieldsException(Exception):
+    pass
+
+class InvalidPageSizeException(Exception):
+    pass
+
+# Built game documents, keyed by game ID and tagged with the game's version
+game_cache = VersionedLRUCache(constants.GAME_CACHE_SIZE)
+# Whether every worker's changes reach this worker's game cache, so the cached version of a game is known to be current
+_cache_coherent = False
+
+# The sections of a game document. The ID and version are included in every document.
+GAME_FIELDS = ('name', 'dateCreated', 'id', 'availableCashout', 'memberIDs', 'contributors', 'transactions', 'admin', 'settings', 'version')
+
 def get_by_user_id(session, id, itemOffset, per_page, expired):
     """
     Find games where the given user is a member. 
@@ -33,15 +68,34 @@ def get_by_user_id(session, id, itemOffset, per_page, expired):
     Raises:
     GameNotFoundException: If no games are found for the given user ID.
     """
-    games = []
+    versions = get_versions_by_user_id(session, id, itemOffset, per_page, expired)
+    return get_cached_games_data(versions, session)
+
+def get_versions_by_user_id(session, id, itemOffset, per_page, expired):
+    """
+    Find the IDs and versions of games where the given user is a member, without building the game documents.
+    Supports the same pagination and filtering as 'get_by_user_id()'.
+
+    Parameters:
+    session (Session): The database session to use for queries.
+    id (int): The user ID to search for in the game members.
+    itemOffset (int): The offset from where to start the query results, used for pagination.
+    per_page (int): The number of items to return per page.
+    expired (bool): A flag to filter games based on whether they are expired.
 
+    Returns:
+    list: A list of (game ID, version) pairs associated with the given user ID.
+
+    Raises:
+    GameNotFoundException: If no games are found for the given user ID.
+    """
     query = (
-        select(GameMember)
-            .join(Game, Game.id == GameMember.game_id)
+        select(Game.id, Game.version)
+            .join(GameMember, Game.id == GameMember.game_id)
             .join(GameSettings, Game.settings_id == GameSettings.id)
             .filter(GameMember.profile_id == id)
             .filter(GameSettings.expired == expired)
-            .order_by(desc(Game.last_modified))
+            .order_by(desc(Game.last_modified), desc(Game.id))
             .limit(per_page)
             .offset(itemOffset)
         )
@@ -49,18 +103,107 @@ def get_by_user_id(session, id, itemOffset, per_page, expired):
     if not rows:
         raise GameNotFoundException
     
-    for row in rows:
-        games.append(get_game_data(row[0].game_id, session))
+    return [(row.id, row.version) for row in rows]
 
-    return games
+def get_page_by_user_id(session, id, cursor, per_page, expired):
+    """
+    Find the IDs and versions of a page of games where the given user is a member, using keyset pagination.
+    Pages are ordered from most to least recently modified, and each page starts right after the last game of the previous page,
+    so reading a deep page costs the same as reading the first.
 
-def get_by_id(session, id):
+    Parameters:
+    session (Session): The database session to use for queries.
+    id (int): The user ID to search for in the game members.
+    cursor (str): The cursor returned with the previous page, or None for the first page.
+    per_page (int): The number of items to return per page.
+    expired (bool): A flag to filter games based on whether they are expired.
+
+    Returns:
+    tuple: A list of (game ID, version) pairs, and the cursor of the next page, or None if this is the last page.
+
+    Raises:
+    InvalidCursorException: If the cursor is not one returned by this function.
+    """
+    query = (
+        select(Game.id, Game.version, Game.last_modified)
+            .join(GameMember, Game.id == GameMember.game_id)
+            .join(GameSettings, Game.settings_id == GameSettings.id)
+            .filter(GameMember.profile_id == id)
+            .filter(GameSettings.expired == expired)
+            .order_by(desc(Game.last_modified), desc(Game.id))
+            .limit(per_page)
+        )
+    if cursor:
+        last_modified, game_id = decode_cursor(cursor)
+        column = Game.last_modified
+        if session.get_bind().dialect.name == 'sqlite':
+            # SQLite stores server-generated timestamps as text in a different format than bound datetimes, so both are normalized
+            column, last_modified = func.datetime(column), func.datetime(last_modified)
+        query = query.filter(or_(
+            column < last_modified,
+            and_(column == last_modified, Game.id < game_id)
+        ))
+    rows = session.execute(query).all()
+
+    next_cursor = None
+    if per_page and len(rows) == per_page:
+        next_cursor = encode_cursor(rows[-1].last_modified, rows[-1].id)
+
+    return [(row.id, row.version) for row in rows], next_cursor
+
+def encode_cursor(last_modified, id):
+    """
+    Creates an opaque pagination cursor pointing after the given game.
+
+    Parameters:
+    last_modified (datetime): The last modification time of the game.
+    id (str): The ID of the game.
+
+    Returns:
+    str: The cursor.
+    """
+    return base64.urlsafe_b64encode(json.dumps([last_modified.isoformat(), id]).encode('utf-8')).decode('ascii')
+
+def decode_cursor(cursor):
+    """
+    Reads a pagination cursor created by 'encode_cursor()'.
+
+    Parameters:
+    cursor (str): The cursor.
+
+    Returns:
+    tuple: The last modification time and ID of the game the cursor points after.
+
+    Raises:
+    InvalidCursorException: If the cursor cannot be read.
+    """
+    try:
+        last_modified, id = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+        return datetime.fromisoformat(last_modified), id
+    except (ValueError, TypeError):
+        raise InvalidCursorException
+
+def set_cache_coherent(coherent):
+    """
+    Declares whether the changes made by every worker are applied to this worker's game cache, through 'update_cache()'.
+    Only then are cached games served without checking their version against the database,
+    since otherwise another worker may have changed them.
+
+    Parameters:
+    coherent (bool): True if a cluster listener applies every worker's changes to the game cache.
+    """
+    global _cache_coherent
+    _cache_coherent = coherent
+
+def get_by_id(session, id, fields=None):
     """
     Queries for a specific game using based on the provided ID.
+    Games that are in the game cache at their current version, see 'get_version()', are returned without building them again.
 
     Parameters:
     session (Session): The database session to use for the query.
     id (int): The unique identifier of the game to be retrieved.
+    fields (set): The fields to include, as returned by 'parse_fields()'. Defaults to the whole document.
 
     Returns:
     dict: A dictionary containing the game's data, if found.
@@ -68,12 +211,134 @@ def get_by_id(session, id):
     Raises:
     GameNotFoundException: If no game is found with the provided ID.
     """
-    query = select(Game).filter_by(id=id)
-    rows = session.execute(query).fetchone()
-    if not rows:
+    game_data = game_cache.get(id) if _cache_coherent else game_cache.get(id, get_version(session, id))
+    if game_data is not None:
+        return select_fields(game_data, fields)
+
+    return get_game_data(id, session, fields)
+
+def get_version(session, id):
+    """
+    Finds the current version of a game. When the game cache is kept coherent across workers, see 'set_cache_coherent()',
+    the version of a cached game is used. Otherwise the version is read from the database by primary key.
+
+    Parameters:
+    session (Session): The database session to use for the query.
+    id (int): The unique identifier of the game.
+
+    Returns:
+    int: The current version of the game.
+
+    Raises:
+    GameNotFoundException: If no game is found with the provided ID.
+    """
+    version = game_cache.get_version(id) if _cache_coherent else None
+    if version is not None:
+        return version
+
+    query = select(Game.version).filter_by(id=id)
+    version = session.execute(query).scalar_one_or_none()
+    if version is None:
         raise GameNotFoundException
-    
-    return get_game_data(rows[0].id, session)
+
+    return version
+
+def parse_page_size(per_page):
+    """
+    Checks the number of transactions requested per page, capping it at 'transactions_max_page_size'.
+
+    Parameters:
+    per_page (int): The requested number of transactions per page.
+
+    Returns:
+    int: The number of transactions to return per page.
+
+    Raises:
+    InvalidPageSizeException: If the number is not a positive integer.
+    """
+    if per_page is None or per_page < 1:
+        raise InvalidPageSizeException
+    return min(per_page, constants.TRANSACTIONS_MAX_PAGE_SIZE)
+
+def get_transactions_page(session, id, cursor, per_page):
+    """
+    Find a page of the transactions of a game, oldest first, using keyset pagination on the transaction ID.
+
+    Parameters:
+    session (Session): The database session to use for queries.
+    id (str): The ID of the game.
+    cursor (str): The cursor returned with the previous page, or None for the first page.
+    per_page (int): The number of transactions to return per page, as returned by 'parse_page_size()'.
+
+    Returns:
+    tuple: A list of transaction data dictionaries, and the cursor of the next page, or None if this is the last page.
+
+    Raises:
+    InvalidCursorException: If the cursor is not one returned by this function.
+    InvalidPageSizeException: If the number of transactions per page is not a positive integer.
+    """
+    per_page = parse_page_size(per_page)
+    query = select(Transaction).filter(Transaction.game_id == id).order_by(Transaction.id).limit(per_page)
+    if cursor:
+        query = query.filter(Transaction.id > decode_transactions_cursor(cursor))
+    transactions = session.execute(query).scalars().all()
+    profiles = get_users_first_last({transaction.profile_id for transaction in transactions}, session)
+
+    next_cursor = None
+    if len(transactions) == per_page:
+        next_cursor = encode_transactions_cursor(transactions[-1].id)
+
+    return [build_transaction_data(transaction, profiles[transaction.profile_id]) for transaction in transactions], next_cursor
+
+def encode_transactions_cursor(id):
+    """
+    Creates an opaque pagination cursor pointing after the given transaction.
+
+    Parameters:
+    id (int): The ID of the transaction.
+
+    Returns:
+    str: The cursor.
+    """
+    return base64.urlsafe_b64encode(json.dumps([id]).encode('utf-8')).decode('ascii')
+
+def decode_transactions_cursor(cursor):
+    """
+    Reads a pagination cursor created by 'encode_transactions_cursor()'.
+
+    Parameters:
+    cursor (str): The cursor.
+
+    Returns:
+    int: The ID of the transaction the cursor points after.
+
+    Raises:
+    InvalidCursorException: If the cursor cannot be read.
+    """
+    try:
+        id, = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+    except (ValueError, TypeError):
+        raise InvalidCursorException
+    if not isinstance(id, int):
+        raise InvalidCursorException
+    return id
+
+def get_etag(versions):
+    """
+    Derives a strong entity tag for one or more games from their IDs and versions.
+    The tag changes whenever any of the games is modified, or the set of games changes.
+
+    Parameters:
+    versions (list): A list of (game ID, version) pairs.
+
+    Returns:
+    str: The entity tag, without quotes.
+    """
+    digest = hashlib.sha1()
+    for id, version in versions:
+        digest.update(f"{id}:{version};".encode('utf-8'))
+
+    return digest.hexdigest()
 
 def create(session, specs):
     """
@@ -113,6 +378,12 @@ def create(session, specs):
 
     session.add(game_member)
 
+    ledger.append(session, game.id, game.version, [{
+        'type': GameEventTypes.CREATE,
+        'profileID': specs['adminID'],
+        'data': build_settings_data(gameSettings),
+    }])
+
     session.commit()
 
     return get_by_id(session, game.id)
@@ -138,9 +409,18 @@ def join(session, data):
         raise GameSettingsNotFoundException
 
     # Add the user as a member
-    add_game_member(data['profileID'], data['gameID'], session)
+    if not add_game_member(data['profileID'], data['gameID'], session):
+        return
+
+    delta = {
+        'gameID': data['gameID'],
+        'seq': bump_version(data['gameID'], session),
+        'memberIDs': [data['profileID']],
+    }
+    ledger.append(session, data['gameID'], delta['seq'], [{'type': GameEventTypes.JOIN, 'profileID': data['profileID']}])
 
     session.commit()
+    publish_delta(session, delta)
 
 def create_transaction(session, data):
     """
@@ -152,58 +432,232 @@ def create_transaction(session, data):
     data (dict): A dictionary containing transaction details including type, amount, game ID, and profile ID.
 
     Raises:
-    InvalidTransactionException: If the transaction type is not recognized.
+    InvalidTransactionException: If the transaction type is not recognized, or the transaction is malformed.
     """
-    if data['type'] == TransactionTypes.BUY_IN:
+    if not isinstance(data, dict):
+        raise InvalidTransactionException
+    if data.get('type') == TransactionTypes.BUY_IN:
         return create_buy_in(session, data)
-    elif data['type'] == TransactionTypes.CASH_OUT:
+    elif data.get('type') == TransactionTypes.CASH_OUT:
         return create_cash_out(session, data)
     else:
         raise InvalidTransactionException
 
-def create_buy_in(session, data):
+def create_transactions(session, records):
     """
-    Processing a buy-in transaction, where a player adds money to the game's pot. 
-    Updates the game's total pot and available cashout amounts accordingly.
+    Processes many buy-in and cash-out transactions, for one or more games, in a single database transaction.
+    Transactions are applied in the order given, with the same rules as 'create_buy_in()' and 'create_cash_out()'.
+    The transactions are inserted in bulk, and each game's pot and available cashout are updated once.
+
+    Pot arithmetic is safe against concurrent writers on other workers without locking the game rows.
+    Games that only receive buy-ins are updated with server-side increments.
+    Games that receive cash-outs, whose amounts depend on the current available cashout,
+    are updated only if their version is unchanged since they were read, and the whole batch is retried otherwise.
+    The players' statistics rollups are updated in the same database transaction, see 'stats.record_transactions()'.
 
     Parameters:
-    session (Session): The database session to use for the transaction.
-    data (dict): A dictionary containing details of the buy-in transaction, including the game ID, profile ID, amount, and denominations.
+    session (Session): The database session to use for creating the transactions.
+    records (list): A list of dictionaries, each containing the type, amount, denominations, game ID, and profile ID of a transaction.
 
     Returns:
-    tuple: A tuple containing the transaction amount and type.
+    list: A list of (amount, type) tuples, one for each transaction in the order given.
 
     Raises:
-    GameNotFoundException: If no game is found for the given game ID.
+    InvalidTransactionException: If the list is empty, or any transaction is malformed, see 'validate_transaction()'. No transaction is created.
+    GameNotFoundException: If any game is not found. No transaction is created.
+    GameUpdateConflictException: If the games kept changing concurrently for every retry. No transaction is created.
     """
-    # Gets the associated game
-    query = select(Game).filter_by(id=data['gameID'])
-    rows = session.execute(query).fetchone()
-    if not rows:
+    if not isinstance(records, list) or not records:
+        raise InvalidTransactionException
+    for record in records:
+        validate_transaction(record)
+
+    for _ in range(constants.GAME_UPDATE_RETRIES):
+        try:
+            return apply_transactions(session, records)
+        except StaleGameException:
+            session.rollback()
+
+    raise GameUpdateConflictException
+
+def validate_transaction(record):
+    """
+    Checks that a transaction has every field, with the expected types, before it is processed.
+
+    Parameters:
+    record (dict): The transaction, as given to 'create_transactions()'.
+
+    Raises:
+    InvalidTransactionException: If the transaction is not an object, its type is not a buy-in or cash-out,
+    its game ID is not a string, its profile ID is not an integer, its amount is not a finite non-negative number,
+    or its denominations are not a non-empty list of integers.
+    """
+    def is_integer(value):
+        return isinstance(value, int) and not isinstance(value, bool)
+
+    if not isinstance(record, dict):
+        raise InvalidTransactionException
+    amount = record.get('amount')
+    denominations = record.get('denominations')
+    if (
+        record.get('type') not in (TransactionTypes.BUY_IN, TransactionTypes.CASH_OUT)
+        or not isinstance(record.get('gameID'), str)
+        or not is_integer(record.get('profileID'))
+        or not (is_integer(amount) or isinstance(amount, float)) or not math.isfinite(amount) or amount < 0
+        or not isinstance(denominations, list) or not denominations or not all(is_integer(x) for x in denominations)
+    ):
+        raise InvalidTransactionException
+
+def apply_transactions(session, records):
+    """
+    Makes a single attempt at processing transactions for 'create_transactions()'.
+
+    Parameters:
+    session (Session): The database session to use for creating the transactions.
+    records (list): A list of dictionaries, each containing the type, amount, denominations, game ID, and profile ID of a transaction.
+
+    Returns:
+    list: A list of (amount, type) tuples, one for each transaction in the order given.
+
+    Raises:
+    GameNotFoundException: If any game is not found.
+    StaleGameException: If a game receiving cash-outs was modified, or a player's statistics were created, concurrently. Nothing has been committed when this is raised.
+    """
+    game_ids = list(dict.fromkeys(record['gameID'] for record in records))
+    query = (
+        select(Game.id, Game.version, Game.settings_id, Game.date_created, Game._total_pot, Game._available_cashout)
+            .filter(Game.id.in_(game_ids))
+        )
+    games = {row.id: row for row in session.execute(query).all()}
+    if len(games) != len(game_ids):
         raise GameNotFoundException
-    game = rows[0]
 
-    # Creates the transaction
-    transaction = Transaction(
-        game_id = game.id,
-        profile_id = data['profileID'],
-        type = TransactionTypes.BUY_IN,
-        amount = data['amount'],
-        denominations = ','.join(str(x) for x in data['denominations']),
-    )
-    session.add(transaction)
-    session.flush()
+    # Applies the transactions in order against running totals, so each game row is updated once
+    total_pot = {id: game._total_pot for id, game in games.items()}
+    available_cashout = {id: game._available_cashout for id, game in games.items()}
+    bought_in = {id: 0 for id in game_ids}
+    cashed_out = set()
+    expired = set()
+    rows = []
+    for record in records:
+        game_id = record['gameID']
+        amount = round(float(record['amount']), 2)
+        if record['type'] == TransactionTypes.BUY_IN:
+            total_pot[game_id] = round(total_pot[game_id] + amount, 2)
+            available_cashout[game_id] = round(available_cashout[game_id] + amount, 2)
+            bought_in[game_id] = round(bought_in[game_id] + amount, 2)
+        else:
+            # Cash-outs are clamped to the available cashout, and emptying it expires the game
+            if amount >= available_cashout[game_id]:
+                amount = available_cashout[game_id]
+                expired.add(game_id)
+            available_cashout[game_id] = round(available_cashout[game_id] - amount, 2)
+            cashed_out.add(game_id)
+
+        rows.append({
+            'game_id': game_id,
+            'profile_id': record['profileID'],
+            'type': TransactionTypes(record['type']),
+            '_amount': amount,
+            'denominations': ','.join(str(x) for x in record['denominations']),
+        })
+
+    versions = {}
+    for id in game_ids:
+        if id in cashed_out:
+            query = (
+                update(Game)
+                    .filter(Game.id == id, Game.version == games[id].version)
+                    .values(_total_pot=total_pot[id], _available_cashout=available_cashout[id], version=games[id].version + 1)
+                    .execution_options(synchronize_session=False)
+                )
+            if session.execute(query).rowcount != 1:
+                raise StaleGameException
+            versions[id] = games[id].version + 1
+        else:
+            query = (
+                update(Game)
+                    .filter(Game.id == id)
+                    .values(
+                        _total_pot=func.round(Game._total_pot + bought_in[id], 2),
+                        _available_cashout=func.round(Game._available_cashout + bought_in[id], 2),
+                        version=Game.version + 1
+                    )
+                    .returning(Game._available_cashout, Game.version)
+                    .execution_options(synchronize_session=False)
+                )
+            available_cashout[id], versions[id] = session.execute(query).one()
+
+    if expired:
+        query = (
+            update(GameSettings)
+                .filter(GameSettings.id.in_([games[id].settings_id for id in expired]))
+                .values(expired=True)
+                .execution_options(synchronize_session=False)
+            )
+        session.execute(query)
+
+    query = insert(Transaction).returning(Transaction, sort_by_parameter_order=True)
+    transactions = session.scalars(query, rows).all()
+
+    try:
+        stats.record_transactions(session, transactions, {id: game.date_created for id, game in games.items()})
+    except IntegrityError:
+        # Another worker recorded a first transaction for the same player first, so the batch is retried
+        raise StaleGameException
+
+    for id in game_ids:
+        events = [
+            {'type': GameEventTypes(transaction.type.value), 'profileID': transaction.profile_id, 'amount': transaction._amount}
+            for transaction in transactions if transaction.game_id == id
+        ]
+        if id in expired:
+            events.append({'type': GameEventTypes.SETTINGS, 'data': {'expired': True}})
+        ledger.append(session, id, versions[id], events)
+
+    deltas = []
+    for id in game_ids:
+        delta = build_transactions_delta(
+            id,
+            versions[id],
+            available_cashout[id],
+            [transaction for transaction in transactions if transaction.game_id == id],
+            session
+        )
+        if id in expired:
+            delta['settings'] = {'expired': True}
+        deltas.append(delta)
 
-    game.total_pot += transaction.amount
-    game.available_cashout += transaction.amount
+    results = [(transaction.amount, transaction.type) for transaction in transactions]
 
     session.commit()
-    return transaction.amount, transaction.type
+    for delta in deltas:
+        publish_delta(session, delta)
+    return results
+
+def create_buy_in(session, data):
+    """
+    Processing a buy-in transaction, where a player adds money to the game's pot.
+    Updates the game's total pot and available cashout amounts accordingly, with server-side increments.
+
+    Parameters:
+    session (Session): The database session to use for the transaction.
+    data (dict): A dictionary containing details of the buy-in transaction, including the game ID, profile ID, amount, and denominations.
+
+    Returns:
+    tuple: A tuple containing the transaction amount and type.
+
+    Raises:
+    GameNotFoundException: If no game is found for the given game ID.
+    """
+    return create_transactions(session, [dict(data, type=TransactionTypes.BUY_IN)])[0]
 
 def create_cash_out(session, data):
     """
     Handles cash-out transactions where a player withdraws money from the game's total pot.
     It adjusts the transaction amount based on the available cashout and updates the game's available cashout accordingly.
+    If the cash-out takes the whole available cashout, the game is expired.
+    The update only applies if the game is unchanged since it was read, and is retried otherwise.
 
     Parameters:
     session (Session): The database session for processing the transaction.
@@ -214,110 +668,379 @@ def create_cash_out(session, data):
 
     Raises:
     GameNotFoundException: If the specified game is not found.
+    GameUpdateConflictException: If the game kept changing concurrently for every retry.
     """
-    # Gets the associated game
-    query = select(Game).filter_by(id=data['gameID'])
-    rows = session.execute(query).fetchone()
-    if not rows:
+    return create_transactions(session, [dict(data, type=TransactionTypes.CASH_OUT)])[0]
+
+def get_game_data(id, session, fields=None):
+    """
+    Creates an object containing all required details of a specific game.
+
+    Parameters:
+    id (int): The ID of the game to retrieve.
+    session (Session): The database session to use for queries.
+    fields (set): The fields to include, as returned by 'parse_fields()'. Defaults to the whole document.
+
+    Returns:
+    dict: A dictionary containing detailed information about the game.
+
+    Raises:
+    GameNotFoundException: If no game is found with the provided ID.
+    """
+    games = get_games_data([id], session, fields)
+    if not games:
         raise GameNotFoundException
-    game = rows[0]
 
-    # Adjusts transaction amount based on the available cashout
-    transaction_amount = data['amount']
+    return games[0]
 
-    if data['amount'] >= game.available_cashout:
-        transaction_amount = game.available_cashout
-        get_game_settings(game.settings_id, session).expired = True
+def get_games_data(ids, session, fields=None):
+    """
+    Creates objects containing all required details of several games at once.
+    The games, their settings, transactions and every referenced profile are loaded 
+    in a fixed number of queries, regardless of how many games or transactions are involved.
+    The available cashout, members and contributors come from the state the ledger rebuilds at each game's version,
+    its latest snapshot plus the events since, so contributors are not summed from every transaction.
+    When only some fields are requested, only the queries those fields need are run.
+    Every whole document built is stored in the game cache.
 
-    # Creates the transaction
-    transaction = Transaction(
-        game_id = game.id,
-        profile_id = data['profileID'],
-        type = TransactionTypes.CASH_OUT,
-        amount = transaction_amount,
-        denominations = ','.join(str(x) for x in data['denominations']),
-    )
-    session.add(transaction)
-    session.flush()
+    Parameters:
+    ids (list): The IDs of the games to retrieve.
+    session (Session): The database session to use for queries.
+    fields (set): The fields to include, as returned by 'parse_fields()'. Defaults to the whole document.
 
-    game.available_cashout -= transaction.amount
+    Returns:
+    list: A list of game data dictionaries, in the same order as the given IDs. IDs with no matching game are skipped.
+    """
+    if not ids:
+        return []
+    whole = fields is None
+    if whole:
+        fields = set(GAME_FIELDS)
 
-    session.commit()
-    return transaction.amount, transaction.type
+    query = (
+        select(Game, GameSettings)
+            .join(GameSettings, Game.settings_id == GameSettings.id)
+            .filter(Game.id.in_(ids))
+        )
+    games = {game.id: (game, settings) for game, settings in session.execute(query).all()}
+    if not games:
+        return []
+
+    transactions = []
+    if 'transactions' in fields:
+        query = select(Transaction).filter(Transaction.game_id.in_(games.keys())).order_by(Transaction.id)
+        transactions = session.execute(query).scalars().all()
+
+    states = {}
+    if fields & {'availableCashout', 'memberIDs', 'contributors'}:
+        states = ledger.get_states(session, {game_id: game.version for game_id, (game, _) in games.items()})
+        missing = [game_id for game_id in games if game_id not in states]
+        if missing:
+            # Games whose ledger cannot rebuild their current version are read from the tables instead
+            states.update(ledger.load_table_states(session, missing))
+
+    profile_ids = {game.admin_id for game, _ in games.values()} if 'admin' in fields else set()
+    profile_ids.update(transaction.profile_id for transaction in transactions)
+    if 'contributors' in fields:
+        profile_ids.update(contributor['profileID'] for state in states.values() for contributor in state['contributors'])
+    profiles = get_users_first_last(profile_ids, session)
+
+    game_transactions = {game_id: [] for game_id in games}
+    for transaction in transactions:
+        game_transactions[transaction.game_id].append(build_transaction_data(transaction, profiles[transaction.profile_id]))
+
+    games_data = []
+    for id in ids:
+        if id not in games:
+            continue
+        game, settings = games[id]
+        state = states.get(game.id, {'availableCashout': game.available_cashout, 'memberIDs': [], 'contributors': []})
+        game_data = {
+            'name': game.name,
+            'dateCreated': game.date_created.isoformat() + 'Z',
+            'id': game.id,
+            'availableCashout': build_amount(state['availableCashout']),
+            'memberIDs': state['memberIDs'],
+            'contributors': [
+                {'profile': profiles[contributor['profileID']], 'contribution': build_amount(contributor['contribution'])}
+                for contributor in state['contributors']
+            ] if 'contributors' in fields else [],
+            'transactions': game_transactions[game.id],
+            'admin': profiles.get(game.admin_id),
+            'settings': build_settings_data(settings),
+            'version': game.version,
+        }
+        if whole:
+            game_cache.put(game.id, game.version, game_data)
+        games_data.append(select_fields(game_data, None if whole else fields))
+
+    return games_data
+
+def parse_fields(value):
+    """
+    Reads a comma-separated selection of game document fields, such as 'name,availableCashout,settings'.
+    The ID and version are always included.
 
-def get_game_data(id, session):
+    Parameters:
+    value (str): The selection, or None or an empty string for the whole document.
+
+    Returns:
+    set: The selected fields, or None for the whole document.
+
+    Raises:
+    InvalidFieldsException: If any of the fields is not one of 'GAME_FIELDS'.
     """
-    Creates an object containing all required details of a specific game.
+    if not value:
+        return None
+    fields = {field.strip() for field in value.split(',') if field.strip()}
+    if not fields.issubset(GAME_FIELDS):
+        raise InvalidFieldsException
+    return fields | {'id', 'version'}
+
+def select_fields(game_data, fields):
+    """
+    Creates a copy of a game document with only the selected fields.
 
     Parameters:
-    id (int): The ID of the game to retrieve.
+    game_data (dict): The game document.
+    fields (set): The fields to include, or None for the whole document.
+
+    Returns:
+    dict: The game document itself if every field is selected, and a partial copy otherwise.
+    """
+    if fields is None:
+        return game_data
+    return {field: value for field, value in game_data.items() if field in fields}
+
+def get_cached_games_data(versions, session, fields=None):
+    """
+    Creates objects containing all required details of several games, reusing cached game documents where possible.
+    Only the games whose cached document is missing or out of date are loaded from the database.
+
+    Parameters:
+    versions (list): A list of (game ID, version) pairs describing the current version of each game.
     session (Session): The database session to use for queries.
+    fields (set): The fields to include, as returned by 'parse_fields()'. Defaults to the whole document.
 
     Returns:
-    dict: A dictionary containing detailed information about the game.
+    list: A list of game data dictionaries, in the same order as the given pairs.
+    """
+    cached = {id: game_cache.get(id, version) for id, version in versions}
+    loaded = get_games_data([id for id, game_data in cached.items() if game_data is None], session, fields)
+    cached.update((game_data['id'], game_data) for game_data in loaded)
+
+    return [select_fields(cached[id], fields) for id, _ in versions if cached[id] is not None]
+
+def bump_version(id, session):
+    """
+    Increments the version of a game, marking any cached copy of its document as out of date.
+
+    Parameters:
+    id (int): The ID of the game.
+    session (Session): The database session to use for the update.
+
+    Returns:
+    int: The new version of the game.
 
     Raises:
     GameNotFoundException: If no game is found with the provided ID.
     """
-    query = select(Game).filter_by(id=id)
-    rows = session.execute(query).all()
-    if not rows:
+    query = (
+        update(Game)
+            .filter_by(id=id)
+            .values(version=Game.version + 1)
+            .returning(Game.version)
+        )
+    version = session.execute(query).scalar_one_or_none()
+    if version is None:
         raise GameNotFoundException
-    
-    game = rows[0][0]
-    name = game.name
-    date_game_created = game.date_created
-    game_id = game.id
-    available_cashout = game.available_cashout
-    game_admin = get_user_first_last(game.admin_id, session)
-    game_contributors_dict = {}
-    game_contributors = []
-    game_transactions = []
-
-    query = select(Transaction).filter_by(game_id=game_id)
-    rows = session.execute(query).all()
 
-    for transaction in rows:
-        transaction = transaction[0]
-        if not transaction.profile_id in game_contributors_dict:
-            game_contributors_dict[transaction.profile_id] = {
-                "profile": get_user_first_last(transaction.profile_id, session),
-                "contribution": transaction.amount if transaction.type == TransactionTypes.BUY_IN else 0
+    return version
+
+def build_transactions_delta(game_id, version, available_cashout, transactions, session):
+    """
+    Creates a delta describing the changes that new transactions made to a game.
+
+    Parameters:
+    game_id (int): The ID of the game the transactions belong to.
+    version (int): The version of the game the transactions created.
+    available_cashout (float): The available cashout of the game after the transactions.
+    transactions (list): The new transactions, in the order they were created.
+    session (Session): The database session to use for queries.
+
+    Returns:
+    dict: A delta containing the new transactions, the updated available cashout and the change in each contributor's contribution.
+    """
+    profiles = get_users_first_last({transaction.profile_id for transaction in transactions}, session)
+    contributors = {}
+    for transaction in transactions:
+        if not transaction.profile_id in contributors:
+            contributors[transaction.profile_id] = {
+                "profile": profiles[transaction.profile_id],
+                "contribution": 0.0
             }
-        else:
-            game_contributors_dict[transaction.profile_id]['contribution'] += transaction.amount if transaction.type == TransactionTypes.BUY_IN else 0
-
-        game_transactions.append({
-            "profile": get_user_first_last(transaction.profile_id, session),
-            "date": transaction.date.isoformat() + 'Z',
-            "type": transaction.type,
-            "amount": transaction.amount,
-            "denominations": [int(x) for x in transaction.denominations.split(',')],
-        })
+        if transaction.type == TransactionTypes.BUY_IN:
+            contributors[transaction.profile_id]['contribution'] = build_amount(contributors[transaction.profile_id]['contribution'] + transaction.amount)
 
-    for contributor in game_contributors_dict:
-        game_contributors.append(game_contributors_dict[contributor])
-    
-    game_settings = get_settings_data(game.settings_id, session)
+    return {
+        'gameID': game_id,
+        'seq': version,
+        'availableCashout': build_amount(available_cashout),
+        'transactions': [build_transaction_data(transaction, profiles[transaction.profile_id]) for transaction in transactions],
+        'contributors': list(contributors.values()),
+    }
 
-    query = select(GameMember).filter_by(game_id=game_id)
-    rows = session.execute(query).all()
+def apply_delta(game_data, delta):
+    """
+    Creates an updated copy of a game document by applying a delta to it. The original document is left unchanged.
+
+    Parameters:
+    game_data (dict): The game document, at the version preceding the delta.
+    delta (dict): The delta to apply.
+
+    Returns:
+    dict: The game document at the version of the delta.
+    """
+    game_data = dict(game_data, version=delta['seq'])
+
+    if 'availableCashout' in delta:
+        game_data['availableCashout'] = delta['availableCashout']
+    if 'transactions' in delta:
+        game_data['transactions'] = game_data['transactions'] + delta['transactions']
+    if 'contributors' in delta:
+        contributors = {contributor['profile']['id']: contributor for contributor in game_data['contributors']}
+        for contributor in delta['contributors']:
+            id = contributor['profile']['id']
+            if id in contributors:
+                contributors[id] = dict(contributors[id], contribution=build_amount(contributors[id]['contribution'] + contributor['contribution']))
+            else:
+                contributors[id] = contributor
+        game_data['contributors'] = list(contributors.values())
+    if 'memberIDs' in delta:
+        game_data['memberIDs'] = sorted(set(game_data['memberIDs']).union(delta['memberIDs']))
+    if 'settings' in delta:
+        game_data['settings'] = dict(game_data['settings'], **delta['settings'])
+    if 'profiles' in delta:
+        profiles = {profile['id']: profile for profile in delta['profiles']}
+        def rename(profile):
+            return profiles.get(profile['id'], profile) if profile is not None else None
+        game_data['admin'] = rename(game_data['admin'])
+        game_data['contributors'] = [dict(contributor, profile=rename(contributor['profile'])) for contributor in game_data['contributors']]
+        game_data['transactions'] = [dict(transaction, profile=rename(transaction['profile'])) for transaction in game_data['transactions']]
+
+    return game_data
+
+def merge_deltas(first, second):
+    """
+    Combines two consecutive deltas of a game into one, which applied to the document preceding the first
+    gives the document at the version of the second. Neither delta is changed.
+
+    Parameters:
+    first (dict): The earlier delta.
+    second (dict): The delta whose 'seq' immediately follows that of the first.
+
+    Returns:
+    dict: The combined delta, carrying the 'seq' of the second.
+    """
+    merged = dict(first, seq=second['seq'])
+
+    if 'availableCashout' in second:
+        merged['availableCashout'] = second['availableCashout']
+    if 'transactions' in second:
+        merged['transactions'] = first.get('transactions', []) + second['transactions']
+    if 'contributors' in second:
+        contributors = {contributor['profile']['id']: contributor for contributor in first.get('contributors', [])}
+        for contributor in second['contributors']:
+            id = contributor['profile']['id']
+            if id in contributors:
+                contributors[id] = dict(contributors[id], contribution=build_amount(contributors[id]['contribution'] + contributor['contribution']))
+            else:
+                contributors[id] = contributor
+        merged['contributors'] = list(contributors.values())
+    if 'memberIDs' in second:
+        merged['memberIDs'] = sorted(set(first.get('memberIDs', [])).union(second['memberIDs']))
+    if 'settings' in second:
+        merged['settings'] = dict(first.get('settings', {}), **second['settings'])
+    if 'profiles' in second:
+        profiles = {profile['id']: profile for profile in first.get('profiles', []) + second['profiles']}
+        merged['profiles'] = list(profiles.values())
+
+    return merged
+
+def update_cache(delta):
+    """
+    Brings the cached document of a game up to date with a committed change.
+    The delta is applied if the cached copy is at the preceding version, otherwise the cached copy is invalidated.
+    Deltas that the cached copy already includes are ignored, so the same delta can safely be applied more than once.
+
+    Parameters:
+    delta (dict): The delta describing the change.
+    """
+    cached_version = game_cache.get_version(delta['gameID'])
+    if cached_version is not None and cached_version >= delta['seq']:
+        return
+
+    game_data = game_cache.get(delta['gameID'], delta['seq'] - 1)
+    if game_data is None:
+        game_cache.invalidate(delta['gameID'], delta['seq'])
+    else:
+        game_cache.put(delta['gameID'], delta['seq'], apply_delta(game_data, delta))
+
+def publish_delta(session, delta):
+    """
+    Records a committed change to a game. The cached game document is brought up to date with 'update_cache()',
+    and the delta is queued on the session for broadcasting to subscribers.
+
+    Parameters:
+    session (Session): The database session the change was committed with.
+    delta (dict): The delta describing the change.
+    """
+    update_cache(delta)
+    session.info.setdefault('game_deltas', []).append(delta)
+
+def pop_deltas(session):
+    """
+    Removes and returns the deltas queued on a session by 'publish_delta()'.
+
+    Parameters:
+    session (Session): The database session the changes were committed with.
+
+    Returns:
+    list: The queued deltas, in the order they were published.
+    """
+    return session.info.pop('game_deltas', [])
+
+def build_amount(value):
+    """
+    Converts an amount to the form game documents carry: a float rounded to cents.
+    Documents built from the database and documents patched with deltas both use it, so a version has one body,
+    whether an amount came from a float column, an integer returned by the database driver, or a running total.
+
+    Parameters:
+    value (int | float): The amount.
 
-    members = []
-    for member in rows:
-        member = member[0]
-        members.append(member.profile_id)
+    Returns:
+    float: The amount, rounded to cents.
+    """
+    return float(round(value, 2))
+
+def build_transaction_data(transaction, profile):
+    """
+    Creates an object containing the details of a single transaction.
+
+    Parameters:
+    transaction (Transaction): The transaction to describe.
+    profile (dict): The first and last name of the profile that made the transaction.
 
+    Returns:
+    dict: A dictionary containing the transaction data.
+    """
     return {
-        'name': name,
-        'dateCreated': date_game_created.isoformat() + 'Z',
-        'id': game_id,
-        'availableCashout': available_cashout,
-        'memberIDs': members,
-        'contributors': game_contributors,
-        'transactions': game_transactions,
-        'admin': game_admin,
-        'settings': game_settings,
+        "profile": profile,
+        "date": transaction.date.isoformat() + 'Z',
+        "type": transaction.type,
+        "amount": build_amount(transaction.amount),
+        "denominations": [int(x) for x in transaction.denominations.split(',')],
     }
 
 def get_game_settings(id, session):
@@ -360,12 +1083,22 @@ def get_settings_data(id, session):
     if not rows:
         raise GameSettingsNotFoundException
     
-    settings = rows[0]
+    return build_settings_data(rows[0])
 
+def build_settings_data(settings):
+    """
+    Creates an object containing all required details of a game's settings.
+
+    Parameters:
+    settings (GameSettings): The game settings to describe.
+
+    Returns:
+    dict: A dictionary containing the settings data of the game.
+    """
     return {
         "id": settings.id,
-        "minBuyIn": settings.min_buy_in,
-        "maxBuyIn": settings.max_buy_in,
+        "minBuyIn": build_amount(settings.min_buy_in),
+        "maxBuyIn": build_amount(settings.max_buy_in),
         "denominations": [float(x) for x in settings.denominations.split(',')],
         "denominationColors": [x for x in settings.denomination_colors.split(',')],
         'buyInEnabled': settings.buy_in_enabled,
@@ -380,16 +1113,20 @@ def add_game_member(id, game_id, session):
     id (int): The profile ID of the user to be added as a member.
     game_id (int): The ID of the game to which the member is to be added.
     session (Session): The database session for the operation.
+
+    Returns:
+    bool: True if the user was added, False if the user was already a member.
     """
     query = select(GameMember).filter_by(profile_id=id, game_id=game_id)
     rows = session.execute(query).all()
     if rows:
-        return
+        return False
     game_member = GameMember(
         game_id = game_id,
         profile_id = id
     )
     session.add(game_member)
+    return True
 
 def update_settings(session, data):
     """
@@ -422,6 +1159,89 @@ def update_settings(session, data):
         settings = rows[0]
 
         setattr(settings, updateRequest['attribute'], updateRequest['value'])
-        
+
+    delta = {
+        'gameID': game.id,
+        'seq': bump_version(game.id, session),
+        'settings': build_settings_data(settings),
+    }
+    ledger.append(session, game.id, delta['seq'], [{'type': GameEventTypes.SETTINGS, 'data': delta['settings']}])
+
     session.commit()
-    return get_game_data(game.id, session)
+    publish_delta(session, delta)
+    return get_by_id(session, game.id)
+
+def rename_profile(session, profile):
+    """
+    Records that a user's name changed in every game that is not expired and whose document shows it:
+    games the user administers, is a member of, or made transactions in.
+    Each of those games gets a new version, so cached documents and entity tags built with the old name are replaced,
+    and a delta carrying the new name is queued on the session with 'publish_delta()' once the caller commits.
+    The games keep their last modification time, so the rename does not reorder anyone's game lists or move their page cursors.
+    Expired games are not changed; their cached documents are discarded with 'forget_profile()' instead.
+
+    Parameters:
+    session (Session): The database session the profile is updated in. The caller commits it.
+    profile (Profile): The updated profile.
+
+    Returns:
+    list: The deltas to publish after the commit, one for each game.
+    """
+    game_ids = union(
+        select(Game.id).filter(Game.admin_id == profile.id),
+        select(GameMember.game_id).filter(GameMember.profile_id == profile.id),
+        select(Transaction.game_id).filter(Transaction.profile_id == profile.id)
+    )
+    query = (
+        update(Game)
+            .filter(Game.id.in_(game_ids))
+            .filter(Game.settings_id.in_(select(GameSettings.id).filter(GameSettings.expired == False)))
+            .values(version=Game.version + 1, last_modified=Game.last_modified)
+            .returning(Game.id, Game.version)
+            .execution_options(synchronize_session=False)
+        )
+    versions = session.execute(query).all()
+
+    data = {'id': profile.id, 'firstName': profile.firstName, 'lastName': profile.lastName}
+    deltas = []
+    for id, version in versions:
+        ledger.append(session, id, version, [{'type': GameEventTypes.PROFILE, 'profileID': profile.id}])
+        deltas.append({'gameID': id, 'seq': version, 'profiles': [data]})
+    return deltas
+
+def forget_profile(profile_id):
+    """
+    Discards the cached documents of expired games that show a user, after the user's name changed.
+    Expired games are not given a new version by 'rename_profile()', so their documents are rebuilt with the new name
+    the next time they are read, while clients holding their entity tag keep the old name.
+    Called on every worker when a profile is updated, through the message queue.
+
+    Parameters:
+    profile_id (int): The ID of the user's profile.
+    """
+    def shows_profile(id, game_data):
+        return game_data['settings']['expired'] and (
+            (game_data['admin'] is not None and game_data['admin']['id'] == profile_id)
+            or profile_id in game_data['memberIDs']
+            or any(contributor['profile']['id'] == profile_id for contributor in game_data['contributors'])
+        )
+
+    game_cache.invalidate_matching(shows_profile)
+
+# Variants of the service functions for the asyncio server, which take an AsyncSession
+get_versions_by_user_id_async = async_variant(get_versions_by_user_id)
+get_page_by_user_id_async = async_variant(get_page_by_user_id)
+get_by_id_async = async_variant(get_by_id)
+get_version_async = async_variant(get_version)
+get_transactions_page_async = async_variant(get_transactions_page)
+create_async = async_variant(create)
+join_async = async_variant(join)
+create_transaction_async = async_variant(create_transaction)
+create_transactions_async = async_variant(create_transactions)
+update_settings_async = async_variant(update_settings)
+
+async def get_cached_games_data_async(versions, session, fields=None):
+    """
+    Asyncio variant of 'get_cached_games_data()', taking an AsyncSession.
+    """
+    return await session.run_sync(lambda sync_session: get_cached_games_data(versions, sync_session, fields))
@@ -0,0 +1,375 @@
+from sqlalchemy import and_, case, desc, func, insert, select
+
+from async_database import async_variant
+import constants
+from models import Game, GameEvent, GameEventTypes, GameMember, GameSettings, GameSnapshot, Transaction, TransactionTypes
+import serialization
+
+class LedgerHistoryUnavailableException(Exception):
+    pass
+
+def append(session, game_id, version, events):
+    """
+    Appends the events of a change to a game's ledger, in the caller's database transaction.
+    Every 'ledger_snapshot_interval' versions, a snapshot of the game's state is stored as well,
+    so rebuilding the state never replays more than that many versions of events.
+
+    Parameters:
+    session (Session): The database session the change is made in.
+    game_id (str): The ID of the game.
+    version (int): The version of the game the change creates.
+    events (list): The events of the change, in order, each a dictionary with a 'type' and,
+    depending on the type, a 'profileID', an 'amount' and 'data'.
+    """
+    session.execute(insert(GameEvent), [
+        {
+            'game_id': game_id,
+            'version': version,
+            'type': event['type'],
+            'profile_id': event.get('profileID'),
+            '_amount': event.get('amount'),
+            'data': serialization.dumps(event['data']).decode('utf-8') if 'data' in event else None,
+        }
+        for event in events
+    ])
+    if version % constants.LEDGER_SNAPSHOT_INTERVAL == 0:
+        try:
+            take_snapshot(session, game_id, version)
+        except LedgerHistoryUnavailableException:
+            # A game from before the ledger that was not backfilled has nothing to snapshot from
+            pass
+
+def take_snapshot(session, game_id, version):
+    """
+    Stores the state of a game at a version, rebuilt from the ledger.
+
+    Parameters:
+    session (Session): The database session to use.
+    game_id (str): The ID of the game.
+    version (int): The version of the game.
+
+    Raises:
+    LedgerHistoryUnavailableException: If the ledger does not reach back far enough to rebuild the state.
+    """
+    state = get_state(session, game_id, version)
+    session.execute(insert(GameSnapshot).values(
+        game_id=game_id,
+        version=state['version'],
+        state=serialization.dumps(state).decode('utf-8')
+    ))
+
+def empty_state():
+    """
+    Creates the state of a game before its first event.
+
+    Returns:
+    dict: The state, as described in 'get_state()'.
+    """
+    return {
+        'version': 0,
+        'totalPot': 0,
+        'availableCashout': 0,
+        'memberIDs': [],
+        'contributors': [],
+        'settings': {},
+    }
+
+def replay(state, events):
+    """
+    Applies events to the state of a game, in order.
+
+    Parameters:
+    state (dict): The state of the game before the events. It is updated in place.
+    events (list): The GameEvent rows to apply.
+
+    Returns:
+    dict: The updated state.
+    """
+    contributors = {contributor['profileID']: contributor for contributor in state['contributors']}
+    members = set(state['memberIDs'])
+
+    for event in events:
+        state['version'] = event.version
+        if event.type in (GameEventTypes.BUY_IN, GameEventTypes.CASH_OUT):
+            if event.profile_id not in contributors:
+                contributors[event.profile_id] = {'profileID': event.profile_id, 'contribution': 0}
+                state['contributors'].append(contributors[event.profile_id])
+            if event.type == GameEventTypes.BUY_IN:
+                state['totalPot'] = round(state['totalPot'] + event._amount, 2)
+                state['availableCashout'] = round(state['availableCashout'] + event._amount, 2)
+                contributors[event.profile_id]['contribution'] = round(contributors[event.profile_id]['contribution'] + event._amount, 2)
+            else:
+                state['availableCashout'] = round(state['availableCashout'] - event._amount, 2)
+        elif event.type in (GameEventTypes.CREATE, GameEventTypes.JOIN):
+            members.add(event.profile_id)
+        if event.data is not None:
+            state['settings'].update(serialization.loads(event.data))
+
+    state['memberIDs'] = sorted(members)
+    return state
+
+def get_state(session, game_id, version=None):
+    """
+    Rebuilds the state of a game at a version, from its latest snapshot at or before that version and the events since.
+
+    Parameters:
+    session (Session): The database session to use for queries.
+    game_id (str): The ID of the game.
+    version (int): The version to rebuild. Defaults to the current version.
+
+    Returns:
+    dict: The state of the game, containing its version, total pot, available cashout, member IDs,
+    contributors in the order of their first transaction, and settings.
+
+    Raises:
+    LedgerHistoryUnavailableException: If the game has no ledger, or the ledger starts after the version.
+    """
+    query = (
+        select(GameSnapshot.state)
+            .filter(GameSnapshot.game_id == game_id)
+            .order_by(desc(GameSnapshot.version))
+            .limit(1)
+        )
+    if version is not None:
+        query = query.filter(GameSnapshot.version <= version)
+    snapshot = session.execute(query).scalar_one_or_none()
+    state = serialization.loads(snapshot) if snapshot is not None else empty_state()
+
+    query = (
+        select(GameEvent.version, GameEvent.type, GameEvent.profile_id, GameEvent._amount, GameEvent.data)
+            .filter(GameEvent.game_id == game_id, GameEvent.version > state['version'])
+            .order_by(GameEvent.version, GameEvent.id)
+        )
+    if version is not None:
+        query = query.filter(GameEvent.version <= version)
+    events = session.execute(query).all()
+
+    if not reaches_creation(snapshot is not None, events):
+        raise LedgerHistoryUnavailableException
+
+    return replay(state, events)
+
+def reaches_creation(snapshot, events):
+    """
+    Checks that a state can be rebuilt from a snapshot and the events after it.
+
+    Parameters:
+    snapshot (bool): Whether the rebuild starts from a snapshot.
+    events (list): The GameEvent rows to apply, in order.
+
+    Returns:
+    bool: False if there is no snapshot and the events do not go back to the creation of the game.
+    """
+    return snapshot or (bool(events) and events[0].type == GameEventTypes.CREATE)
+
+def get_states(session, versions):
+    """
+    Rebuilds the state of several games at once, each at the given version, in two queries regardless of the number of games:
+    one for the latest snapshot of each game at or before its version, and one for the events since.
+
+    Parameters:
+    session (Session): The database session to use for queries.
+    versions (dict): A dictionary mapping the ID of each game to the version to rebuild.
+
+    Returns:
+    dict: A dictionary mapping the ID of each game to its state, as described in 'get_state()'.
+    Games whose ledger does not reach back far enough, or does not reach their version, are left out.
+    """
+    if not versions:
+        return {}
+
+    latest = (
+        select(GameSnapshot.game_id, func.max(GameSnapshot.version).label('version'))
+            .filter(GameSnapshot.game_id.in_(versions.keys()), GameSnapshot.version <= case(versions, value=GameSnapshot.game_id))
+            .group_by(GameSnapshot.game_id)
+            .subquery()
+        )
+    query = (
+        select(GameSnapshot.game_id, GameSnapshot.state)
+            .join(latest, and_(GameSnapshot.game_id == latest.c.game_id, GameSnapshot.version == latest.c.version))
+        )
+    snapshots = {game_id: serialization.loads(state) for game_id, state in session.execute(query).all()}
+
+    start = case({game_id: state['version'] for game_id, state in snapshots.items()}, value=GameEvent.game_id, else_=0) if snapshots else 0
+    query = (
+        select(GameEvent.game_id, GameEvent.version, GameEvent.type, GameEvent.profile_id, GameEvent._amount, GameEvent.data)
+            .filter(
+                GameEvent.game_id.in_(versions.keys()),
+                GameEvent.version > start,
+                GameEvent.version <= case(versions, value=GameEvent.game_id)
+            )
+            .order_by(GameEvent.game_id, GameEvent.version, GameEvent.id)
+        )
+    events = {game_id: [] for game_id in versions}
+    for event in session.execute(query).all():
+        events[event.game_id].append(event)
+
+    states = {}
+    for game_id, version in versions.items():
+        if not reaches_creation(game_id in snapshots, events[game_id]):
+            continue
+        state = replay(snapshots.get(game_id, empty_state()), events[game_id])
+        if state['version'] == version:
+            states[game_id] = state
+    return states
+
+def get_state_at(session, game_id, date):
+    """
+    Rebuilds the state of a game as it was at a point in time.
+
+    Parameters:
+    session (Session): The database session to use for queries.
+    game_id (str): The ID of the game.
+    date (datetime): The point in time, as a naive UTC datetime.
+
+    Returns:
+    dict: The state of the game, as described in 'get_state()'.
+
+    Raises:
+    LedgerHistoryUnavailableException: If the game's ledger has no events at or before the date.
+    """
+    column = GameEvent.date
+    if session.get_bind().dialect.name == 'sqlite':
+        # SQLite stores server-generated timestamps as text in a different format than bound datetimes, so both are normalized
+        column, date = func.datetime(column), func.datetime(date)
+    query = select(func.max(GameEvent.version)).filter(GameEvent.game_id == game_id, column <= date)
+    version = session.execute(query).scalar_one_or_none()
+    if version is None:
+        raise LedgerHistoryUnavailableException
+
+    return get_state(session, game_id, version)
+
+def load_table_states(connection, game_ids):
+    """
+    Builds the current state of games from the mutable game columns, members, settings and transactions,
+    in the same format as 'get_state()'.
+
+    Parameters:
+    connection (Connection or Session): The database connection or session to use for queries.
+    game_ids (list): The IDs of the games.
+
+    Returns:
+    dict: A dictionary mapping the ID of each game found to its state.
+    """
+    # Imported here since the game module records its changes through this one
+    from game import build_settings_data
+
+    # Settings are selected as labelled columns rather than entities, so this also runs on a plain connection
+    query = (
+        select(
+            Game.id.label('game_id'),
+            Game.version,
+            Game._total_pot,
+            Game._available_cashout,
+            GameSettings.id,
+            GameSettings._min_buy_in.label('min_buy_in'),
+            GameSettings._max_buy_in.label('max_buy_in'),
+            GameSettings.denominations,
+            GameSettings.denomination_colors,
+            GameSettings.buy_in_enabled,
+            GameSettings.expired
+        )
+            .join(GameSettings, Game.settings_id == GameSettings.id)
+            .filter(Game.id.in_(game_ids))
+        )
+    states = {
+        row.game_id: {
+            'version': row.version,
+            'totalPot': row._total_pot,
+            'availableCashout': row._available_cashout,
+            'memberIDs': [],
+            'contributors': [],
+            'settings': build_settings_data(row),
+        }
+        for row in connection.execute(query).all()
+    }
+    if not states:
+        return states
+
+    query = (
+        select(GameMember.game_id, GameMember.profile_id)
+            .filter(GameMember.game_id.in_(states.keys()))
+            .order_by(GameMember.profile_id)
+        )
+    for game_id, profile_id in connection.execute(query).all():
+        states[game_id]['memberIDs'].append(profile_id)
+
+    query = (
+        select(
+            Transaction.game_id,
+            Transaction.profile_id,
+            func.sum(case((Transaction.type == TransactionTypes.BUY_IN, Transaction._amount), else_=0))
+        )
+            .filter(Transaction.game_id.in_(states.keys()))
+            .group_by(Transaction.game_id, Transaction.profile_id)
+            .order_by(func.min(Transaction.id))
+        )
+    for game_id, profile_id, contribution in connection.execute(query).all():
+        states[game_id]['contributors'].append({'profileID': profile_id, 'contribution': round(contribution, 2)})
+
+    return states
+
+def backfill(connection, batch_size=500):
+    """
+    Starts the ledger of every game that does not have one yet, with a snapshot of its current state built by 'load_table_states()'.
+    The history of those games before the snapshot is not available.
+
+    Parameters:
+    connection (Connection): The database connection to use, inside a transaction.
+    batch_size (int): The number of games to load at a time.
+    """
+    query = (
+        select(Game.id)
+            .filter(~select(GameEvent.id).filter(GameEvent.game_id == Game.id).exists())
+            .filter(~select(GameSnapshot.version).filter(GameSnapshot.game_id == Game.id).exists())
+            .order_by(Game.id)
+        )
+    game_ids = connection.execute(query).scalars().all()
+    for start in range(0, len(game_ids), batch_size):
+        states = load_table_states(connection, game_ids[start:start + batch_size])
+        rows = [
+            {'game_id': game_id, 'version': state['version'], 'state': serialization.dumps(state).decode('utf-8')}
+            for game_id, state in states.items()
+        ]
+        if rows:
+            connection.execute(insert(GameSnapshot.__table__), rows)
+
+def audit(session, game_id):
+    """
+    Checks the mutable columns, members and settings of a game against the state rebuilt from its ledger.
+
+    Parameters:
+    session (Session): The database session to use for queries.
+    game_id (str): The ID of the game.
+
+    Returns:
+    list: A dictionary for each field that differs, containing the 'field' and its 'ledger' and 'tables' values. Empty if the game is consistent.
+
+    Raises:
+    LedgerHistoryUnavailableException: If the game has no ledger.
+    """
+    tables = load_table_states(session, [game_id]).get(game_id)
+    if tables is None:
+        raise LedgerHistoryUnavailableException
+    ledger = get_state(session, game_id)
+
+    differences = []
+    for field in ('version', 'totalPot', 'availableCashout', 'memberIDs'):
+        if ledger[field] != tables[field]:
+            differences.append({'field': field, 'ledger': ledger[field], 'tables': tables[field]})
+
+    ledger_contributions = {contributor['profileID']: contributor['contribution'] for contributor in ledger['contributors']}
+    table_contributions = {contributor['profileID']: contributor['contribution'] for contributor in tables['contributors']}
+    if ledger_contributions != table_contributions:
+        differences.append({'field': 'contributors', 'ledger': ledger['contributors'], 'tables': tables['contributors']})
+
+    for field, value in tables['settings'].items():
+        if ledger['settings'].get(field) != value:
+            differences.append({'field': f'settings.{field}', 'ledger': ledger['settings'].get(field), 'tables': value})
+
+    return differences
+
+# Variants of the read functions for the asyncio server, which take an AsyncSession
+get_state_async = async_variant(get_state)
+get_state_at_async = async_variant(get_state_at)
+audit_async = async_variant(audit)
@@ -0,0 +1,314 @@
+import json
+import queue
+import socket
+import socketserver
+import threading
+import time
+from urllib.parse import urlparse
+
+from socketio import AsyncAioPikaManager, AsyncRedisManager, KafkaManager, KombuManager, PubSubManager, RedisManager, ZmqManager
+
+# Messages between workers travel as emits of this event, in a namespace no client connects to
+CLUSTER_EVENT = 'cluster_message'
+CLUSTER_NAMESPACE = '/cluster'
+
+class ClusterMixin:
+    """
+    Adds worker-to-worker messages to a Socket.IO pub/sub client manager.
+    Besides the emits, room changes and disconnects that Socket.IO itself shares between workers,
+    any worker can publish a cluster message of a given kind, which is delivered to the listeners
+    registered for that kind on every worker, including the publishing one.
+    """
+    def publish_cluster_message(self, kind, payload):
+        """
+        Publishes a message to every worker sharing the message queue.
+
+        Parameters:
+        kind (str): The kind of message, used to select the listeners.
+        payload: A JSON-serializable payload.
+        """
+        self._dispatch_cluster_message(kind, payload)
+        self._publish(self._cluster_message(kind, payload))
+
+    def add_cluster_listener(self, kind, listener):
+        """
+        Registers a function to be called with the payload of every cluster message of the given kind.
+
+        Parameters:
+        kind (str): The kind of message to listen for.
+        listener (callable): The function to call.
+        """
+        if not hasattr(self, '_cluster_listeners'):
+            self._cluster_listeners = {}
+        self._cluster_listeners.setdefault(kind, []).append(listener)
+
+    def _cluster_message(self, kind, payload):
+        return {
+            'method': 'emit',
+            'event': CLUSTER_EVENT,
+            'data': [{'kind': kind, 'payload': payload}],
+            'binary': False,
+            'namespace': CLUSTER_NAMESPACE,
+            'room': None,
+            'skip_sid': None,
+            'callback': None,
+            'host_id': self.host_id,
+        }
+
+    def _dispatch_cluster_message(self, kind, payload):
+        for listener in getattr(self, '_cluster_listeners', {}).get(kind, []):
+            listener(payload)
+
+    def _handle_emit(self, message):
+        if message.get('event') == CLUSTER_EVENT and message.get('namespace') == CLUSTER_NAMESPACE:
+            data = message['data'][0]
+            self._dispatch_cluster_message(data['kind'], data['payload'])
+        else:
+            super()._handle_emit(message)
+
+class AsyncClusterMixin(ClusterMixin):
+    """
+    The counterpart of 'ClusterMixin' for the asyncio pub/sub client managers.
+    Listeners are still plain functions, called on the event loop.
+    """
+    async def publish_cluster_message(self, kind, payload):
+        """
+        Publishes a message to every worker sharing the message queue.
+
+        Parameters:
+        kind (str): The kind of message, used to select the listeners.
+        payload: A JSON-serializable payload.
+        """
+        self._dispatch_cluster_message(kind, payload)
+        await self._publish(self._cluster_message(kind, payload))
+
+    async def _handle_emit(self, message):
+        if message.get('event') == CLUSTER_EVENT and message.get('namespace') == CLUSTER_NAMESPACE:
+            data = message['data'][0]
+            self._dispatch_cluster_message(data['kind'], data['payload'])
+        else:
+            await super()._handle_emit(message)
+
+class MemoryManager(ClusterMixin, PubSubManager):
+    """
+    A client manager that shares messages between Socket.IO servers running in the same process.
+    Intended as a stand-in for a real message queue in tests and benchmarks.
+
+    Parameters:
+    channel (str): The channel to share. Servers using the same channel share their rooms.
+    """
+    name = 'memory'
+
+    _channels = {}
+    _channels_lock = threading.Lock()
+
+    def __init__(self, channel='socketio', write_only=False, logger=None, json=None):
+        super().__init__(channel=channel, write_only=write_only, logger=logger, json=json)
+        self._inbox = queue.Queue()
+        with self._channels_lock:
+            self._channels.setdefault(channel, []).append(self._inbox)
+
+    def _publish(self, data):
+        message = self.json.dumps(data)
+        with self._channels_lock:
+            inboxes = list(self._channels.get(self.channel, []))
+        for inbox in inboxes:
+            inbox.put(message)
+
+    def _listen(self):
+        while True:
+            yield self._inbox.get()
+
+class BrokerManager(ClusterMixin, PubSubManager):
+    """
+    A client manager that shares messages between Socket.IO servers through a broker started with 'run_broker()'.
+    Works across processes and hosts without any external service,
+    which makes it suitable as a local stand-in for a real message queue.
+
+    Parameters:
+    url (str): The address of the broker, as 'broker://host:port'.
+    """
+    name = 'broker'
+
+    def __init__(self, url='broker://127.0.0.1:5601', channel='socketio', write_only=False, logger=None, json=None):
+        super().__init__(channel=channel, write_only=write_only, logger=logger, json=json)
+        parsed_url = urlparse(url)
+        self.address = (parsed_url.hostname, parsed_url.port)
+        self._publisher = None
+        self._publisher_lock = threading.Lock()
+
+    def _publish(self, data):
+        message = (json.dumps({'channel': self.channel, 'data': self.json.dumps(data)}) + '\n').encode('utf-8')
+        with self._publisher_lock:
+            for retries_left in range(1, -1, -1):
+                try:
+                    if self._publisher is None:
+                        self._publisher = socket.create_connection(self.address)
+                    self._publisher.sendall(message)
+                    return
+                except OSError:
+                    self._publisher = None
+                    if retries_left == 0:
+                        self._get_logger().error('Cannot publish to broker... giving up')
+
+    def _listen(self):
+        retry_sleep = 1
+        while True:
+            try:
+                with socket.create_connection(self.address) as connection:
+                    retry_sleep = 1
+                    for line in connection.makefile('r', encoding='utf-8'):
+                        message = json.loads(line)
+                        if message['channel'] == self.channel:
+                            yield message['data']
+            except OSError:
+                self._get_logger().error(f'Cannot receive from broker... retrying in {retry_sleep} secs')
+                time.sleep(retry_sleep)
+                retry_sleep = min(retry_sleep * 2, 60)
+
+class _BrokerHandler(socketserver.StreamRequestHandler):
+
+    def handle(self):
+        self.server.add_connection(self.connection)
+        try:
+            for line in self.rfile:
+                self.server.relay(line)
+        except OSError:
+            # The worker went away without closing its connection
+            pass
+        finally:
+            self.server.remove_connection(self.connection)
+
+class _BrokerServer(socketserver.ThreadingTCPServer):
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, address):
+        super().__init__(address, _BrokerHandler)
+        self._connections = set()
+        self._lock = threading.Lock()
+
+    def add_connection(self, connection):
+        with self._lock:
+            self._connections.add(connection)
+
+    def remove_connection(self, connection):
+        with self._lock:
+            self._connections.discard(connection)
+
+    def relay(self, line):
+        with self._lock:
+            for connection in list(self._connections):
+                try:
+                    connection.sendall(line)
+                except OSError:
+                    self._connections.discard(connection)
+
+def run_broker(host='127.0.0.1', port=5601, background=False):
+    """
+    Runs a broker that relays every message it receives to every connected 'BrokerManager'.
+
+    Parameters:
+    host (str): The interface to listen on.
+    port (int): The port to listen on. Use 0 to pick a free port.
+    background (bool): If True, the broker runs on a daemon thread and this function returns immediately.
+
+    Returns:
+    socketserver.TCPServer: The broker server. Its 'server_address' holds the address it listens on.
+    """
+    server = _BrokerServer((host, port))
+    if background:
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+    else:
+        server.serve_forever()
+    return server
+
+def start_listening(server):
+    """
+    Starts receiving messages from the message queue straight away.
+    Socket.IO otherwise only starts listening once the first client connects,
+    and until then the worker would miss the cluster messages of the other workers.
+
+    Parameters:
+    server (socketio.Server): The Socket.IO server using the client manager. An asyncio server must be called from its event loop.
+    """
+    if not server.manager_initialized:
+        server.manager_initialized = True
+        server.manager.initialize()
+
+def _clustered(manager_class):
+    return type(manager_class.__name__, (ClusterMixin, manager_class), {})
+
+def _clustered_async(manager_class):
+    return type(manager_class.__name__, (AsyncClusterMixin, manager_class), {})
+
+def create_client_manager(url):
+    """
+    Creates the Socket.IO client manager for a message queue URL.
+
+    Supported URLs:
+    memory://<channel>: Servers in the same process, see 'MemoryManager'.
+    broker://<host>:<port>: Servers connected to a broker started with 'run_broker()', see 'BrokerManager'.
+    redis://, rediss://, valkey://: A Redis or Valkey server.
+    kafka://: A Kafka cluster.
+    zmq+tcp://: A ZeroMQ broker.
+    Anything else is handed to Kombu, for example amqp:// for RabbitMQ.
+
+    Parameters:
+    url (str): The message queue URL. If empty, no client manager is created and rooms stay local to the worker.
+
+    Returns:
+    PubSubManager: The client manager, or None if no URL is given.
+    """
+    if not url:
+        return None
+
+    scheme = urlparse(url).scheme.split('+', 1)[0]
+    if scheme == 'memory':
+        return MemoryManager(channel=urlparse(url).netloc or 'socketio')
+    if scheme == 'broker':
+        return BrokerManager(url)
+    if scheme in ('redis', 'rediss', 'valkey', 'valkeys', 'unix'):
+        return _clustered(RedisManager)(url)
+    if scheme == 'kafka':
+        return _clustered(KafkaManager)(url)
+    if scheme == 'zmq':
+        return _clustered(ZmqManager)(url)
+    return _clustered(KombuManager)(url)
+
+def create_async_client_manager(url):
+    """
+    Creates the Socket.IO client manager of the asyncio server for a message queue URL.
+
+    Supported URLs:
+    redis://, rediss://, valkey://: A Redis or Valkey server.
+    amqp://: A RabbitMQ server, through aio-pika.
+
+    Parameters:
+    url (str): The message queue URL. If empty, no client manager is created and rooms stay local to the worker.
+
+    Returns:
+    AsyncPubSubManager: The client manager, or None if no URL is given.
+
+    Raises:
+    ValueError: If the message queue has no asyncio client manager.
+    """
+    if not url:
+        return None
+
+    scheme = urlparse(url).scheme.split('+', 1)[0]
+    if scheme in ('redis', 'rediss', 'valkey', 'valkeys', 'unix'):
+        return _clustered_async(AsyncRedisManager)(url)
+    if scheme in ('amqp', 'amqps'):
+        return _clustered_async(AsyncAioPikaManager)(url)
+    raise ValueError(f'No asyncio client manager for message queue: {scheme}')
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Runs a local message broker for sharing Socket.IO rooms between workers.')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=5601)
+    args = parser.parse_args()
+    run_broker(args.host, args.port)
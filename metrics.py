@@ -0,0 +1,277 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+import threading
+import time
+
+from sqlalchemy import event
+from sqlalchemy.engine.cursor import CursorFetchStrategy
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 500, 1000, 10000)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576)
+
+_lock = threading.Lock()
+# A context variable rather than a thread local, so requests on the asyncio server are told apart too
+_request = ContextVar('metrics_request', default=None)
+
+class Histogram:
+    """
+    A cumulative histogram with fixed bucket boundaries, one series per label value.
+    """
+    def __init__(self, name, help, label, buckets):
+        self.name = name
+        self.help = help
+        self.label = label
+        self.buckets = buckets
+        self.series = {}
+
+    def observe(self, label, value):
+        with _lock:
+            series = self.series.get(label)
+            if series is None:
+                series = self.series[label] = {'counts': [0] * len(self.buckets), 'count': 0, 'sum': 0.0}
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series['counts'][i] += 1
+            series['count'] += 1
+            series['sum'] += value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with _lock:
+            for label, series in sorted(self.series.items()):
+                labels = f'{self.label}="{escape(label)}"'
+                for bound, count in zip(self.buckets, series['counts']):
+                    lines.append(f'{self.name}_bucket{{{labels},le="{bound}"}} {count}')
+                lines.append(f'{self.name}_bucket{{{labels},le="+Inf"}} {series["count"]}')
+                lines.append(f'{self.name}_sum{{{labels}}} {series["sum"]}')
+                lines.append(f'{self.name}_count{{{labels}}} {series["count"]}')
+        return lines
+
+class Counter:
+    """
+    A monotonically increasing counter, one series per label value.
+    """
+    def __init__(self, name, help, label=None):
+        self.name = name
+        self.help = help
+        self.label = label
+        self.series = {}
+
+    def inc(self, label=None, value=1):
+        with _lock:
+            self.series[label] = self.series.get(label, 0) + value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with _lock:
+            for label, value in sorted(self.series.items(), key=lambda item: str(item[0])):
+                labels = f'{{{self.label}="{escape(label)}"}}' if self.label else ''
+                lines.append(f'{self.name}{labels} {value}')
+        return lines
+
+class Gauge:
+    """
+    A value that can go up and down.
+    """
+    def __init__(self, name, help):
+        self.name = name
+        self.help = help
+        self.value = 0
+
+    def set(self, value):
+        with _lock:
+            self.value = value
+
+    def render(self):
+        with _lock:
+            return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} gauge", f'{self.name} {self.value}']
+
+request_latency = Histogram('pokerflow_request_duration_seconds', 'Time taken to handle a request.', 'endpoint', LATENCY_BUCKETS)
+request_statements = Histogram('pokerflow_request_sql_statements', 'SQL statements executed by a request.', 'endpoint', COUNT_BUCKETS)
+request_db_time = Histogram('pokerflow_request_sql_duration_seconds', 'Time a request spent executing SQL statements.', 'endpoint', LATENCY_BUCKETS)
+request_rows = Histogram('pokerflow_request_sql_rows', 'Rows fetched by the queries of a request.', 'endpoint', COUNT_BUCKETS)
+statements_total = Counter('pokerflow_sql_statements_total', 'SQL statements executed, inside or outside of requests.')
+emit_size = Histogram('pokerflow_socket_emit_bytes', 'Size of the JSON payload of an emitted Socket.IO event.', 'event', SIZE_BUCKETS)
+# Labelled by event rather than room, since rooms come and go with games; the counts of each room are in '/admin/rooms'
+room_emits = Counter('pokerflow_socket_room_emits_total', 'Socket.IO events emitted to a room.', 'event')
+room_bytes = Counter('pokerflow_socket_room_emit_bytes_total', 'Bytes of Socket.IO payloads emitted to a room.', 'event')
+broadcast_queue_depth = Gauge('pokerflow_broadcast_queue_depth', 'Game changes waiting to be broadcast.')
+broadcast_lag = Histogram('pokerflow_broadcast_lag_seconds', 'Time from the first change of a broadcast being committed to the broadcast being sent.', 'event', LATENCY_BUCKETS)
+broadcast_changes = Histogram('pokerflow_broadcast_changes', 'Game changes coalesced into one broadcast.', 'event', COUNT_BUCKETS)
+
+METRICS = [
+    request_latency, request_statements, request_db_time, request_rows, statements_total, emit_size, room_emits, room_bytes,
+    broadcast_queue_depth, broadcast_lag, broadcast_changes
+]
+
+def escape(label):
+    return str(label).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def begin(endpoint):
+    """
+    Starts recording the SQL activity of the current thread or task under the given endpoint.
+
+    Parameters:
+    endpoint (str): The name the measurements are recorded under.
+
+    Returns:
+    dict: The measurements of the request, which are filled in as statements run.
+    """
+    request = {
+        'endpoint': endpoint,
+        'start': time.perf_counter(),
+        'statements': 0,
+        'dbTime': 0.0,
+        'rows': 0,
+    }
+    _request.set(request)
+    return request
+
+def current():
+    """
+    Returns the measurements of the request being recorded on the current thread or task, or None.
+    """
+    return _request.get()
+
+def end():
+    """
+    Stops recording the current thread or task's request and adds its measurements to the histograms.
+
+    Returns:
+    dict: The measurements of the request, including its total 'duration' in seconds, or None if no request was being recorded.
+    """
+    request = current()
+    if request is None:
+        return None
+    _request.set(None)
+
+    request['duration'] = time.perf_counter() - request['start']
+    endpoint = request['endpoint']
+    request_latency.observe(endpoint, request['duration'])
+    request_statements.observe(endpoint, request['statements'])
+    request_db_time.observe(endpoint, request['dbTime'])
+    request_rows.observe(endpoint, request['rows'])
+    return request
+
+@contextmanager
+def track(endpoint):
+    """
+    Records the body of the 'with' block as a request, unless a request is already being recorded on this thread or task.
+
+    Parameters:
+    endpoint (str): The name the measurements are recorded under.
+    """
+    if current() is not None:
+        yield
+        return
+    begin(endpoint)
+    try:
+        yield
+    finally:
+        end()
+
+def server_timing(request):
+    """
+    Formats the measurements of a request as a Server-Timing header value, with durations in milliseconds.
+
+    Parameters:
+    request (dict): The measurements returned by 'end()'.
+
+    Returns:
+    str: The header value.
+    """
+    return (
+        f'db;dur={request["dbTime"] * 1000:.2f};desc="{request["statements"]} statements, {request["rows"]} rows", '
+        f'total;dur={request["duration"] * 1000:.2f}'
+    )
+
+def record_emit(event, size):
+    """
+    Records a Socket.IO event emitted to a room.
+
+    Parameters:
+    event (str): The name of the event.
+    size (int): The size of the serialized payload of the event, in bytes.
+    """
+    emit_size.observe(event, size)
+    room_emits.inc(event)
+    room_bytes.inc(event, size)
+
+def record_broadcast(changes, lag):
+    """
+    Records a broadcast of the changes coalesced for a game.
+
+    Parameters:
+    changes (int): The number of changes the broadcast carried.
+    lag (float): The seconds since the first of the changes was queued.
+    """
+    broadcast_changes.observe('game_updated', changes)
+    broadcast_lag.observe('game_updated', lag)
+
+def render():
+    """
+    Renders every metric in the Prometheus text exposition format.
+
+    Returns:
+    str: The metrics, one sample per line.
+    """
+    lines = []
+    for metric in METRICS:
+        lines.extend(metric.render())
+    return '\n'.join(lines) + '\n'
+
+class CountingFetchStrategy(CursorFetchStrategy):
+    """
+    Fetches rows from the DBAPI cursor like SQLAlchemy's default strategy, adding the number fetched to the measurements of a request.
+    """
+    __slots__ = ('request',)
+
+    def __init__(self, request):
+        self.request = request
+
+    def fetchone(self, result, dbapi_cursor, hard_close=False):
+        row = super().fetchone(result, dbapi_cursor, hard_close)
+        if row is not None:
+            self.request['rows'] += 1
+        return row
+
+    def fetchmany(self, result, dbapi_cursor, size=None):
+        rows = super().fetchmany(result, dbapi_cursor, size)
+        self.request['rows'] += len(rows)
+        return rows
+
+    def fetchall(self, result, dbapi_cursor):
+        rows = super().fetchall(result, dbapi_cursor)
+        self.request['rows'] += len(rows)
+        return rows
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('metrics_start', []).append(time.perf_counter())
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info['metrics_start'].pop()
+    statements_total.inc()
+    request = current()
+    if request is not None:
+        request['statements'] += 1
+        request['dbTime'] += elapsed
+        # Rows are counted as the result fetches them from the cursor; streamed results are left alone
+        options = context.execution_options if context is not None else {}
+        if context is not None and type(context.cursor_fetch_strategy) is CursorFetchStrategy and not options.get('stream_results') and not options.get('yield_per'):
+            context.cursor_fetch_strategy = CountingFetchStrategy(request)
+
+def _handle_error(context):
+    if context.connection is not None and context.connection.info.get('metrics_start'):
+        context.connection.info['metrics_start'].pop()
+
+def instrument_engine(engine):
+    """
+    Records the number and duration of the SQL statements executed through an engine, and the number of rows they fetch.
+
+    Parameters:
+    engine (Engine): The engine to instrument.
+    """
+    event.listen(engine, 'before_cursor_execute', _before_cursor_execute)
+    event.listen(engine, 'after_cursor_execute', _after_cursor_execute)
+    event.listen(engine, 'handle_error', _handle_error)
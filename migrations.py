@@ -0,0 +1,215 @@
+"""
+Versioned schema migrations.
+
+Each migration is applied once, in order, in its own database transaction, and its version is recorded
+in the 'schemaversion' table. Migrations only add to the schema, and check for what already exists,
+so they can be run against databases that were created before versioning without dropping any data.
+
+Usage:
+python migrations.py upgrade
+python migrations.py current
+python migrations.py check
+"""
+import argparse
+from datetime import datetime
+import sys
+
+from sqlalchemy import desc, func, inspect, select
+
+import database
+import ledger
+from models import Base, Game, GameEvent, GameMember, GameSettings, GameSnapshot, PlayerGameStats, PlayerStats, SchemaVersion, Transaction
+import stats
+
+class UnsupportedDialectException(Exception):
+    pass
+
+class FullScanException(Exception):
+    pass
+
+def create_tables(connection):
+    Base.metadata.create_all(connection)
+
+def add_game_version(connection):
+    columns = [column['name'] for column in inspect(connection).get_columns(Game.__tablename__)]
+    if 'version' in columns:
+        return
+    column_type = Game.__table__.c.version.type.compile(dialect=connection.dialect)
+    connection.exec_driver_sql(f"ALTER TABLE {Game.__tablename__} ADD version {column_type} NOT NULL DEFAULT 1")
+
+def add_indexes(connection):
+    for table in (Game.__table__, GameSettings.__table__, GameMember.__table__, Transaction.__table__):
+        for index in table.indexes:
+            index.create(connection, checkfirst=True)
+
+def add_player_stats(connection):
+    for table in (PlayerStats.__table__, PlayerGameStats.__table__):
+        table.create(connection, checkfirst=True)
+    stats.rebuild(connection)
+
+def add_ledger(connection):
+    for table in (GameEvent.__table__, GameSnapshot.__table__):
+        table.create(connection, checkfirst=True)
+    ledger.backfill(connection)
+
+MIGRATIONS = [
+    (1, 'Create tables', create_tables),
+    (2, 'Add game version', add_game_version),
+    (3, 'Add indexes for game lists, transactions, members and expiry', add_indexes),
+    (4, 'Add player statistics rollups', add_player_stats),
+    (5, 'Add index for transactions by profile', add_indexes),
+    (6, 'Add game ledger', add_ledger),
+]
+
+def get_current_version(connection):
+    """
+    Retrieves the latest schema version applied to the database.
+
+    Parameters:
+    connection (Connection): The database connection to use for the query.
+
+    Returns:
+    int: The latest applied version, or 0 if no migration has been applied.
+    """
+    SchemaVersion.__table__.create(connection, checkfirst=True)
+    return connection.execute(select(func.coalesce(func.max(SchemaVersion.version), 0))).scalar_one()
+
+def upgrade(engine=None, target=None):
+    """
+    Applies every migration newer than the current schema version, up to the target version.
+
+    Parameters:
+    engine (Engine): The engine to migrate. Defaults to the engine returned by 'database.get_engine()'.
+    target (int): The version to stop at. Defaults to the latest migration.
+
+    Returns:
+    list: The versions that were applied, in order.
+    """
+    engine = engine or database.get_engine()
+    with engine.begin() as connection:
+        current = get_current_version(connection)
+
+    applied = []
+    for version, description, migrate in MIGRATIONS:
+        if version <= current or (target is not None and version > target):
+            continue
+        with engine.begin() as connection:
+            migrate(connection)
+            connection.execute(SchemaVersion.__table__.insert().values(version=version, description=description))
+        applied.append(version)
+    return applied
+
+def get_hot_queries():
+    """
+    Builds the queries that run on every game list, game load, transaction, statistics request, export and history request,
+    with representative parameters, for checking their query plans.
+
+    Returns:
+    dict: A dictionary mapping a name to each query.
+    """
+    return {
+        'gamesByUser': (
+            select(Game.id, Game.version)
+                .join(GameMember, Game.id == GameMember.game_id)
+                .join(GameSettings, Game.settings_id == GameSettings.id)
+                .filter(GameMember.profile_id == 1)
+                .filter(GameSettings.expired == False)
+                .order_by(desc(Game.last_modified), desc(Game.id))
+                .limit(10)
+        ),
+        'recentGames': select(Game.id).order_by(desc(Game.last_modified), desc(Game.id)).limit(10),
+        'gameTransactions': select(Transaction).filter(Transaction.game_id.in_(['game'])).order_by(Transaction.id),
+        'profileTransactions': select(Transaction).filter(Transaction.profile_id == 1).order_by(Transaction.id),
+        'gameMembers': select(GameMember.game_id, GameMember.profile_id).filter(GameMember.game_id.in_(['game'])),
+        'memberGames': select(GameMember.game_id).filter(GameMember.profile_id == 1),
+        'expiredSettings': select(GameSettings.id).filter(GameSettings.expired == True),
+        'biggestWin': select(func.max(PlayerGameStats._net)).filter(PlayerGameStats.profile_id == 1, PlayerGameStats._net > 0),
+        'playerGamesInRange': (
+            select(PlayerGameStats._bought_in, PlayerGameStats._cashed_out)
+                .filter(PlayerGameStats.profile_id == 1)
+                .filter(PlayerGameStats.date >= datetime(2024, 1, 1), PlayerGameStats.date < datetime(2025, 1, 1))
+        ),
+        'ledgerSnapshot': (
+            select(GameSnapshot.state)
+                .filter(GameSnapshot.game_id == 'game', GameSnapshot.version <= 100)
+                .order_by(desc(GameSnapshot.version))
+                .limit(1)
+        ),
+        'ledgerEvents': (
+            select(GameEvent)
+                .filter(GameEvent.game_id == 'game', GameEvent.version > 50, GameEvent.version <= 100)
+                .order_by(GameEvent.version, GameEvent.id)
+        ),
+    }
+
+def get_full_scans(connection, query):
+    """
+    Explains a query and finds the steps of its plan that read a whole table.
+
+    Parameters:
+    connection (Connection): The database connection to explain the query with.
+    query (Select): The query to explain.
+
+    Returns:
+    list: A description of each full scan in the plan. Empty if every table is read through an index.
+
+    Raises:
+    UnsupportedDialectException: If query plans cannot be read for the database in use.
+    """
+    sql = str(query.compile(dialect=connection.dialect, compile_kwargs={'literal_binds': True}))
+
+    if connection.dialect.name == 'sqlite':
+        rows = connection.exec_driver_sql(f"EXPLAIN QUERY PLAN {sql}").all()
+        return [row.detail for row in rows if row.detail.startswith('SCAN ') and ' USING ' not in row.detail]
+
+    if connection.dialect.name == 'mssql':
+        connection.exec_driver_sql("SET SHOWPLAN_ALL ON")
+        try:
+            rows = connection.exec_driver_sql(sql).mappings().all()
+        finally:
+            connection.exec_driver_sql("SET SHOWPLAN_ALL OFF")
+        return [row['StmtText'].strip() for row in rows if row['PhysicalOp'] in ('Table Scan', 'Clustered Index Scan')]
+
+    raise UnsupportedDialectException
+
+def check_query_plans(engine=None):
+    """
+    Checks that none of the hot queries from 'get_hot_queries()' falls back to a full table scan.
+
+    Parameters:
+    engine (Engine): The engine to check. Defaults to the engine returned by 'database.get_engine()'.
+
+    Raises:
+    FullScanException: If any hot query reads a whole table. The message lists each offending query and step.
+    UnsupportedDialectException: If query plans cannot be read for the database in use.
+    """
+    engine = engine or database.get_engine()
+    failures = []
+    with engine.connect() as connection:
+        for name, query in get_hot_queries().items():
+            failures.extend(f"{name}: {scan}" for scan in get_full_scans(connection, query))
+    if failures:
+        raise FullScanException('\n'.join(failures))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('command', choices=['upgrade', 'current', 'check'], nargs='?', default='upgrade')
+    parser.add_argument('--target', type=int, help='The version to upgrade to. Defaults to the latest.')
+    args = parser.parse_args()
+
+    if args.command == 'upgrade':
+        applied = upgrade(target=args.target)
+        print(f"Applied {', '.join(str(version) for version in applied)}" if applied else 'Already up to date')
+    elif args.command == 'current':
+        with database.get_engine().begin() as connection:
+            print(get_current_version(connection))
+    else:
+        try:
+            check_query_plans()
+        except FullScanException as e:
+            print(f"Full table scans found:\n{e}")
+            sys.exit(1)
+        print('No full table scans')
+
+if __name__ == '__main__':
+    main()
@@ -1,7 +1,7 @@
 import enum
 from dataclasses import dataclass
 import uuid
-from sqlalchemy import Column, ForeignKey
+from sqlalchemy import Column, ForeignKey, Index
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.ext.hybrid import hybrid_property
 from sqlalchemy.types import Integer, Text, String, DateTime, Float, Boolean, Enum
@@ -17,6 +17,14 @@ class TransactionTypes(str, enum.Enum):
     CASH_OUT = "CASH_OUT"
     BET = "BET"
 
+class GameEventTypes(str, enum.Enum):
+    CREATE = "CREATE"
+    JOIN = "JOIN"
+    BUY_IN = "BUY_IN"
+    CASH_OUT = "CASH_OUT"
+    SETTINGS = "SETTINGS"
+    PROFILE = "PROFILE"
+
 @dataclass
 class Profile(Base):
 
@@ -32,6 +40,9 @@ class Profile(Base):
 class Game(Base):
 
     __tablename__ = "game"
+    __table_args__ = (
+        Index("ix_game_last_modified", "last_modified", "id"),
+    )
 
     id = Column(String(36), primary_key=True, default=generate_uuid)
     name = Column(String(255), nullable=False)
@@ -41,6 +52,7 @@ class Game(Base):
     admin_id = Column(Integer, ForeignKey("profile.id"), nullable=False)
     _total_pot = Column(Float, nullable=False, default=0)
     _available_cashout = Column(Float, nullable=False, default=0)
+    version = Column(Integer, nullable=False, default=1, server_default='1')
 
     @hybrid_property
     def total_pot(self):
@@ -65,6 +77,9 @@ class Game(Base):
 class GameSettings(Base):
 
     __tablename__ = "gamesettings"
+    __table_args__ = (
+        Index("ix_gamesettings_expired", "expired", "id"),
+    )
 
     id = Column(Integer, primary_key=True, autoincrement='auto', nullable=False)
     _min_buy_in = Column(Float, nullable=False)
@@ -97,6 +112,9 @@ class GameSettings(Base):
 class GameMember(Base):
 
     __tablename__ = "gamemember"
+    __table_args__ = (
+        Index("ix_gamemember_profile_id", "profile_id", "game_id"),
+    )
 
     game_id = Column(String(36), ForeignKey("game.id"), primary_key=True, nullable=False)
     profile_id = Column(Integer, ForeignKey("profile.id"), primary_key=True, nullable=False)
@@ -108,6 +126,10 @@ class GameMember(Base):
 class Transaction(Base):
 
     __tablename__ = "transaction"
+    __table_args__ = (
+        Index("ix_transaction_game_id", "game_id", "id"),
+        Index("ix_transaction_profile_id", "profile_id", "id"),
+    )
 
     id = Column(Integer, primary_key=True, autoincrement='auto', nullable=False)
     game_id = Column(String(36), ForeignKey("game.id"), nullable=False)
@@ -127,3 +149,128 @@ class Transaction(Base):
 
     def __repr__(self):
         return f"<Transaction {self.id}>"
+
+@dataclass
+class SchemaVersion(Base):
+
+    __tablename__ = "schemaversion"
+
+    version = Column(Integer, primary_key=True, autoincrement=False, nullable=False)
+    description = Column(String(255), nullable=False)
+    applied = Column(DateTime, nullable=False, server_default=func.now())
+
+    def __repr__(self):
+        return f"<Schema Version {self.version}>"
+
+@dataclass
+class PlayerStats(Base):
+
+    __tablename__ = "playerstats"
+
+    profile_id = Column(Integer, ForeignKey("profile.id"), primary_key=True, autoincrement=False, nullable=False)
+    games_played = Column(Integer, nullable=False, default=0)
+    _bought_in = Column(Float, nullable=False, default=0)
+    _cashed_out = Column(Float, nullable=False, default=0)
+
+    @hybrid_property
+    def bought_in(self):
+        return self._bought_in
+
+    @bought_in.setter
+    def bought_in(self, value):
+        self._bought_in = round(value, 2)
+
+    @hybrid_property
+    def cashed_out(self):
+        return self._cashed_out
+
+    @cashed_out.setter
+    def cashed_out(self, value):
+        self._cashed_out = round(value, 2)
+
+    def __repr__(self):
+        return f"<Player Stats {self.profile_id}>"
+
+@dataclass
+class PlayerGameStats(Base):
+
+    __tablename__ = "playergamestats"
+    __table_args__ = (
+        Index("ix_playergamestats_profile_net", "profile_id", "_net"),
+        Index("ix_playergamestats_profile_date", "profile_id", "date"),
+    )
+
+    profile_id = Column(Integer, ForeignKey("profile.id"), primary_key=True, autoincrement=False, nullable=False)
+    game_id = Column(String(36), ForeignKey("game.id"), primary_key=True, nullable=False)
+    date = Column(DateTime, nullable=False)
+    _bought_in = Column(Float, nullable=False, default=0)
+    _cashed_out = Column(Float, nullable=False, default=0)
+    _net = Column(Float, nullable=False, default=0)
+
+    @hybrid_property
+    def bought_in(self):
+        return self._bought_in
+
+    @bought_in.setter
+    def bought_in(self, value):
+        self._bought_in = round(value, 2)
+
+    @hybrid_property
+    def cashed_out(self):
+        return self._cashed_out
+
+    @cashed_out.setter
+    def cashed_out(self, value):
+        self._cashed_out = round(value, 2)
+
+    @hybrid_property
+    def net(self):
+        return self._net
+
+    @net.setter
+    def net(self, value):
+        self._net = round(value, 2)
+
+    def __repr__(self):
+        return f"<Player Game Stats {self.profile_id} {self.game_id}>"
+
+@dataclass
+class GameEvent(Base):
+
+    __tablename__ = "gameevent"
+    __table_args__ = (
+        Index("ix_gameevent_game_version", "game_id", "version", "id"),
+    )
+
+    id = Column(Integer, primary_key=True, autoincrement='auto', nullable=False)
+    game_id = Column(String(36), ForeignKey("game.id"), nullable=False)
+    version = Column(Integer, nullable=False)
+    date = Column(DateTime, nullable=False, server_default=func.now())
+    type = Column(Enum(GameEventTypes), nullable=False)
+    profile_id = Column(Integer, ForeignKey("profile.id"), nullable=True)
+    _amount = Column(Float, nullable=True)
+    data = Column(Text, nullable=True)
+
+    @hybrid_property
+    def amount(self):
+        return self._amount
+
+    @amount.setter
+    def amount(self, value):
+        self._amount = round(value, 2) if value is not None else None
+
+    def __repr__(self):
+        return f"<Game Event {self.id}>"
+
+@dataclass
+class GameSnapshot(Base):
+
+    __tablename__ = "gamesnapshot"
+
+    game_id = Column(String(36), ForeignKey("game.id"), primary_key=True, nullable=False)
+    version = Column(Integer, primary_key=True, autoincrement=False, nullable=False)
+    date = Column(DateTime, nullable=False, server_default=func.now())
+    state = Column(Text, nullable=False)
+
+    def __repr__(self):
+        return f"<Game Snapshot {self.game_id} {self.version}>"
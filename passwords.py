@@ -0,0 +1,188 @@
+import asyncio
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, TimeoutError
+import threading
+import time
+
+import bcrypt
+
+import constants
+
+class PasswordHasherBusyException(Exception):
+    pass
+
+class PasswordHasherTimeoutException(Exception):
+    pass
+
+# bcrypt releases the GIL while hashing, so a thread pool keeps request threads free without the cost of extra processes
+_executor = (ProcessPoolExecutor if constants.PASSWORD_HASH_EXECUTOR == 'process' else ThreadPoolExecutor)(
+    max_workers=constants.PASSWORD_HASH_WORKERS
+)
+_slots = threading.BoundedSemaphore(constants.PASSWORD_HASH_WORKERS + constants.PASSWORD_HASH_QUEUE_DEPTH)
+# The work factor that hashes were created with before it became configurable, which is never lowered
+MINIMUM_ROUNDS = 12
+_rounds = max(constants.PASSWORD_HASH_ROUNDS, MINIMUM_ROUNDS)
+
+def _hash(password, rounds):
+    return bcrypt.hashpw(password, bcrypt.gensalt(rounds=rounds))
+
+def _check(password, hash):
+    return bcrypt.checkpw(password, hash)
+
+def _run(func, *args):
+    """
+    Runs a function on the hashing pool and waits for its result.
+
+    Raises:
+    PasswordHasherBusyException: If the pool already has the maximum number of pending jobs.
+    PasswordHasherTimeoutException: If the job does not finish within the configured timeout.
+    """
+    if not _slots.acquire(blocking=False):
+        raise PasswordHasherBusyException
+
+    try:
+        future = _executor.submit(func, *args)
+    except BaseException:
+        _slots.release()
+        raise
+    future.add_done_callback(lambda _: _slots.release())
+
+    try:
+        return future.result(timeout=constants.PASSWORD_HASH_TIMEOUT)
+    except TimeoutError:
+        future.cancel()
+        raise PasswordHasherTimeoutException
+
+async def _run_async(func, *args):
+    """
+    Runs a function on the hashing pool and waits for its result without blocking the event loop.
+
+    Raises:
+    PasswordHasherBusyException: If the pool already has the maximum number of pending jobs.
+    PasswordHasherTimeoutException: If the job does not finish within the configured timeout.
+    """
+    if not _slots.acquire(blocking=False):
+        raise PasswordHasherBusyException
+
+    try:
+        future = _executor.submit(func, *args)
+    except BaseException:
+        _slots.release()
+        raise
+    future.add_done_callback(lambda _: _slots.release())
+
+    try:
+        return await asyncio.wait_for(asyncio.wrap_future(future), constants.PASSWORD_HASH_TIMEOUT)
+    except asyncio.TimeoutError:
+        raise PasswordHasherTimeoutException
+
+def get_rounds():
+    """
+    Returns the bcrypt work factor used for new hashes.
+
+    Returns:
+    int: The work factor.
+    """
+    return _rounds
+
+def hash_password(password):
+    """
+    Hashes a password on the hashing pool, using the current work factor.
+
+    Parameters:
+    password (str): The password to hash.
+
+    Returns:
+    str: The bcrypt hash of the password.
+
+    Raises:
+    PasswordHasherBusyException: If too many passwords are already waiting to be hashed.
+    PasswordHasherTimeoutException: If hashing takes longer than the configured timeout.
+    """
+    return _run(_hash, password.encode('utf-8'), _rounds).decode('utf-8')
+
+def verify_password(password, hash):
+    """
+    Verifies a password against a bcrypt hash on the hashing pool.
+
+    Parameters:
+    password (str): The password to verify.
+    hash (str): The stored bcrypt hash.
+
+    Returns:
+    bool: True if the password matches the hash.
+
+    Raises:
+    PasswordHasherBusyException: If too many passwords are already waiting to be verified.
+    PasswordHasherTimeoutException: If verification takes longer than the configured timeout.
+    """
+    if isinstance(hash, str):
+        hash = hash.encode('utf-8')
+    return _run(_check, password.encode('utf-8'), hash)
+
+async def hash_password_async(password):
+    """
+    Asyncio variant of 'hash_password()', which waits for the hashing pool without blocking the event loop.
+    """
+    return (await _run_async(_hash, password.encode('utf-8'), _rounds)).decode('utf-8')
+
+async def verify_password_async(password, hash):
+    """
+    Asyncio variant of 'verify_password()', which waits for the hashing pool without blocking the event loop.
+    """
+    if isinstance(hash, str):
+        hash = hash.encode('utf-8')
+    return await _run_async(_check, password.encode('utf-8'), hash)
+
+def needs_rehash(hash):
+    """
+    Checks whether a bcrypt hash was created with a lower work factor than the current one.
+    Hashes with a higher work factor are kept, so a worker configured differently never weakens them.
+
+    Parameters:
+    hash (str): The stored bcrypt hash, formatted as '$2b$<rounds>$<salt and digest>'.
+
+    Returns:
+    bool: True if the password should be hashed again with the current work factor.
+    """
+    if isinstance(hash, bytes):
+        hash = hash.decode('utf-8')
+    try:
+        return int(hash.split('$')[2]) < _rounds
+    except (IndexError, ValueError):
+        return True
+
+def calibrate(target=None, maximum=16, samples=3):
+    """
+    Suggests a work factor for 'password_hash_rounds' by timing bcrypt on this machine.
+    The highest work factor whose hashing time stays within the target is suggested, and never less than 'MINIMUM_ROUNDS'.
+    The result is meant to be configured once for every worker of a deployment, rather than measured by each worker.
+
+    Parameters:
+    target (float): The longest acceptable hashing time in seconds. Defaults to the configured target.
+    maximum (int): The highest work factor to suggest.
+    samples (int): The number of hashes timed. The fastest is used, so a busy machine does not skew the result.
+
+    Returns:
+    int: The suggested work factor.
+    """
+    target = target or constants.PASSWORD_HASH_TARGET
+    elapsed = float('inf')
+    for _ in range(samples):
+        start = time.perf_counter()
+        _hash(b'calibration', MINIMUM_ROUNDS)
+        elapsed = min(elapsed, time.perf_counter() - start)
+
+    # Every extra round doubles the hashing time
+    rounds = MINIMUM_ROUNDS
+    while rounds < maximum and elapsed * 2 <= target:
+        rounds += 1
+        elapsed *= 2
+    return rounds
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Suggests a bcrypt work factor for 'password_hash_rounds' on this machine.")
+    parser.add_argument('--target', type=float, default=None, help='Longest acceptable hashing time in seconds.')
+    args = parser.parse_args()
+    print(calibrate(args.target))
@@ -0,0 +1,215 @@
+import hashlib
+import json
+import logging
+from logging.handlers import RotatingFileHandler
+import re
+import threading
+import time
+
+from sqlalchemy import event
+
+import constants
+import metrics
+
+_lock = threading.Lock()
+_fingerprints = {}
+_repeats = {}
+_logger = None
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r"(?<![\w.])-?\d+(?:\.\d+)?\b")
+_PLACEHOLDER = re.compile(r"\?|%\(\w+\)s|%s|:\w+")
+_IN_LIST = re.compile(r"\bIN\s*\(\s*\?(?:\s*,\s*\?)*\s*\)", re.IGNORECASE)
+_VALUES = re.compile(r"(\bVALUES\s*\([^()]*\))(?:\s*,\s*\([^()]*\))+", re.IGNORECASE)
+_WHITESPACE = re.compile(r"\s+")
+
+def normalize(statement):
+    """
+    Reduces an SQL statement to its shape, so statements that only differ in their values are grouped together.
+    Literals and bind placeholders become '?', IN lists of any length become 'IN (?+)',
+    multi-row VALUES lists keep only their first row, and whitespace is collapsed.
+
+    Parameters:
+    statement (str): The SQL statement.
+
+    Returns:
+    str: The normalized statement.
+    """
+    statement = _STRING.sub('?', statement)
+    statement = _NUMBER.sub('?', statement)
+    statement = _PLACEHOLDER.sub('?', statement)
+    statement = _IN_LIST.sub('IN (?+)', statement)
+    statement = _VALUES.sub(r'\1, ...', statement)
+    return _WHITESPACE.sub(' ', statement).strip()
+
+def fingerprint(statement):
+    """
+    Identifies the shape of an SQL statement.
+
+    Parameters:
+    statement (str): The SQL statement.
+
+    Returns:
+    tuple: A short hexadecimal fingerprint and the normalized statement it was computed from.
+    """
+    normalized = normalize(statement)
+    return hashlib.sha1(normalized.encode('utf-8')).hexdigest()[:16], normalized
+
+def parameter_shape(parameters, executemany=False):
+    """
+    Describes the bind parameters of a statement by their types, without their values.
+
+    Parameters:
+    parameters: The parameters passed to the database driver.
+    executemany (bool): Whether the parameters are a sequence of parameter sets.
+
+    Returns:
+    str: A description such as '(str, int)' or '500 x (str, float)'.
+    """
+    if executemany:
+        parameters = list(parameters)
+        return f"{len(parameters)} x {parameter_shape(parameters[0]) if parameters else '()'}"
+    if isinstance(parameters, dict):
+        return '{' + ', '.join(f'{key}: {type(value).__name__}' for key, value in parameters.items()) + '}'
+    return '(' + ', '.join(type(value).__name__ for value in parameters or ()) + ')'
+
+def get_logger():
+    """
+    Returns the logger that writes slow and repeated statements to the rotating query log file, creating it on first use.
+    """
+    global _logger
+    with _lock:
+        if _logger is None:
+            logger = logging.getLogger('pokerflow.queries')
+            logger.setLevel(logging.INFO)
+            logger.propagate = False
+            handler = RotatingFileHandler(
+                constants.QUERY_LOG_FILE,
+                maxBytes=constants.QUERY_LOG_MAX_BYTES,
+                backupCount=constants.QUERY_LOG_BACKUPS
+            )
+            handler.setFormatter(logging.Formatter('%(asctime)s %(message)s'))
+            logger.addHandler(handler)
+            _logger = logger
+    return _logger
+
+def record(statement, parameters, executemany, elapsed):
+    """
+    Records an executed statement. It is logged if it took longer than the slow query threshold,
+    and the current request is flagged if it ran the same statement shape more times than the repeated query limit.
+
+    Parameters:
+    statement (str): The SQL statement.
+    parameters: The parameters passed to the database driver.
+    executemany (bool): Whether the parameters are a sequence of parameter sets.
+    elapsed (float): The time the statement took, in seconds.
+    """
+    id, normalized = fingerprint(statement)
+    request = metrics.current()
+    endpoint = request['endpoint'] if request else None
+    slow = elapsed >= constants.SLOW_QUERY_THRESHOLD
+
+    with _lock:
+        entry = _fingerprints.get(id)
+        if entry is None:
+            entry = _fingerprints[id] = {
+                'fingerprint': id,
+                'statement': normalized,
+                'count': 0,
+                'totalTime': 0.0,
+                'maxTime': 0.0,
+                'slowCount': 0,
+            }
+        entry['count'] += 1
+        entry['totalTime'] += elapsed
+        entry['maxTime'] = max(entry['maxTime'], elapsed)
+        if slow:
+            entry['slowCount'] += 1
+
+        repeated = None
+        if request is not None:
+            counts = request.setdefault('fingerprints', {})
+            counts[id] = counts.get(id, 0) + 1
+            # Flags the request once, when the limit is first exceeded
+            if counts[id] == constants.REPEATED_QUERY_LIMIT + 1:
+                key = (endpoint, id)
+                repeated = _repeats.get(key)
+                if repeated is None:
+                    repeated = _repeats[key] = {
+                        'endpoint': endpoint,
+                        'fingerprint': id,
+                        'statement': normalized,
+                        'requests': 0,
+                    }
+                repeated['requests'] += 1
+
+    if slow:
+        get_logger().info(json.dumps({
+            'kind': 'slow',
+            'fingerprint': id,
+            'endpoint': endpoint,
+            'duration': round(elapsed, 6),
+            'parameters': parameter_shape(parameters, executemany),
+            'statement': normalized,
+        }))
+    if repeated is not None:
+        get_logger().info(json.dumps({
+            'kind': 'repeated',
+            'fingerprint': id,
+            'endpoint': endpoint,
+            'limit': constants.REPEATED_QUERY_LIMIT,
+            'parameters': parameter_shape(parameters, executemany),
+            'statement': normalized,
+        }))
+
+def report(limit=10):
+    """
+    Reports the statement shapes that used the most database time, the slowest ones,
+    and the endpoints that repeated a statement shape more times than allowed within one request.
+
+    Parameters:
+    limit (int): The number of entries in each list.
+
+    Returns:
+    dict: A dictionary containing the 'mostTime', 'slowest' and 'repeated' lists, and the settings in use.
+    """
+    with _lock:
+        entries = [dict(entry, averageTime=entry['totalTime'] / entry['count']) for entry in _fingerprints.values()]
+        repeats = [dict(repeat) for repeat in _repeats.values()]
+
+    return {
+        'slowQueryThreshold': constants.SLOW_QUERY_THRESHOLD,
+        'repeatedQueryLimit': constants.REPEATED_QUERY_LIMIT,
+        'mostTime': sorted(entries, key=lambda entry: entry['totalTime'], reverse=True)[:limit],
+        'slowest': sorted(entries, key=lambda entry: entry['maxTime'], reverse=True)[:limit],
+        'repeated': sorted(repeats, key=lambda repeat: repeat['requests'], reverse=True)[:limit],
+    }
+
+def reset():
+    """
+    Clears the in-memory report.
+    """
+    with _lock:
+        _fingerprints.clear()
+        _repeats.clear()
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_log_start', []).append(time.perf_counter())
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    record(statement, parameters, executemany, time.perf_counter() - conn.info['query_log_start'].pop())
+
+def _handle_error(context):
+    if context.connection is not None and context.connection.info.get('query_log_start'):
+        context.connection.info['query_log_start'].pop()
+
+def instrument_engine(engine):
+    """
+    Fingerprints every SQL statement executed through an engine, for the slow query log and the repeated query report.
+
+    Parameters:
+    engine (Engine): The engine to instrument.
+    """
+    event.listen(engine, 'before_cursor_execute', _before_cursor_execute)
+    event.listen(engine, 'after_cursor_execute', _after_cursor_execute)
+    event.listen(engine, 'handle_error', _handle_error)
@@ -0,0 +1,216 @@
+import threading
+import time
+import uuid
+
+def full_document_room(game_id):
+    """
+    Names the room whose subscribers opted in to receiving the full game document on every update.
+
+    Parameters:
+    game_id (str): The ID of the game.
+
+    Returns:
+    str: The name of the room.
+    """
+    return f"{game_id}:full"
+
+class RoomTracker:
+    """
+    Counts the subscribers of every Socket.IO room, on this worker and on the other workers sharing the message queue.
+
+    Subscribers on this worker are tracked by session ID as they join and leave rooms and disconnect.
+    Every change produces an update for the other workers, which the caller publishes as a cluster message,
+    and the whole of this worker's counts are published every 'room_sync_interval' seconds.
+    The counts of a worker that has not been heard from for three intervals are dropped, so a worker that dies is forgotten.
+    A worker that has not yet heard a full round of counts assumes every room is watched.
+    The events this worker emits to each room are counted as well, for as long as the room has subscribers.
+
+    Parameters:
+    sync_interval (float): The seconds between publications of this worker's counts, or None when there are no other workers.
+    """
+    def __init__(self, sync_interval=None):
+        self.worker_id = uuid.uuid4().hex
+        self.sync_interval = sync_interval
+        self.started = time.monotonic()
+        self.local = {}
+        self.remote = {}
+        self.emitted = {}
+        self.lock = threading.Lock()
+
+    def join(self, sid, rooms):
+        """
+        Records a client joining rooms.
+
+        Parameters:
+        sid (str): The session ID of the client.
+        rooms (list): The names of the rooms.
+
+        Returns:
+        dict: The update to publish to the other workers.
+        """
+        with self.lock:
+            for room in rooms:
+                self.local.setdefault(room, set()).add(sid)
+            return self._update(rooms)
+
+    def leave(self, sid, rooms):
+        """
+        Records a client leaving rooms.
+
+        Parameters:
+        sid (str): The session ID of the client.
+        rooms (list): The names of the rooms.
+
+        Returns:
+        dict: The update to publish to the other workers.
+        """
+        with self.lock:
+            for room in rooms:
+                self._discard(sid, room)
+            return self._update(rooms)
+
+    def disconnect(self, sid):
+        """
+        Records a client disconnecting, which leaves every room it was in.
+
+        Parameters:
+        sid (str): The session ID of the client.
+
+        Returns:
+        dict: The update to publish to the other workers, or None if the client was in no room.
+        """
+        with self.lock:
+            rooms = [room for room, sids in self.local.items() if sid in sids]
+            for room in rooms:
+                self._discard(sid, room)
+            return self._update(rooms) if rooms else None
+
+    def snapshot(self):
+        """
+        Creates the update carrying every count of this worker, published periodically.
+
+        Returns:
+        dict: The update to publish to the other workers.
+        """
+        with self.lock:
+            return dict(self._update(list(self.local)), full=True)
+
+    def apply(self, update):
+        """
+        Records the counts published by another worker. Updates published by this worker are ignored.
+
+        Parameters:
+        update (dict): The update, as returned by 'join()', 'leave()', 'disconnect()' or 'snapshot()'.
+        """
+        if update['worker'] == self.worker_id:
+            return
+        with self.lock:
+            # Workers that stopped publishing are forgotten
+            if self.sync_interval is not None:
+                deadline = time.monotonic() - 3 * self.sync_interval
+                self.remote = {id: worker for id, worker in self.remote.items() if worker['seen'] >= deadline}
+            worker = self.remote.get(update['worker'])
+            if worker is None or update.get('full'):
+                worker = self.remote[update['worker']] = {'rooms': {}}
+            worker['seen'] = time.monotonic()
+            for room, count in update['rooms'].items():
+                if count:
+                    worker['rooms'][room] = count
+                else:
+                    worker['rooms'].pop(room, None)
+                    self._forget(room)
+
+    def record_emit(self, room, size):
+        """
+        Counts an event this worker emitted to a room. Events emitted to rooms without subscribers are not counted.
+
+        Parameters:
+        room (str): The name of the room.
+        size (int): The size of the serialized payload of the event, in bytes.
+        """
+        with self.lock:
+            if not self._watched(room):
+                return
+            emitted = self.emitted.setdefault(room, {'emits': 0, 'bytes': 0})
+            emitted['emits'] += 1
+            emitted['bytes'] += size
+
+    def count(self, room):
+        """
+        Counts the subscribers of a room across every worker.
+
+        Parameters:
+        room (str): The name of the room.
+
+        Returns:
+        int: The number of subscribers.
+        """
+        with self.lock:
+            return self._count(room)
+
+    def is_watched(self, room):
+        """
+        Reports whether a room may have subscribers, so broadcasts to rooms nobody watches can be skipped.
+
+        Parameters:
+        room (str): The name of the room.
+
+        Returns:
+        bool: False if the room has no subscribers on any worker.
+        """
+        if self.sync_interval is not None and time.monotonic() - self.started < self.sync_interval:
+            return True
+        return self.count(room) > 0
+
+    def report(self):
+        """
+        Describes the rooms that have subscribers.
+
+        Returns:
+        dict: The number of live 'workers', including this one, and the 'rooms', each with its name, its subscribers
+        on this worker and across every worker, and the events and bytes this worker emitted to it, most watched first.
+        """
+        with self.lock:
+            workers = self._live_workers()
+            rooms = {room: {'room': room, 'local': len(sids), 'subscribers': len(sids)} for room, sids in self.local.items()}
+            for worker in workers:
+                for room, count in worker['rooms'].items():
+                    rooms.setdefault(room, {'room': room, 'local': 0, 'subscribers': 0})['subscribers'] += count
+            # Rooms whose subscribers are gone, including those of workers that stopped publishing, are forgotten
+            self.emitted = {room: emitted for room, emitted in self.emitted.items() if room in rooms}
+            for room, emitted in self.emitted.items():
+                rooms[room].update(emitted)
+            for room in rooms.values():
+                room.setdefault('emits', 0)
+                room.setdefault('bytes', 0)
+        return {
+            'workers': len(workers) + 1,
+            'rooms': sorted(rooms.values(), key=lambda room: (-room['subscribers'], room['room'])),
+        }
+
+    def _discard(self, sid, room):
+        sids = self.local.get(room)
+        if sids is not None:
+            sids.discard(sid)
+            if not sids:
+                del self.local[room]
+                self._forget(room)
+
+    def _forget(self, room):
+        if not self._watched(room):
+            self.emitted.pop(room, None)
+
+    def _count(self, room):
+        return len(self.local.get(room, ())) + sum(worker['rooms'].get(room, 0) for worker in self._live_workers())
+
+    def _watched(self, room):
+        return self._count(room) > 0
+
+    def _update(self, rooms):
+        return {'worker': self.worker_id, 'rooms': {room: len(self.local.get(room, ())) for room in rooms}}
+
+    def _live_workers(self):
+        if self.sync_interval is None:
+            return []
+        deadline = time.monotonic() - 3 * self.sync_interval
+        return [worker for worker in self.remote.values() if worker['seen'] >= deadline]
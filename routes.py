@@ -0,0 +1,870 @@
+"""
+The HTTP routes of the API, served by both entry points: 'app.py' on Flask and 'async_app.py' on Quart.
+
+Every route is added to 'ROUTES' by the 'route()' decorator, and its handler is written once, as a coroutine function
+taking the entry point's 'Api' first, then a database session if the route uses one, then its URL parameters.
+Handlers reach the framework, the service functions and the Socket.IO server only through the 'Api',
+so request parsing, validation and the mapping of exceptions to error responses exist in one place.
+On Flask, where nothing a handler awaits ever suspends, handlers are run to completion by 'run()' without an event loop.
+"""
+import sys
+
+import auth
+from constants import TRANSACTIONS_PAGE_SIZE
+import export
+from export import InvalidExportFormatException
+import game
+from game import GameNotFoundException, GameUpdateConflictException, InvalidCursorException, InvalidFieldsException, InvalidPageSizeException, InvalidPasswordException as InvalidGamePasswordException, InvalidTransactionException
+import ledger
+from ledger import LedgerHistoryUnavailableException
+import metrics
+from passwords import PasswordHasherBusyException, PasswordHasherTimeoutException
+import query_log
+import stats
+from stats import InvalidDateException
+import timeseries
+import user
+from user import EmailAlreadyExistsException, EmailNotFoundException, InvalidPasswordException as InvalidUserPasswordException, UserNotFoundException
+
+ROUTES = []
+
+class Api:
+    """
+    The operations of an entry point that route handlers use, implemented once for Flask and once for Quart.
+
+    Attributes:
+    request: The framework's request object, for the query string and the conditional request headers.
+    Response (type): The framework's response class.
+    room_tracker (RoomTracker): The subscriber counts of the Socket.IO rooms of this worker.
+    """
+    request = None
+    Response = None
+    room_tracker = None
+
+    def view(self, handler, uses_session):
+        """
+        Builds the view function registered for a handler.
+
+        Parameters:
+        handler (callable): The route handler.
+        uses_session (bool): Whether to open a database session for the handler with 'session()'.
+
+        Returns:
+        callable: A coroutine function taking the URL parameters of the route.
+        """
+        async def view(**kwargs):
+            if not uses_session:
+                return await handler(self, **kwargs)
+            async with self.session() as session:
+                return await handler(self, session, **kwargs)
+        view.__name__ = handler.__name__
+        return view
+
+    def session(self):
+        """
+        Opens a database session for a request, rolled back on database errors and closed at the end.
+
+        Returns:
+        An asynchronous context manager yielding the session.
+        """
+        raise NotImplementedError
+
+    def variant(self, func):
+        """
+        Selects the form of a service function the session of this entry point takes.
+
+        Parameters:
+        func (callable): The synchronous service function.
+
+        Returns:
+        callable: The function itself on Flask, or its '_async' variant on Quart.
+        """
+        raise NotImplementedError
+
+    async def call(self, func, *args, **kwargs):
+        """
+        Calls a service function, or its '_async' variant on Quart, and awaits the result if needed.
+
+        Parameters:
+        func (callable): The synchronous service function.
+        *args, **kwargs: Its arguments, including the session.
+
+        Returns:
+        The result of the function.
+        """
+        raise NotImplementedError
+
+    async def get_json(self):
+        """
+        Returns the parsed JSON body of the request.
+        """
+        raise NotImplementedError
+
+    def jsonify(self, data):
+        """
+        Builds a JSON response.
+
+        Parameters:
+        data: The JSON-serializable data.
+
+        Returns:
+        Response: The response.
+        """
+        raise NotImplementedError
+
+    def get_pool_stats(self):
+        """
+        Reports the state of the database connection pool used by this entry point.
+        """
+        raise NotImplementedError
+
+    async def publish_cluster_message(self, kind, payload):
+        """
+        Publishes a message to every worker sharing the Socket.IO message queue. Does nothing when there is no message queue.
+
+        Parameters:
+        kind (str): The kind of message.
+        payload: A JSON-serializable payload.
+        """
+        raise NotImplementedError
+
+    async def broadcast_game_updates(self, session):
+        """
+        Broadcasts the changes committed on a session to the subscribers of each affected game.
+
+        Parameters:
+        session: The database session the changes were committed with.
+        """
+        raise NotImplementedError
+
+def route(rule, methods=('GET',), session=False):
+    """
+    Adds a handler to 'ROUTES'.
+
+    Parameters:
+    rule (str): The URL rule of the route.
+    methods (tuple): The HTTP methods the route accepts.
+    session (bool): Whether the handler takes a database session after the Api.
+
+    Returns:
+    callable: The decorator, which returns the handler unchanged.
+    """
+    def decorator(handler):
+        ROUTES.append((rule, methods, handler, session))
+        return handler
+    return decorator
+
+def register(app, api):
+    """
+    Adds every route in 'ROUTES' to an application.
+
+    Parameters:
+    app: The Flask or Quart application.
+    api (Api): The operations of the entry point the application belongs to.
+    """
+    for rule, methods, handler, session in ROUTES:
+        app.add_url_rule(rule, handler.__name__, api.view(handler, session), methods=list(methods))
+
+def run(coroutine):
+    """
+    Runs a coroutine that never suspends to completion, without an event loop.
+
+    Parameters:
+    coroutine: The coroutine, for example of a route handler on Flask.
+
+    Returns:
+    The value the coroutine returned.
+
+    Raises:
+    RuntimeError: If the coroutine suspends, which needs an event loop.
+    """
+    try:
+        coroutine.send(None)
+    except StopIteration as stop:
+        return stop.value
+    coroutine.close()
+    raise RuntimeError("The coroutine suspended outside of an event loop")
+
+def find_async_variant(func):
+    """
+    Finds the asyncio variant of a service function, defined next to it with the same name followed by '_async'.
+
+    Parameters:
+    func (callable): The synchronous service function.
+
+    Returns:
+    callable: The variant.
+    """
+    return getattr(sys.modules[func.__module__], func.__name__ + '_async')
+
+def is_json_resource(response):
+    """
+    Tells whether a response stands for a JSON resource: a JSON response, or a 304 response from 'conditional_response()'.
+
+    Parameters:
+    response (Response): A Flask or Quart response.
+
+    Returns:
+    bool: True if the response stands for a JSON resource.
+    """
+    return response.mimetype == 'application/json' or getattr(response, 'json_resource', False)
+
+async def conditional_response(api, etag, build):
+    """
+    Answers a conditional GET request. If the client's If-None-Match header already matches the given entity tag,
+    an empty 304 response is returned without calling 'build'. Otherwise 'build' is awaited and its result is returned as JSON.
+    The 304 response has no body and no Content-Type; it is flagged as a JSON resource instead (see 'is_json_resource()'),
+    so the entry point's 'compress_response()' gives it the headers of the 200 response.
+
+    Parameters:
+    api (Api): The operations of the entry point.
+    etag (str): The current entity tag of the requested resource.
+    build (callable): A coroutine function returning the data of the resource.
+
+    Returns:
+    Response: The 304 or 200 response, carrying the entity tag.
+    """
+    if api.request.if_none_match.contains_weak(etag):
+        response = api.Response('', status=304)
+        response.json_resource = True
+    else:
+        response = api.jsonify(await build())
+    response.set_etag(etag)
+    return response
+
+@route('/', methods=('GET', 'POST'))
+async def health_check(api):
+    """
+    Endpoint for health check of the application.
+
+    Responds with a 200 status code to indicate that the application is running properly.
+
+    Methods:
+    GET, POST
+    """
+    return '', 200
+
+@route('/admin/database/pool')
+async def get_database_pool_stats(api):
+    """
+    Reports statistics about the database connection pool shared by this worker.
+
+    Methods:
+    GET
+
+    Returns:
+    JSON response with the pool size, checked out connections, overflow, and checkout wait times.
+    """
+    return api.jsonify(api.get_pool_stats())
+
+@route('/metrics')
+async def get_metrics(api):
+    """
+    Reports request latency, SQL statements, SQL time and rows fetched per endpoint as histograms,
+    along with Socket.IO emit counts and payload sizes per event, for this worker.
+
+    Methods:
+    GET
+
+    Returns:
+    Text response in the Prometheus exposition format.
+    """
+    return api.Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+@route('/admin/queries')
+async def get_query_report(api):
+    """
+    Reports the SQL statement shapes that used the most database time, the slowest ones,
+    and the endpoints that ran the same statement shape too many times in one request, for this worker.
+    Statements are only recorded when query diagnostics are enabled.
+
+    Methods:
+    GET
+
+    URL Parameters:
+    limit (int): Query parameter for the number of entries in each list. Defaults to 10.
+
+    Returns:
+    JSON response with the 'mostTime', 'slowest' and 'repeated' lists.
+    """
+    return api.jsonify(query_log.report(api.request.args.get('limit', default=10, type=int)))
+
+@route('/admin/cache')
+async def get_cache_stats(api):
+    """
+    Reports the hit, miss and eviction counters of the in-memory caches of this worker.
+
+    Methods:
+    GET
+
+    Returns:
+    JSON response with the counters of each cache.
+    """
+    return api.jsonify({
+        'game': game.game_cache.stats(),
+        'profile': user.profile_cache.stats(),
+        'timeseries': timeseries.timeseries_cache.stats(),
+    })
+
+@route('/admin/rooms')
+async def get_room_stats(api):
+    """
+    Reports the Socket.IO rooms that have subscribers, with their subscriber counts on this worker and across every worker,
+    and the events and bytes this worker emitted to each.
+
+    Methods:
+    GET
+
+    Returns:
+    JSON response with the number of 'workers' and the 'rooms', most watched first.
+    """
+    return api.jsonify(api.room_tracker.report())
+
+@route('/admin/games/<string:id>/audit', session=True)
+async def audit_game(api, session, id):
+    """
+    Checks the stored totals, members, contributions and settings of a game against the state rebuilt from its ledger.
+
+    Methods:
+    GET
+
+    URL Parameters:
+    id (str): The unique identifier of the game.
+
+    Returns:
+    JSON response with the game ID, whether it is 'consistent', and the 'differences' found.
+    """
+    try:
+        await api.call(game.get_version, session, id)
+        differences = await api.call(ledger.audit, session, id)
+    except GameNotFoundException:
+        return "GameNotFound: No game found with the specified ID", 404
+    except LedgerHistoryUnavailableException:
+        return "HistoryUnavailable: The game has no ledger", 404
+    return api.jsonify({'gameID': id, 'consistent': not differences, 'differences': differences})
+
+@route('/game/active/user/<string:id>', session=True)
+async def get_active_games_by_user_id(api, session, id):
+    """
+    Retrieves active games where the specified user is a member. Supports pagination.
+
+    Methods:
+    GET
+
+    URL Parameters:
+    id (str): The user ID for which active games are being queried.
+    cursor (str): Query parameter for cursor pagination. Empty for the first page, then the 'nextCursor' of the previous page.
+    itemOffset (int): Query parameter for pagination offset, used when no cursor is given.
+    itemsPerPage (int): Query parameter for number of items per page.
+    fields (str): Optional query parameter, a comma-separated list of the game fields to return, for example 'name,availableCashout,settings'.
+
+    Headers:
+    If-None-Match: An entity tag from a previous response. If the games are unchanged, an empty 304 response is returned.
+
+    Returns:
+    JSON response containing a list of active games associated with the user, with an ETag header.
+    With cursor pagination, the list is returned as 'games' alongside the 'nextCursor' of the following page.
+    """
+    return await games_by_user_id_response(api, session, id, expired=False)
+
+@route('/game/expired/user/<string:id>', session=True)
+async def get_expired_games_by_user_id(api, session, id):
+    """
+    Retrieves expired games where the specified user is a member. Supports pagination.
+
+    Methods:
+    GET
+
+    URL Parameters:
+    id (str): The user ID for which active games are being queried.
+    cursor (str): Query parameter for cursor pagination. Empty for the first page, then the 'nextCursor' of the previous page.
+    itemOffset (int): Query parameter for pagination offset, used when no cursor is given.
+    itemsPerPage (int): Query parameter for number of items per page.
+    fields (str): Optional query parameter, a comma-separated list of the game fields to return, for example 'name,availableCashout,settings'.
+
+    Headers:
+    If-None-Match: An entity tag from a previous response. If the games are unchanged, an empty 304 response is returned.
+
+    Returns:
+    JSON response containing a list of expired games associated with the user, with an ETag header.
+    With cursor pagination, the list is returned as 'games' alongside the 'nextCursor' of the following page.
+    """
+    return await games_by_user_id_response(api, session, id, expired=True)
+
+async def games_by_user_id_response(api, session, id, expired):
+    """
+    Builds the response for a page of the active or expired games of a user,
+    using cursor pagination if a 'cursor' query parameter is present and offset pagination otherwise.
+
+    Parameters:
+    api (Api): The operations of the entry point.
+    session: The database session to use for queries.
+    id (str): The user ID for which games are being queried.
+    expired (bool): A flag to select expired or active games.
+
+    Returns:
+    Response: The conditional JSON response, or an error message with its status code.
+    """
+    per_page = api.request.args.get('itemsPerPage', type=int)
+    cursor = api.request.args.get('cursor')
+    try:
+        fields = game.parse_fields(api.request.args.get('fields'))
+        if cursor is not None:
+            versions, next_cursor = await api.call(game.get_page_by_user_id, session, id, cursor or None, per_page, expired)
+
+            async def build_page():
+                return {'games': await api.call(game.get_cached_games_data, versions, session, fields), 'nextCursor': next_cursor}
+
+            return await conditional_response(api, game.get_etag(versions), build_page)
+
+        versions = await api.call(
+            game.get_versions_by_user_id,
+            session,
+            id,
+            itemOffset=api.request.args.get('itemOffset', type=int),
+            per_page=per_page,
+            expired=expired
+        )
+        return await conditional_response(api, game.get_etag(versions), lambda: api.call(game.get_cached_games_data, versions, session, fields))
+    except GameNotFoundException:
+        return "GameNotFound: No games found relating to the specified user ID", 404
+    except InvalidCursorException:
+        return "InvalidCursor: The supplied cursor is not valid", 400
+    except InvalidFieldsException:
+        return "InvalidFields: The supplied fields are not valid", 400
+
+@route('/game/<string:id>', session=True)
+async def get_game_by_id(api, session, id):
+    """
+    Retrieves comprehensive information about a game, identified by its unique ID.
+
+    Methods:
+    GET
+
+    URL Parameters:
+    id (str): The unique identifier of the game to retrieve.
+    fields (str): Optional query parameter, a comma-separated list of the fields to return. Only the queries they need are run.
+
+    Headers:
+    If-None-Match: An entity tag from a previous response. If the game is unchanged, an empty 304 response is returned.
+
+    Returns:
+    JSON response with game data if found, with an ETag header.
+    """
+    try:
+        fields = game.parse_fields(api.request.args.get('fields'))
+        version = await api.call(game.get_version, session, id)
+        return await conditional_response(api, game.get_etag([(id, version)]), lambda: api.call(game.get_by_id, session, id, fields))
+    except GameNotFoundException:
+        return "GameNotFound: No game found with the specified ID", 404
+    except InvalidFieldsException:
+        return "InvalidFields: The supplied fields are not valid", 400
+
+@route('/game/<string:id>/transactions', session=True)
+async def get_game_transactions(api, session, id):
+    """
+    Retrieves the transactions of a game, oldest first, one page at a time.
+
+    Methods:
+    GET
+
+    URL Parameters:
+    id (str): The unique identifier of the game.
+    cursor (str): Query parameter for cursor pagination. Empty or absent for the first page, then the 'nextCursor' of the previous page.
+    itemsPerPage (int): Query parameter for number of transactions per page. Defaults to 'transactions_page_size', and is capped at 'transactions_max_page_size'.
+
+    Headers:
+    If-None-Match: An entity tag from a previous response. If the game is unchanged, an empty 304 response is returned.
+
+    Returns:
+    JSON response with the page as 'transactions', alongside the 'nextCursor' of the following page, with an ETag header.
+    """
+    args = api.request.args
+    cursor = args.get('cursor')
+    try:
+        # A value that is not an integer is read as None, which is rejected like a value below 1
+        per_page = game.parse_page_size(args.get('itemsPerPage', type=int) if 'itemsPerPage' in args else TRANSACTIONS_PAGE_SIZE)
+        version = await api.call(game.get_version, session, id)
+
+        async def build_page():
+            transactions, next_cursor = await api.call(game.get_transactions_page, session, id, cursor, per_page)
+            return {'transactions': transactions, 'nextCursor': next_cursor}
+
+        return await conditional_response(api, game.get_etag([(id, version)]), build_page)
+    except GameNotFoundException:
+        return "GameNotFound: No game found with the specified ID", 404
+    except InvalidCursorException:
+        return "InvalidCursor: The supplied cursor is not valid", 400
+    except InvalidPageSizeException:
+        return "InvalidPageSize: The number of items per page must be a positive integer", 400
+
+@route('/game/<string:id>/timeseries', session=True)
+async def get_game_timeseries(api, session, id):
+    """
+    Retrieves chart series for a game: total pot, available cashout and each player's cumulative buy-ins over time,
+    computed on the server and downsampled, so clients do not replay every transaction.
+
+    Methods:
+    GET
+
+    URL Parameters:
+    id (str): The unique identifier of the game.
+    points (int): Optional query parameter, the most points to return in each series.
+
+    Headers:
+    If-None-Match: An entity tag from a previous response. If the game is unchanged, an empty 304 response is returned.
+
+    Returns:
+    JSON response with the series of the game, each as lists of 'dates' and 'values', with an ETag header.
+    """
+    points = api.request.args.get('points', type=int)
+    try:
+        version = await api.call(game.get_version, session, id)
+        return await conditional_response(
+            api,
+            game.get_etag([(id, version)]),
+            lambda: api.call(timeseries.get_game_timeseries, session, id, points)
+        )
+    except GameNotFoundException:
+        return "GameNotFound: No game found with the specified ID", 404
+
+@route('/game/<string:id>/history', session=True)
+async def get_game_history(api, session, id):
+    """
+    Retrieves the state of a game as it was at a past version or point in time, rebuilt from the game's ledger.
+
+    Methods:
+    GET
+
+    URL Parameters:
+    id (str): The unique identifier of the game.
+    version (int): Optional query parameter, the version of the game to rebuild.
+    at (str): Optional query parameter, an ISO 8601 date. The game is rebuilt as it was at that time. Ignored if a version is given.
+
+    Returns:
+    JSON response with the version, total pot, available cashout, member IDs, contributors and settings of the game.
+    """
+    version = api.request.args.get('version', type=int)
+    try:
+        at = stats.parse_date(api.request.args.get('at'))
+    except InvalidDateException:
+        return "InvalidDate: The 'at' parameter must be an ISO 8601 date", 400
+    try:
+        await api.call(game.get_version, session, id)
+        if version is None and at is not None:
+            return api.jsonify(await api.call(ledger.get_state_at, session, id, at))
+        return api.jsonify(await api.call(ledger.get_state, session, id, version))
+    except GameNotFoundException:
+        return "GameNotFound: No game found with the specified ID", 404
+    except LedgerHistoryUnavailableException:
+        return "HistoryUnavailable: The game's ledger does not reach back to the requested version or time", 404
+
+@route('/game/<string:id>/export', session=True)
+async def export_game_transactions(api, session, id):
+    """
+    Exports every transaction of a game, streamed to the client as it is read from the database.
+
+    Methods:
+    GET
+
+    URL Parameters:
+    id (str): The unique identifier of the game.
+    format (str): Optional query parameter, 'ndjson' (the default) or 'csv'.
+
+    Returns:
+    A streamed NDJSON or CSV attachment with one transaction per line, oldest first.
+    """
+    try:
+        await api.call(game.get_version, session, id)
+        return export_response(api, api.request.args.get('format', 'ndjson'), export.get_transactions_query(game_id=id), f"game-{id}")
+    except GameNotFoundException:
+        return "GameNotFound: No game found with the specified ID", 404
+    except InvalidExportFormatException:
+        return "InvalidFormat: The format must be 'ndjson' or 'csv'", 400
+
+def export_response(api, name, query, filename):
+    """
+    Builds a streamed response for an export of transactions.
+    The rows are read by the response generator, in its own session, while the response is being sent.
+
+    Parameters:
+    api (Api): The operations of the entry point.
+    name (str): The name of the export format.
+    query (Select): The query built by 'export.get_transactions_query()'.
+    filename (str): The name of the attachment, without its extension.
+
+    Returns:
+    Response: The streamed response.
+
+    Raises:
+    InvalidExportFormatException: If the format is not supported.
+    """
+    mimetype, _, _ = export.get_format(name)
+    return api.Response(
+        api.variant(export.stream_transactions)(name, query),
+        mimetype=mimetype,
+        headers={'Content-Disposition': f'attachment; filename="{filename}-transactions.{name}"'}
+    )
+
+@route('/game/create', methods=('POST',), session=True)
+async def create_game(api, session):
+    """
+    Creates a new game based on specifications provided in the request body.
+    Commits the game and its settings to the database.
+
+    Methods:
+    POST
+
+    Request Body:
+    JSON containing the specifications for the new game.
+
+    Returns:
+    JSON response containing the newly created game data.
+    """
+    data = await api.get_json()
+    created_game = await api.call(game.create, session, data)
+    return created_game, 201
+
+@route('/game/settings/update', methods=('POST',), session=True)
+async def update_game_settings(api, session):
+    """
+    Updates attributes of a game's settings. The updates are specified in the request body.
+    Upon successful update, the change is broadcast to all subscribers of the game room via SocketIO.
+
+    Methods:
+    POST
+
+    Request Body:
+    JSON containing the game ID and a list of update requests for the game settings.
+
+    Returns:
+    JSON response with the updated game data.
+    """
+    data = await api.get_json()
+    updated_game = await api.call(game.update_settings, session, data)
+    await api.broadcast_game_updates(session)
+    return updated_game, 200
+
+@route('/game/join', methods=('POST',), session=True)
+async def join_game(api, session):
+    """
+    Adds the specified user as a member of a given game.
+    Details of the user and the game are provided in the request body.
+    If the user was not already a member, the change is broadcast to all subscribers of the game room via SocketIO.
+
+    Methods:
+    POST
+
+    Request Body:
+    JSON containing the user ID and game ID.
+
+    Returns:
+    An empty response with a 201 status code upon success.
+    """
+    data = await api.get_json()
+    try:
+        await api.call(game.join, session, data)
+        await api.broadcast_game_updates(session)
+        return "", 201
+    except GameNotFoundException:
+        return "Game Not Found: The given game ID could not be found", 404
+    except InvalidGamePasswordException:
+        return "Invalid Credentials: The supplied game password is incorrect", 401
+
+@route('/game/transaction/create', methods=('POST',), session=True)
+async def create_transaction(api, session):
+    """
+    Handles the creation of transactions within a game.
+    The transaction details are provided in the request body.
+    Upon successful creation, the change is broadcast to all subscribers of the game room via SocketIO.
+
+    Methods:
+    POST
+
+    Request Body:
+    JSON containing transaction details such as game ID, amount, and type.
+
+    Returns:
+    JSON response with the transaction amount and type.
+    """
+    data = await api.get_json()
+    try:
+        amount, type = await api.call(game.create_transaction, session, data)
+        await api.broadcast_game_updates(session)
+        return { 'amount': amount, 'type': type }, 201
+    except InvalidTransactionException:
+        return "Invalid Transaction Error: The provided transaction was invalid", 400
+    except GameUpdateConflictException:
+        return "Conflict: The game is being updated too frequently, please try again", 409
+
+@route('/game/transaction/batch', methods=('POST',), session=True)
+async def create_transactions(api, session):
+    """
+    Handles the creation of many transactions at once, for one or more games, in a single database transaction.
+    The transactions are provided in the request body, and are either all created or none are.
+    Upon successful creation, the changes are broadcast to all subscribers of each affected game room via SocketIO, once per game.
+
+    Methods:
+    POST
+
+    Request Body:
+    JSON containing a 'transactions' list, each with transaction details such as game ID, amount, and type.
+
+    Returns:
+    JSON response with a list containing the amount and type of each transaction, in the order given.
+    """
+    data = await api.get_json()
+    try:
+        results = await api.call(game.create_transactions, session, data.get('transactions') if isinstance(data, dict) else None)
+        await api.broadcast_game_updates(session)
+        return api.jsonify([{ 'amount': amount, 'type': type } for amount, type in results]), 201
+    except InvalidTransactionException:
+        return "Invalid Transaction Error: The provided transactions were invalid", 400
+    except GameNotFoundException:
+        return "GameNotFound: No game found with one of the specified IDs", 404
+    except GameUpdateConflictException:
+        return "Conflict: The games are being updated too frequently, please try again", 409
+
+@route('/login', methods=('POST',), session=True)
+async def login(api, session):
+    """
+    Authenticates a user based on their email and password.
+    On successful authentication, a JSON Web Token (JWT) is generated and returned.
+
+    Methods:
+    POST
+
+    Request Body:
+    JSON containing the user's email and password.
+
+    Returns:
+    JSON response with a generated JWT for the authenticated user.
+    """
+    data = await api.get_json()
+    try:
+        profile_data = await api.call(user.login, session, data)
+        return { "jwt": auth.generate_jwt(profile_data) }
+    except EmailNotFoundException:
+        return "EmailNotFound: No profile with the given email could be found", 404
+    except InvalidUserPasswordException:
+        return "Invalid Credentials: The supplied username and password are invalid", 401
+    except (PasswordHasherBusyException, PasswordHasherTimeoutException):
+        return "Service Unavailable: Too many logins are being processed, please try again", 503
+
+@route('/signup', methods=('POST',), session=True)
+async def signup(api, session):
+    """
+    Registers a new user in the database. The user's details are provided in the request body.
+    If the email already exists in the database, an exception is raised.
+
+    Methods:
+    POST
+
+    Request Body:
+    JSON containing the new user's profile information.
+
+    Returns:
+    An empty response with a 201 status code upon successful registration.
+    """
+    data = await api.get_json()
+    try:
+        await api.call(user.create, session, data)
+        return "", 201
+    except EmailAlreadyExistsException:
+        return "EmailAlreadyExists: A profile with the given email already exists within the database", 401
+    except (PasswordHasherBusyException, PasswordHasherTimeoutException):
+        return "Service Unavailable: Too many signups are being processed, please try again", 503
+
+@route('/verifyUniqueEmail', methods=('POST',), session=True)
+async def verifyUniqueEmail(api, session):
+    """
+    Verifies whether the provided email in the request body already exists in the database.
+
+    Methods:
+    POST
+
+    Request Body:
+    JSON containing the email to verify.
+
+    Returns:
+    A response with "true" or "false" based on the uniqueness of the email.
+    """
+    data = await api.get_json()
+    try:
+        await api.call(user.verifyUniqueEmail, session, data)
+        return "true", 200
+    except EmailAlreadyExistsException:
+        return "false", 200
+
+@route('/updateUser', methods=('POST',), session=True)
+async def updateUser(api, session):
+    """
+    Allows a user to update their profile details like first name, last name, and email.
+    The updated information is provided in the request body.
+    A new JWT is generated and returned after the update.
+    A change of name is broadcast to the subscribers of every game showing it, as a delta carrying the renamed 'profiles'.
+
+    Methods:
+    POST
+
+    Request Body:
+    JSON containing the user's updated profile information.
+
+    Returns:
+    JSON response with a new JWT for the updated profile.
+    """
+    data = await api.get_json()
+    try:
+        profile_data = await api.call(user.updateUser, session, data)
+        await api.publish_cluster_message('profile_updated', profile_data['id'])
+        await api.broadcast_game_updates(session)
+        return { "jwt": auth.generate_jwt(profile_data) }
+    except EmailAlreadyExistsException:
+        return "EmailAlreadyExists: A profile with the given email already exists within the database", 401
+
+@route('/user/<int:id>/stats', session=True)
+async def get_user_stats(api, session, id):
+    """
+    Retrieves a player's statistics: games played, totals bought in and cashed out, net result, biggest win and loss, and ROI.
+    Without a date range, lifetime statistics are served from rollups, in constant time.
+
+    Methods:
+    GET
+
+    URL Parameters:
+    id (int): The ID of the player's profile.
+    from (str): Optional query parameter, an ISO 8601 date. Only games created on or after it are included.
+    to (str): Optional query parameter, an ISO 8601 date. Only games created before it are included.
+
+    Returns:
+    JSON response with the player's statistics.
+    """
+    try:
+        start = stats.parse_date(api.request.args.get('from'))
+        end = stats.parse_date(api.request.args.get('to'))
+    except InvalidDateException:
+        return "InvalidDate: The 'from' and 'to' parameters must be ISO 8601 dates", 400
+    return api.jsonify(await api.call(stats.get_player_stats, session, id, start, end))
+
+@route('/user/<int:id>/export', session=True)
+async def export_user_transactions(api, session, id):
+    """
+    Exports every transaction made by a player across all of their games, streamed to the client as it is read from the database.
+
+    Methods:
+    GET
+
+    URL Parameters:
+    id (int): The ID of the player's profile.
+    format (str): Optional query parameter, 'ndjson' (the default) or 'csv'.
+
+    Returns:
+    A streamed NDJSON or CSV attachment with one transaction per line, oldest first.
+    """
+    try:
+        await api.call(user.get_user_first_last, id, session)
+        return export_response(api, api.request.args.get('format', 'ndjson'), export.get_transactions_query(profile_id=id), f"user-{id}")
+    except UserNotFoundException:
+        return "UserNotFound: No user found with the specified ID", 404
+    except InvalidExportFormatException:
+        return "InvalidFormat: The format must be 'ndjson' or 'csv'", 400
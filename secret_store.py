@@ -0,0 +1,129 @@
+import json
+import os
+import tempfile
+import time
+
+import constants
+
+class SecretProviderNotFoundException(Exception):
+    pass
+
+def load_from_aws(name, region):
+    """
+    Fetches a secret from AWS Secrets Manager. boto3 is only imported when this is called.
+
+    Parameters:
+    name (str): The name of the secret.
+    region (str): The AWS region of the secret.
+
+    Returns:
+    dict: The decoded JSON value of the secret.
+    """
+    import boto3
+
+    client = boto3.session.Session().client(
+        service_name='secretsmanager',
+        region_name=region
+    )
+    # Decrypts secret using the associated KMS key.
+    response = client.get_secret_value(SecretId=name)
+    return json.loads(response['SecretString'])
+
+def load_from_file(name, region):
+    """
+    Reads a secret from the JSON file configured as 'secret_file', a stand-in for Secrets Manager that works offline.
+    The file holds either the secret itself, or an object mapping secret names to secrets.
+
+    Parameters:
+    name (str): The name of the secret.
+    region (str): Unused.
+
+    Returns:
+    dict: The secret.
+    """
+    with open(constants.SECRET_FILE) as file:
+        secrets = json.load(file)
+    return secrets.get(name, secrets)
+
+PROVIDERS = {
+    'aws': load_from_aws,
+    'file': load_from_file,
+}
+
+def register_provider(name, loader):
+    """
+    Makes a secret provider available to be selected with 'secret_provider'.
+
+    Parameters:
+    name (str): The name of the provider.
+    loader (callable): A function taking the secret name and region and returning the secret as a dictionary.
+    """
+    PROVIDERS[name] = loader
+
+def read_cache(name):
+    """
+    Reads a secret from the disk cache.
+
+    Parameters:
+    name (str): The name of the secret.
+
+    Returns:
+    dict: The secret, or None if it is not cached or was cached longer ago than the TTL.
+    """
+    if constants.SECRET_CACHE_TTL <= 0:
+        return None
+    try:
+        with open(constants.SECRET_CACHE_FILE) as file:
+            cached = json.load(file)
+    except (OSError, ValueError):
+        return None
+    if cached.get('name') != name or time.time() - cached.get('fetched', 0) > constants.SECRET_CACHE_TTL:
+        return None
+    return cached.get('secret')
+
+def write_cache(name, secret):
+    """
+    Writes a secret to the disk cache, readable by the current user only.
+    The file is replaced atomically, so workers booting at the same time never read a partial file.
+
+    Parameters:
+    name (str): The name of the secret.
+    secret (dict): The secret.
+    """
+    if constants.SECRET_CACHE_TTL <= 0:
+        return
+    directory = os.path.dirname(constants.SECRET_CACHE_FILE) or '.'
+    os.makedirs(directory, mode=0o700, exist_ok=True)
+    descriptor, path = tempfile.mkstemp(dir=directory)
+    try:
+        with os.fdopen(descriptor, 'w') as file:
+            json.dump({'name': name, 'fetched': time.time(), 'secret': secret}, file)
+        os.replace(path, constants.SECRET_CACHE_FILE)
+    except BaseException:
+        os.unlink(path)
+        raise
+
+def get_secret(name, region):
+    """
+    Retrieves a secret from the disk cache, or from the configured provider if it is not cached or the cache has expired.
+
+    Parameters:
+    name (str): The name of the secret.
+    region (str): The region of the secret, for providers that need one.
+
+    Returns:
+    dict: The secret.
+
+    Raises:
+    SecretProviderNotFoundException: If the configured provider is not registered.
+    """
+    secret = read_cache(name)
+    if secret is not None:
+        return secret
+
+    loader = PROVIDERS.get(constants.SECRET_PROVIDER)
+    if loader is None:
+        raise SecretProviderNotFoundException
+    secret = loader(name, region)
+    write_cache(name, secret)
+    return secret
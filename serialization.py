@@ -0,0 +1,138 @@
+import decimal
+import gzip
+import json
+
+from flask.json.provider import JSONProvider
+
+import constants
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# The response encodings that can be produced, by name
+ENCODINGS = {
+    'br': lambda data: brotli.compress(data, quality=constants.BROTLI_QUALITY),
+    'gzip': lambda data: gzip.compress(data, compresslevel=constants.GZIP_LEVEL),
+}
+
+def _default(obj):
+    if isinstance(obj, decimal.Decimal):
+        return float(obj)
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+def use_orjson():
+    """
+    Reports whether orjson is selected with 'json_serializer' and installed.
+
+    Returns:
+    bool: True if documents are serialized with orjson, False if they are serialized with the standard library.
+    """
+    return orjson is not None and constants.JSON_SERIALIZER == 'orjson'
+
+def dumps(obj):
+    """
+    Serializes an object to compact JSON, with orjson when it is available and the standard library otherwise.
+
+    Parameters:
+    obj: The object to serialize.
+
+    Returns:
+    bytes: The UTF-8 encoded JSON.
+    """
+    if use_orjson():
+        return orjson.dumps(obj, default=_default, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY)
+    return json.dumps(obj, default=_default, separators=(',', ':')).encode('utf-8')
+
+def loads(data):
+    """
+    Deserializes JSON.
+
+    Parameters:
+    data (str or bytes): The JSON.
+
+    Returns:
+    The deserialized object.
+    """
+    if use_orjson():
+        return orjson.loads(data)
+    return json.loads(data)
+
+def preserialize(obj):
+    """
+    Serializes an object once, for a payload that is both measured and sent.
+    With orjson, the serialized bytes are wrapped so that embedding them in a packet built by 'dumps()' copies them
+    instead of serializing the object again. Otherwise the object itself is returned to be embedded.
+
+    Parameters:
+    obj: The object to serialize.
+
+    Returns:
+    tuple: The serialized bytes, and the value to embed in place of the object.
+    """
+    encoded = dumps(obj)
+    if use_orjson() and hasattr(orjson, 'Fragment'):
+        return encoded, orjson.Fragment(encoded)
+    return encoded, obj
+
+def choose_encoding(accept_encodings):
+    """
+    Negotiates the compression of a response, preferring the encodings in the order configured with 'response_compression'.
+
+    Parameters:
+    accept_encodings (Accept): The parsed Accept-Encoding header of the request.
+
+    Returns:
+    str: The name of the encoding to use, or None to send the response uncompressed.
+    """
+    available = [
+        encoding for encoding in constants.RESPONSE_COMPRESSION
+        if encoding in ENCODINGS and (encoding != 'br' or brotli is not None)
+    ]
+    return accept_encodings.best_match(available) if available else None
+
+def compress(data, encoding):
+    """
+    Compresses the body of a response.
+
+    Parameters:
+    data (bytes): The body.
+    encoding (str): The name of an encoding returned by 'choose_encoding()'.
+
+    Returns:
+    bytes: The compressed body.
+    """
+    return ENCODINGS[encoding](data)
+
+class FastJSONProvider(JSONProvider):
+    """
+    A Flask and Quart JSON provider serializing with 'dumps()', so responses are built straight from the serialized bytes.
+    """
+    def dumps(self, obj, **kwargs):
+        return dumps(obj).decode('utf-8')
+
+    def loads(self, s, **kwargs):
+        return loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(dumps(obj), mimetype='application/json')
+
+class SocketIOJSON:
+    """
+    The JSON module given to the Socket.IO servers, so that packets are serialized with 'dumps()'.
+    Payloads returned by 'preserialize()' are embedded without being serialized again.
+    """
+    @staticmethod
+    def dumps(obj, **kwargs):
+        return dumps(obj).decode('utf-8')
+
+    @staticmethod
+    def loads(s, **kwargs):
+        return loads(s)
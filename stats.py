@@ -0,0 +1,293 @@
+from datetime import datetime, timezone
+
+from sqlalchemy import bindparam, case, delete, func, insert, select, update
+
+from async_database import async_variant
+from models import Game, PlayerGameStats, PlayerStats, Transaction, TransactionTypes
+
+class InvalidDateException(Exception):
+    pass
+
+def record_transactions(session, transactions, dates):
+    """
+    Adds newly created transactions to the player statistics rollups, in the caller's database transaction.
+    Each player's result in each game, and each player's lifetime totals, are updated with server-side increments,
+    and a row is created the first time a player transacts in a game.
+
+    Parameters:
+    session (Session): The database session the transactions were created in.
+    transactions (list): The Transaction objects that were created.
+    dates (dict): A dictionary mapping the ID of each game involved to its creation date.
+
+    Raises:
+    IntegrityError: If another writer created one of the same rollup rows concurrently. Nothing has been committed when this is raised.
+    """
+    if not transactions:
+        return
+
+    results = {}
+    for transaction in transactions:
+        result = results.setdefault((transaction.profile_id, transaction.game_id), [0, 0])
+        if transaction.type == TransactionTypes.BUY_IN:
+            result[0] = round(result[0] + transaction.amount, 2)
+        else:
+            result[1] = round(result[1] + transaction.amount, 2)
+
+    query = (
+        select(PlayerGameStats.profile_id, PlayerGameStats.game_id)
+            .filter(PlayerGameStats.profile_id.in_({profile_id for profile_id, _ in results}))
+            .filter(PlayerGameStats.game_id.in_({game_id for _, game_id in results}))
+        )
+    existing = {tuple(row) for row in session.execute(query).all()}
+
+    totals = {}
+    game_rows = []
+    game_updates = []
+    for (profile_id, game_id), (bought_in, cashed_out) in results.items():
+        total = totals.setdefault(profile_id, [0, 0, 0])
+        total[0] = round(total[0] + bought_in, 2)
+        total[1] = round(total[1] + cashed_out, 2)
+        if (profile_id, game_id) in existing:
+            game_updates.append({
+                'b_profile_id': profile_id,
+                'b_game_id': game_id,
+                'b_bought_in': bought_in,
+                'b_cashed_out': cashed_out,
+                'b_net': round(cashed_out - bought_in, 2),
+            })
+        else:
+            total[2] += 1
+            game_rows.append({
+                'profile_id': profile_id,
+                'game_id': game_id,
+                'date': dates[game_id],
+                '_bought_in': bought_in,
+                '_cashed_out': cashed_out,
+                '_net': round(cashed_out - bought_in, 2),
+            })
+
+    table = PlayerGameStats.__table__
+    if game_updates:
+        query = (
+            update(table)
+                .where(table.c.profile_id == bindparam('b_profile_id'), table.c.game_id == bindparam('b_game_id'))
+                .values(
+                    _bought_in=func.round(table.c._bought_in + bindparam('b_bought_in'), 2),
+                    _cashed_out=func.round(table.c._cashed_out + bindparam('b_cashed_out'), 2),
+                    _net=func.round(table.c._net + bindparam('b_net'), 2),
+                )
+            )
+        session.execute(query, game_updates)
+    if game_rows:
+        session.execute(insert(table), game_rows)
+
+    query = select(PlayerStats.profile_id).filter(PlayerStats.profile_id.in_(totals.keys()))
+    existing = set(session.scalars(query).all())
+
+    table = PlayerStats.__table__
+    player_updates = [
+        {'b_profile_id': profile_id, 'b_bought_in': bought_in, 'b_cashed_out': cashed_out, 'b_games': games}
+        for profile_id, (bought_in, cashed_out, games) in totals.items() if profile_id in existing
+    ]
+    player_rows = [
+        {'profile_id': profile_id, 'games_played': games, '_bought_in': bought_in, '_cashed_out': cashed_out}
+        for profile_id, (bought_in, cashed_out, games) in totals.items() if profile_id not in existing
+    ]
+    if player_updates:
+        query = (
+            update(table)
+                .where(table.c.profile_id == bindparam('b_profile_id'))
+                .values(
+                    games_played=table.c.games_played + bindparam('b_games'),
+                    _bought_in=func.round(table.c._bought_in + bindparam('b_bought_in'), 2),
+                    _cashed_out=func.round(table.c._cashed_out + bindparam('b_cashed_out'), 2),
+                )
+            )
+        session.execute(query, player_updates)
+    if player_rows:
+        session.execute(insert(table), player_rows)
+
+def rebuild(connection):
+    """
+    Recomputes every player statistics rollup from the transaction history, replacing the current rollups.
+    Used to backfill the rollups, and to repair them after transactions are written without 'record_transactions()'.
+
+    Parameters:
+    connection (Connection): The database connection to use, inside a transaction.
+    """
+    connection.execute(delete(PlayerStats.__table__))
+    connection.execute(delete(PlayerGameStats.__table__))
+
+    bought_in = func.sum(case((Transaction.type == TransactionTypes.BUY_IN, Transaction._amount), else_=0))
+    cashed_out = func.sum(case((Transaction.type == TransactionTypes.CASH_OUT, Transaction._amount), else_=0))
+    query = (
+        select(Transaction.profile_id, Transaction.game_id, Game.date_created, bought_in, cashed_out)
+            .join(Game, Transaction.game_id == Game.id)
+            .group_by(Transaction.profile_id, Transaction.game_id, Game.date_created)
+        )
+    rows = [
+        {
+            'profile_id': profile_id,
+            'game_id': game_id,
+            'date': date,
+            '_bought_in': round(bought_in, 2),
+            '_cashed_out': round(cashed_out, 2),
+            '_net': round(cashed_out - bought_in, 2),
+        }
+        for profile_id, game_id, date, bought_in, cashed_out in connection.execute(query).all()
+    ]
+    if not rows:
+        return
+    connection.execute(insert(PlayerGameStats.__table__), rows)
+
+    query = (
+        select(
+            PlayerGameStats.profile_id,
+            func.count(),
+            func.round(func.sum(PlayerGameStats._bought_in), 2),
+            func.round(func.sum(PlayerGameStats._cashed_out), 2)
+        )
+            .group_by(PlayerGameStats.profile_id)
+        )
+    connection.execute(
+        insert(PlayerStats.__table__).from_select(['profile_id', 'games_played', '_bought_in', '_cashed_out'], query)
+    )
+
+def parse_date(value):
+    """
+    Parses an ISO 8601 date or date and time used to bound a statistics range.
+    Dates with a timezone are converted to UTC, which game dates are stored in.
+
+    Parameters:
+    value (str): The date, or None or an empty string for an open range.
+
+    Returns:
+    datetime: The date as a naive UTC datetime, or None.
+
+    Raises:
+    InvalidDateException: If the value is not an ISO 8601 date.
+    """
+    if not value:
+        return None
+    try:
+        date = datetime.fromisoformat(value)
+    except ValueError:
+        raise InvalidDateException
+    if date.tzinfo is not None:
+        date = date.astimezone(timezone.utc).replace(tzinfo=None)
+    return date
+
+def get_player_stats(session, profile_id, start=None, end=None):
+    """
+    Retrieves the statistics of a player, over their whole history or over the games created in a date range.
+
+    Lifetime statistics are read from the rollups in a fixed number of indexed lookups, however long the player's history.
+    Statistics for a range are aggregated from the player's per-game results in that range.
+
+    Parameters:
+    session (Session): The database session to use for queries.
+    profile_id (int): The ID of the player's profile.
+    start (datetime): The earliest game creation date to include. Defaults to no lower bound.
+    end (datetime): The game creation date to stop before. Defaults to no upper bound.
+
+    Returns:
+    dict: A dictionary containing the games played, totals bought in and cashed out, net result, biggest win and loss, and ROI.
+    """
+    if start is None and end is None:
+        stats = get_lifetime_stats(session, profile_id)
+    else:
+        stats = get_range_stats(session, profile_id, start, end)
+
+    stats.update({
+        'profileID': profile_id,
+        'from': start.isoformat() + 'Z' if start else None,
+        'to': end.isoformat() + 'Z' if end else None,
+    })
+    return stats
+
+def get_lifetime_stats(session, profile_id):
+    """
+    Retrieves the statistics of a player over their whole history, from the lifetime rollup.
+    The biggest win and loss are read from the ends of the per-game results index.
+
+    Parameters:
+    session (Session): The database session to use for queries.
+    profile_id (int): The ID of the player's profile.
+
+    Returns:
+    dict: The player's statistics, as built by 'build_stats_data()'.
+    """
+    totals = session.get(PlayerStats, profile_id)
+    if totals is None:
+        return build_stats_data(0, 0, 0, None, None)
+
+    query = select(func.max(PlayerGameStats._net)).filter(PlayerGameStats.profile_id == profile_id, PlayerGameStats._net > 0)
+    biggest_win = session.scalar(query)
+    query = select(func.min(PlayerGameStats._net)).filter(PlayerGameStats.profile_id == profile_id, PlayerGameStats._net < 0)
+    biggest_loss = session.scalar(query)
+
+    return build_stats_data(totals.games_played, totals.bought_in, totals.cashed_out, biggest_win, biggest_loss)
+
+def get_range_stats(session, profile_id, start, end):
+    """
+    Retrieves the statistics of a player over the games created in a date range,
+    by loading their per-game results for the range and aggregating them as arrays.
+
+    Parameters:
+    session (Session): The database session to use for queries.
+    profile_id (int): The ID of the player's profile.
+    start (datetime): The earliest game creation date to include, or None.
+    end (datetime): The game creation date to stop before, or None.
+
+    Returns:
+    dict: The player's statistics, as built by 'build_stats_data()'.
+    """
+    # Imported here so that only workers serving ranged statistics load NumPy
+    import numpy
+
+    query = select(PlayerGameStats._bought_in, PlayerGameStats._cashed_out).filter(PlayerGameStats.profile_id == profile_id)
+    if start is not None:
+        query = query.filter(PlayerGameStats.date >= start)
+    if end is not None:
+        query = query.filter(PlayerGameStats.date < end)
+
+    results = numpy.array(session.execute(query).all(), dtype=float).reshape(-1, 2)
+    bought_in, cashed_out = results[:, 0], results[:, 1]
+    net = cashed_out - bought_in
+    wins = net[net > 0]
+    losses = net[net < 0]
+
+    return build_stats_data(
+        len(results),
+        bought_in.sum(),
+        cashed_out.sum(),
+        wins.max() if wins.size else None,
+        losses.min() if losses.size else None
+    )
+
+def build_stats_data(games_played, bought_in, cashed_out, biggest_win, biggest_loss):
+    """
+    Creates an object with the statistics of a player.
+
+    Parameters:
+    games_played (int): The number of games the player made a transaction in.
+    bought_in (float): The total amount bought in.
+    cashed_out (float): The total amount cashed out.
+    biggest_win (float): The best positive result in a single game, or None.
+    biggest_loss (float): The worst negative result in a single game, or None.
+
+    Returns:
+    dict: A dictionary containing the statistics. ROI is the net result as a fraction of the total bought in, or None if nothing was bought in.
+    """
+    net = round(float(cashed_out) - float(bought_in), 2)
+    return {
+        'gamesPlayed': int(games_played),
+        'totalBoughtIn': round(float(bought_in), 2),
+        'totalCashedOut': round(float(cashed_out), 2),
+        'net': net,
+        'biggestWin': round(float(biggest_win), 2) if biggest_win is not None else None,
+        'biggestLoss': round(float(biggest_loss), 2) if biggest_loss is not None else None,
+        'roi': round(net / float(bought_in), 4) if bought_in else None,
+    }
+
+get_player_stats_async = async_variant(get_player_stats)
@@ -0,0 +1,166 @@
+from sqlalchemy import select
+
+from async_database import async_variant
+from cache import VersionedLRUCache
+import constants
+import game
+from game import GameNotFoundException
+from models import Game, Transaction, TransactionTypes
+from user import get_users_first_last
+
+# Chart documents, keyed by game ID and point budget, and tagged with the game version they were built at
+timeseries_cache = VersionedLRUCache(constants.TIMESERIES_CACHE_SIZE)
+
+def get_game_timeseries(session, id, points=None):
+    """
+    Retrieves the chart series of a game: total pot, available cashout and each player's cumulative buy-ins over time.
+    Series are computed from the game's transactions and downsampled to the point budget,
+    and the result is cached until the game's version changes.
+
+    Parameters:
+    session (Session): The database session to use for queries.
+    id (str): The unique identifier of the game.
+    points (int): The most points to return in each series. Defaults to 'timeseries_points', and is capped at 'timeseries_max_points'.
+
+    Returns:
+    dict: A dictionary containing the game ID, version, and the series, each as lists of ISO 8601 dates and values.
+
+    Raises:
+    GameNotFoundException: If no game is found with the provided ID.
+    """
+    points = min(max(points or constants.TIMESERIES_POINTS, 3), constants.TIMESERIES_MAX_POINTS)
+    version = game.get_version(session, id)
+    timeseries = timeseries_cache.get((id, points), version)
+    if timeseries is None:
+        timeseries = build_game_timeseries(session, id, points)
+        timeseries_cache.put((id, points), timeseries['version'], timeseries)
+    return timeseries
+
+def build_game_timeseries(session, id, points):
+    """
+    Computes the chart series of a game from its transactions, with vectorized cumulative sums.
+    The pot and available cashout series start from zero at the game's creation.
+
+    Parameters:
+    session (Session): The database session to use for queries.
+    id (str): The unique identifier of the game.
+    points (int): The most points to return in each series.
+
+    Returns:
+    dict: The chart series, as described in 'get_game_timeseries()'.
+
+    Raises:
+    GameNotFoundException: If no game is found with the provided ID.
+    """
+    # Imported here so that only workers serving charts load NumPy
+    import numpy
+
+    row = session.execute(select(Game.date_created, Game.version).filter_by(id=id)).one_or_none()
+    if row is None:
+        raise GameNotFoundException
+
+    query = (
+        select(Transaction.date, Transaction.profile_id, Transaction.type, Transaction._amount)
+            .filter(Transaction.game_id == id)
+            .order_by(Transaction.id)
+        )
+    transactions = session.execute(query).all()
+
+    dates = [row.date_created] + [transaction.date for transaction in transactions]
+    times = numpy.array(dates, dtype='datetime64[ms]').astype(numpy.int64).astype(float)
+    profile_ids = numpy.array([0] + [transaction.profile_id for transaction in transactions])
+    buy_in = numpy.array([False] + [transaction.type == TransactionTypes.BUY_IN for transaction in transactions])
+    amounts = numpy.array([0] + [transaction._amount for transaction in transactions], dtype=float)
+
+    bought_in = numpy.where(buy_in, amounts, 0)
+    cashed_out = numpy.where(buy_in, 0, amounts)
+    total_pot = numpy.round(numpy.cumsum(bought_in), 2)
+    available_cashout = numpy.round(numpy.cumsum(bought_in - cashed_out), 2)
+
+    profiles = get_users_first_last({transaction.profile_id for transaction in transactions}, session)
+    players = []
+    for profile_id in sorted(profiles):
+        selected = numpy.flatnonzero((profile_ids == profile_id) & buy_in)
+        if not selected.size:
+            continue
+        series = build_series(dates, times, numpy.round(numpy.cumsum(bought_in[selected]), 2), points, selected)
+        players.append(dict(series, profile=profiles[profile_id]))
+
+    return {
+        'id': id,
+        'version': row.version,
+        'points': points,
+        'totalPot': build_series(dates, times, total_pot, points),
+        'availableCashout': build_series(dates, times, available_cashout, points),
+        'players': players,
+    }
+
+def build_series(dates, times, values, points, selected=None):
+    """
+    Downsamples a series and creates its chart object.
+
+    Parameters:
+    dates (list): The date of every transaction, as datetimes.
+    times (ndarray): The same dates, as numbers.
+    values (ndarray): The value of the series at each of its points.
+    points (int): The most points to return.
+    selected (ndarray): The positions in 'dates' and 'times' of each point of the series. Defaults to every position.
+
+    Returns:
+    dict: A dictionary containing the 'dates' of the points, as ISO 8601 strings, and their 'values'.
+    """
+    import numpy
+
+    if selected is None:
+        selected = numpy.arange(len(values))
+    kept = downsample(times[selected], values, points)
+    return {
+        'dates': [dates[position].isoformat() + 'Z' for position in selected[kept]],
+        'values': values[kept].tolist(),
+    }
+
+def downsample(x, y, threshold):
+    """
+    Picks the points of a series that best preserve its visual shape, with the Largest-Triangle-Three-Buckets algorithm.
+    The first and last points are always kept. Each bucket of points in between keeps the one forming the
+    largest triangle with the point kept from the previous bucket and the average of the next bucket.
+
+    Parameters:
+    x (ndarray): The x coordinate of each point, in increasing order.
+    y (ndarray): The y coordinate of each point.
+    threshold (int): The most points to keep, at least 3.
+
+    Returns:
+    ndarray: The positions of the points kept, in increasing order.
+    """
+    import numpy
+
+    length = len(x)
+    if length <= threshold:
+        return numpy.arange(length)
+
+    kept = numpy.empty(threshold, dtype=numpy.int64)
+    kept[0] = 0
+    kept[-1] = length - 1
+    # Buckets split the points between the first and last evenly
+    edges = (numpy.arange(threshold - 1) * (length - 2) / (threshold - 2)).astype(numpy.int64) + 1
+    edges[-1] = length - 1
+
+    previous = 0
+    for bucket in range(threshold - 2):
+        start, end = edges[bucket], edges[bucket + 1]
+        if bucket + 2 < len(edges):
+            next_start, next_end = edges[bucket + 1], edges[bucket + 2]
+            next_x, next_y = x[next_start:next_end].mean(), y[next_start:next_end].mean()
+        else:
+            next_x, next_y = x[-1], y[-1]
+
+        areas = numpy.abs(
+            (x[previous] - next_x) * (y[start:end] - y[previous])
+            - (x[previous] - x[start:end]) * (next_y - y[previous])
+        )
+        previous = start + int(numpy.argmax(areas))
+        kept[bucket + 1] = previous
+    return kept
+
+get_game_timeseries_async = async_variant(get_game_timeseries)
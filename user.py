@@ -1,7 +1,10 @@
-import bcrypt
 from sqlalchemy import select
 
+from async_database import async_variant
+from cache import create_cache
+import constants
 from models import Profile
+import passwords
 
 class EmailAlreadyExistsException(Exception):
     pass
@@ -15,9 +18,14 @@ class InvalidPasswordException(Exception):
 class UserNotFoundException(Exception):
     pass
 
+profile_cache = create_cache(constants.PROFILE_CACHE_URL, 'pokerflow:profile:', constants.PROFILE_CACHE_SIZE, constants.PROFILE_CACHE_TTL)
+
 def updateUser(session, data):
     """
     Updates a user profile based on the provided data.
+    If the user's name changes, every game showing it that is not expired gets a new version, see 'game.rename_profile()',
+    and the deltas carrying the new name are queued on the session for broadcasting.
+    The cached documents of expired games showing it are discarded with 'game.forget_profile()'.
 
     Parameters:
     session (Session): The database session to use for the update.
@@ -35,12 +43,24 @@ def updateUser(session, data):
         raise UserNotFoundException
     
     profile = rows[0]
+    renamed = (profile.firstName, profile.lastName) != (data['firstName'], data['lastName'])
 
     profile.firstName = data['firstName']
     profile.lastName = data['lastName']
     profile.email = data['email']
+
+    deltas = []
+    if renamed:
+        # Imported here since the game module looks up names through this one
+        import game
+        deltas = game.rename_profile(session, profile)
     
     session.commit()
+    invalidate_profile(profile.id)
+    if renamed:
+        game.forget_profile(profile.id)
+    for delta in deltas:
+        game.publish_delta(session, delta)
 
     # Return the profile information
     return {
@@ -77,6 +97,7 @@ def create(session, data):
     Creates a new user profile in the database.
 
     This function first checks for the uniqueness of the provided email address. If the email is unique, it creates a new profile with the provided information, hashing the password for security.
+    The password is hashed on the password hashing pool rather than the request thread.
 
     Parameters:
     session (Session): The database session to be used for creating the profile.
@@ -84,6 +105,8 @@ def create(session, data):
 
     Raises:
     EmailAlreadyExistsException: If the provided email already exists in the database.
+    PasswordHasherBusyException: If the password hashing pool is full.
+    PasswordHasherTimeoutException: If hashing the password takes too long.
     """
     verifyUniqueEmail(session, data)
     
@@ -92,7 +115,7 @@ def create(session, data):
         email = data['email'],
         firstName = data['firstName'],
         lastName = data['lastName'],
-        hash = bcrypt.hashpw(data['password'].encode('utf-8'), bcrypt.gensalt(rounds=12))
+        hash = passwords.hash_password(data['password'])
     )
     session.add(profile)
     session.commit()
@@ -101,6 +124,7 @@ def login(session, data):
     """
     Authenticates a user based on email and password.
     If authentication is successful, it returns the user's profile information.
+    The password is verified on the password hashing pool, and re-hashed if it was hashed with a different work factor than the current one.
 
     Parameters:
     session (Session): The database session for the query.
@@ -112,6 +136,8 @@ def login(session, data):
     Raises:
     EmailNotFoundException: If no user is found with the provided email.
     InvalidPasswordException: If the provided password does not match the stored hash.
+    PasswordHasherBusyException: If the password hashing pool is full.
+    PasswordHasherTimeoutException: If verifying the password takes too long.
     """
     # Query the database for the given email
     query = select(Profile).filter_by(email=data['email'])
@@ -122,8 +148,12 @@ def login(session, data):
     profile = result[0]
     
     # Verify the provided password
-    if not bcrypt.checkpw(data['password'].encode('utf-8'), profile.hash.encode('utf-8')):
+    if not passwords.verify_password(data['password'], profile.hash):
         raise InvalidPasswordException
+
+    if passwords.needs_rehash(profile.hash):
+        profile.hash = passwords.hash_password(data['password'])
+        session.commit()
     
     # Return the profile information
     return {
@@ -137,6 +167,7 @@ def get_user_first_last(id, session):
     """
     Retrieves a user's profile using their unique ID. 
     If found, it returns their first and last name.
+    The name is served from the profile cache when possible.
 
     Parameters:
     id (int): The unique identifier of the user.
@@ -148,15 +179,107 @@ def get_user_first_last(id, session):
     Raises:
     UserNotFoundException: If no user is found with the provided ID.
     """
-    query = select(Profile).filter_by(id=id)
-    rows = session.execute(query).fetchone()
-    if not rows:
+    return get_users_first_last([id], session)[id]
+
+def get_users_first_last(ids, session):
+    """
+    Retrieves the first and last names of several users.
+    Names are served from the profile cache, and the missing ones are loaded in a single query and cached.
+
+    Parameters:
+    ids (iterable): The unique identifiers of the users.
+    session (Session): The database session for the query.
+
+    Returns:
+    dict: A dictionary mapping each user ID to a dictionary containing the user's first and last name.
+
+    Raises:
+    UserNotFoundException: If any of the provided IDs does not match a user.
+    """
+    ids = set(ids)
+    if not ids:
+        return {}
+
+    profiles = profile_cache.get_many(ids)
+    missing = ids - profiles.keys()
+    if not missing:
+        return profiles
+
+    since = profile_cache.now()
+    query = select(Profile.id, Profile.firstName, Profile.lastName).filter(Profile.id.in_(missing))
+    loaded = {
+        id: {
+            "id": id,
+            "firstName": firstName,
+            "lastName": lastName
+        }
+        for id, firstName, lastName in session.execute(query).all()
+    }
+    if len(loaded) != len(missing):
         raise UserNotFoundException
-    
-    profile = rows[0]
 
-    return {
-        "id": id,
-        "firstName": profile.firstName,
-        "lastName": profile.lastName
+    profile_cache.set_many(loaded, since)
+    profiles.update(loaded)
+    return profiles
+
+def invalidate_profile(id):
+    """
+    Discards the cached name of a user, for example after their profile was updated.
+    Called on every worker when a profile is updated, through the message queue.
+
+    Parameters:
+    id (int): The unique identifier of the user.
+    """
+    profile_cache.delete(id)
+
+async def create_async(session, data):
+    """
+    Asyncio variant of 'create()', taking an AsyncSession.
+    The password is hashed on the password hashing pool without blocking the event loop.
+    """
+    await session.run_sync(verifyUniqueEmail, data)
+
+    profile = Profile(
+        email = data['email'],
+        firstName = data['firstName'],
+        lastName = data['lastName'],
+        hash = await passwords.hash_password_async(data['password'])
+    )
+    session.add(profile)
+    await session.commit()
+
+async def login_async(session, data):
+    """
+    Asyncio variant of 'login()', taking an AsyncSession.
+    The password is verified, and re-hashed if needed, on the password hashing pool without blocking the event loop.
+    """
+    query = select(Profile).filter_by(email=data['email'])
+    result = (await session.execute(query)).fetchone()
+    if not result:
+        raise EmailNotFoundException
+
+    profile = result[0]
+    profile_data = {
+        'id': profile.id,
+        'email': profile.email,
+        'firstName': profile.firstName,
+        'lastName': profile.lastName
     }
+
+    if not await passwords.verify_password_async(data['password'], profile.hash):
+        raise InvalidPasswordException
+
+    if passwords.needs_rehash(profile.hash):
+        profile.hash = await passwords.hash_password_async(data['password'])
+        await session.commit()
+
+    return profile_data
+
+updateUser_async = async_variant(updateUser)
+verifyUniqueEmail_async = async_variant(verifyUniqueEmail)
+
+async def get_user_first_last_async(id, session):
+    """
+    Asyncio variant of 'get_user_first_last()', taking an AsyncSession.
+    """
+    return await session.run_sync(lambda sync_session: get_user_first_last(id, sync_session))